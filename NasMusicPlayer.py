@@ -1,13 +1,43 @@
-from flask import Flask, jsonify, send_from_directory, request, render_template_string
-import os, sqlite3, json, urllib.parse, time, random, requests, subprocess, shutil, re
+from flask import Flask, Response, jsonify, request, render_template_string, abort
+from werkzeug.security import safe_join
+from werkzeug.http import http_date
+from werkzeug.serving import make_server
+import os, io, sys, socket, signal, sqlite3, json, base64, hashlib, math, mimetypes, urllib.parse, time, random, requests, subprocess, shutil, re
 from flask_cors import CORS
 from threading import Thread
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import deque, OrderedDict
 import queue
+import tempfile
+import asyncio
+import heapq
+import itertools
+import unicodedata
 import threading  # 상단 import에 추가
 
+try:
+    from PIL import Image  # 선택: 커버 썸네일 생성용 (없으면 원본 그대로 제공)
+except ImportError:
+    Image = None
+try:
+    import mutagen  # 선택: 스캔 시 내장 태그(ID3/Vorbis/MP4) 읽기용 (없으면 경로/파일명 추정만 사용)
+except ImportError:
+    mutagen = None
+try:
+    import orjson  # 선택: 빠른 JSON 직렬화 (없으면 Flask 기본 json 모듈)
+except ImportError:
+    orjson = None
+try:
+    import brotli  # 선택: Accept-Encoding: br 응답 압축 (없으면 gzip 만 협상)
+except ImportError:
+    brotli = None
+from flask.json.provider import DefaultJSONProvider
+import zlib
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
 
 # ==========================================
 # 1. 경로 및 시스템 설정
@@ -27,6 +57,30 @@ GENRE_ROOTS = {
     "OST": os.path.join(MUSIC_BASE, "OST")
 }
 
+# 메타데이터 제공자 주소 (테스트 시 로컬 서버로 바꿔 끼울 수 있도록 상수로 둠)
+DEEZER_API = "https://api.deezer.com"
+ITUNES_API = "https://itunes.apple.com"
+MANIADB_API = "http://www.maniadb.com"
+
+# 제공자별 요청 한도: rate(초당 토큰), burst(한 번에 몰아 쓸 수 있는 토큰), concurrency(동시 요청 수)
+# Deezer 는 5초당 50회, iTunes 는 분당 약 20회가 공개 한도
+# -> 앨범마다 요청이 한 번 이상이므로 iTunes 가 먼저인 카테고리(외국/일본/클래식/DSD/OST)는 분당 약 20앨범이 상한
+#    (benchmarks/bench_meta.py 로 스텁 제공자 상대 측정)
+PROVIDER_LIMITS = {
+    "deezer": {"rate": 8.0, "burst": 10, "concurrency": 6},
+    "itunes": {"rate": 0.33, "burst": 3, "concurrency": 2},
+    "maniadb": {"rate": 2.0, "burst": 2, "concurrency": 2},
+}
+META_CONCURRENCY = 12  # 동시에 매칭 중인 앨범 수 (요청은 위 제공자 한도로 따로 조절됨)
+# 제공자 상태에 따른 조절: 위 concurrency 는 상한이고, 실제 동시 요청 수는 응답 상태를 보고 AIMD 로 오르내림
+PROVIDER_SLOW_SECONDS = 3.0  # 평균 응답이 이보다 느리면 혼잡으로 보고 동시 요청 수를 줄임
+PROVIDER_WINDOW = 20  # 오류율을 볼 최근 요청 수
+PROVIDER_TRIP_FAILURES = 5  # 연속 실패가 이만큼이면 차단기(circuit) 열림
+PROVIDER_TRIP_ERROR_RATE = 0.5  # 또는 최근 요청 오류율이 이 이상이면 열림
+PROVIDER_COOLDOWN = (15, 300)  # 차단 후 시험 요청까지 대기(초). 시험 요청도 실패하면 두 배씩 최대값까지
+META_MAX_RETRIES = 3  # 일시 장애로 결과를 못 얻은 앨범의 재시도 횟수 (그래도 안 되면 다음 실행으로 미룸)
+META_RETRY_DELAY = 10  # 첫 재시도까지 대기(초), 재시도마다 두 배
+
 META_STRATEGIES = {
     "국내":   {"priority": ["maniadb", "deezer"], "clean": "korean"},
     "외국":   {"priority": ["itunes", "deezer"], "clean": "western"},
@@ -38,8 +92,6 @@ META_STRATEGIES = {
 
 # 1. 상단 전역 변수 영역에 추가
 cached_meta_stats = {"timestamp": 0, "data": None}
-# 통계 데이터 캐시 변수 추가
-cached_db_stats = {"data": None, "time": 0}
 
 BASE_URL = "http://192.168.0.2:4444"
 
@@ -58,7 +110,8 @@ if os.path.exists(OLD_DB_PATH) and not os.path.exists(DB_PATH):
         print(f"[!] 이동 실패: {e}. 수동으로 파일을 {DB_PATH}로 옮겨주세요.")
 
 # 상태 전역 변수
-up_st = {"is_running": False, "total": 0, "current": 0, "success": 0, "fail": 0, "last_log": "대기 중...", "target": "전체"}
+up_st = {"is_running": False, "total": 0, "current": 0, "success": 0, "fail": 0, "last_log": "대기 중...", "target": "전체",
+         "cache_hits": 0, "cache_misses": 0, "cache_hit_rate": 0.0, "requeued": 0, "deferred": 0}
 idx_st = {
     "is_running": False,
     "total_dirs": 0,
@@ -70,6 +123,9 @@ idx_st = {
     "eta": "계산 중..."
 }
 cache = {"charts": [], "collections": [], "artists": [], "genres": []}
+# 리스를 잃은 워커가 작업을 멈추는 신호 (stop_job) - 메타데이터/음량 분석은 meta_stop/rg_stop
+idx_stop = threading.Event()
+theme_stop = threading.Event()
 
 # ==========================================
 # 2. 모니터 대시보드 UI (HTML/CSS/JS)
@@ -284,7 +340,7 @@ MONITOR_HTML = '''
             <div class="box full-width">
                 <h2>🛠️ SQL Expert Runner</h2>
                 <p style="color: #94a3b8; font-size: 0.85rem; margin-bottom: 15px;">안전을 위해 <span style="color: var(--warning)">SELECT</span> 문만 실행 가능하도록 제한되어 있습니다.</p>
-                <textarea id="sql-input" class="sql-editor" placeholder="예: SELECT name, artist, meta_poster FROM global_songs WHERE meta_poster IS NULL LIMIT 10;">SELECT name, artist, albumName, meta_poster FROM global_songs WHERE meta_poster = 'FAIL' LIMIT 20;</textarea>
+                <textarea id="sql-input" class="sql-editor" placeholder="예: SELECT al.name, ar.name, al.poster FROM albums al JOIN artists ar ON ar.id = al.artist_id WHERE al.poster IS NULL LIMIT 10;">SELECT ar.name AS artist, al.name AS albumName, al.category, al.poster FROM albums al JOIN artists ar ON ar.id = al.artist_id WHERE al.poster = 'FAIL' LIMIT 20;</textarea>
                 <button onclick="runSQL()">🚀 SQL 실행</button>
                 <div id="sql-result-wrapper" class="table-container" style="margin-top: 25px; display: none;">
                     <table id="sql-table">
@@ -482,19 +538,20 @@ MONITOR_HTML = '''
             }
         }
 
-        // 상태 실시간 업데이트 (2초마다)
-        function updateStatus() {
-            fetch('/api/indexing/status').then(r=>r.json()).then(d=>{
-                document.getElementById('idx-total').innerText = d.songs_found.toLocaleString();
+        // 상태 표시 (SSE 피드의 전체 상태/변경분을 합친 값으로 그림)
+        const live = {indexing: {}, metadata: {}};
+
+        function renderIndexing(d) {
+                document.getElementById('idx-total').innerText = (d.songs_found || 0).toLocaleString();
                 document.getElementById('idx-speed').innerText = d.speed;
                 const p = (d.total_dirs > 0 ? (d.processed_dirs / d.total_dirs * 100) : 0).toFixed(1);
                 document.getElementById('idx-fill').style.width = p + '%';
-                document.getElementById('idx-progress-text').innerText = `진행률: ${p}% (${d.processed_dirs.toLocaleString()} / ${d.total_dirs.toLocaleString()})`;
+                document.getElementById('idx-progress-text').innerText = `진행률: ${p}% (${(d.processed_dirs || 0).toLocaleString()} / ${(d.total_dirs || 0).toLocaleString()})`;
                 document.getElementById('idx-eta').innerText = "예상 완료: " + d.eta;
                 document.getElementById('idx-log').innerText = "🚀 " + d.last_log;
-            });
+        }
 
-    fetch('/api/metadata/status').then(r=>r.json()).then(d=>{
+        function renderMeta(d) {
         // 1. 전체 라이브러리 항목 (앨범/가수 그룹 기준)
         const totalDbEl = document.getElementById('meta-db-total');
         if(totalDbEl) totalDbEl.innerText = (d.db_total || 0).toLocaleString();
@@ -516,7 +573,33 @@ MONITOR_HTML = '''
             addLog(`<span style="color:var(--accent); font-weight:bold;">[META]</span> ${d.last_log}`);
             lastMetaLog = d.last_log;
         }
-    });
+        }
+
+        function applyFeed(data, replace) {
+            for (const key of ['indexing', 'metadata']) {
+                if (replace) live[key] = {};
+                if (data[key]) Object.assign(live[key], data[key]);
+            }
+            if (replace || data.indexing) renderIndexing(live.indexing);
+            if (replace || data.metadata) renderMeta(live.metadata);
+        }
+
+        // 진행 상황 구독: 서버가 바뀐 값만 밀어 주므로 폴링하지 않음. 탭이 가려지면 연결을 닫아 둠
+        let feed = null;
+        function openFeed() {
+            if (feed) return;
+            feed = new EventSource('/api/events');
+            feed.addEventListener('snapshot', e => applyFeed(JSON.parse(e.data), true));
+            feed.addEventListener('progress', e => applyFeed(JSON.parse(e.data), false));
+        }
+        function closeFeed() {
+            if (feed) { feed.close(); feed = null; }
+        }
+
+        // EventSource 를 못 쓰는 브라우저용 폴링
+        function updateStatus() {
+            fetch('/api/indexing/status').then(r=>r.json()).then(renderIndexing);
+            fetch('/api/metadata/status').then(r=>r.json()).then(renderMeta);
         }
 
         function startMeta(q) {
@@ -575,8 +658,13 @@ MONITOR_HTML = '''
                     });
             }
         }
-        setInterval(updateStatus, 10000);
-        updateStatus(); // 즉시 실행
+        if (window.EventSource) {
+            openFeed();
+            document.addEventListener('visibilitychange', () => document.hidden ? closeFeed() : openFeed());
+        } else {
+            setInterval(updateStatus, 10000);
+            updateStatus(); // 즉시 실행
+        }
         addLog("NasMusic Pro 관리 콘솔에 연결되었습니다.");
     </script>
     <!-- 수동 매칭 모달 레이어 -->
@@ -603,14 +691,136 @@ MONITOR_HTML = '''
 # ==========================================
 # 3. 핵심 로직: DB, 스캔, 인덱싱 (중간 저장 및 이어하기)
 # ==========================================
+
+# --- DB 연결 관리 (읽기 연결 풀 + 전용 쓰기 연결 1개) ---
+# PRAGMA 는 연결 단위 설정이라 연결을 열 때마다 한 번 적용하고 재사용합니다.
+DB_PRAGMAS = [
+    'PRAGMA cache_size = -2000000',    # 2GB 캐시
+    'PRAGMA synchronous = NORMAL',     # 쓰기 성능 향상
+    'PRAGMA mmap_size = 30000000000',  # 30GB 메모리 맵핑 (검색 속도 폭발)
+    'PRAGMA temp_store = MEMORY',
+]
+DB_READ_POOL_SIZE = 8        # 유휴 상태로 보관할 읽기 연결 최대 수
+DB_CONN_MAX_AGE = 600        # 초, 이보다 오래된 연결은 닫고 새로 엶
+DB_STATEMENT_CACHE = 256     # 연결별 준비된 SQL 문 캐시 크기
+
+pool_st = {"hits": 0, "misses": 0, "recycled": 0, "discarded": 0, "writer_opens": 0, "writer_waits": 0}
+_read_pool = queue.LifoQueue()  # (conn, 생성 시각) - 최근에 쓴 연결부터 재사용
+_writer = {"conn": None, "born": 0}
+db_write_lock = threading.RLock()
+_job_db = {"conn": None}
+job_db_lock = threading.Lock()
+
+
+def _open_conn(timeout, read_only):
+    conn = sqlite3.connect(DB_PATH, timeout=timeout, check_same_thread=False,
+                           cached_statements=DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    conn.create_function("norm_key", 1, norm_key, deterministic=True)
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+@contextmanager
+def db_read():
+    """풀에서 읽기 전용 연결을 빌려줍니다. 블록이 끝나면 풀로 반납됩니다."""
+    conn = None
+    try:
+        conn, born = _read_pool.get_nowait()
+        if time.time() - born > DB_CONN_MAX_AGE:
+            conn.close()
+            conn = None
+            pool_st["recycled"] += 1
+        else:
+            pool_st["hits"] += 1
+    except queue.Empty:
+        pass
+    if conn is None:
+        pool_st["misses"] += 1
+        conn, born = _open_conn(timeout=20, read_only=True), time.time()
+
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction: conn.rollback()
+        if _read_pool.qsize() < DB_READ_POOL_SIZE:
+            _read_pool.put((conn, born))
+        else:
+            conn.close()
+            pool_st["discarded"] += 1
+
+
+@contextmanager
+def db_write():
+    """
+    단일 쓰기 연결을 잠금과 함께 빌려줍니다. 정상 종료 시 커밋, 예외 시 롤백합니다.
+    SQLite 는 어차피 쓰기가 하나씩만 가능하므로 스레드 간 쓰기를 여기서 줄 세웁니다.
+    """
+    if not db_write_lock.acquire(blocking=False):
+        pool_st["writer_waits"] += 1
+        db_write_lock.acquire()
+    try:
+        if _writer["conn"] is None:
+            _writer.update({"conn": _open_conn(timeout=120, read_only=False), "born": time.time()})
+            pool_st["writer_opens"] += 1
+        conn = _writer["conn"]
+        try:
+            yield conn
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+    finally:
+        db_write_lock.release()
+
+
+def job_db_path():
+    """작업 리스/명령/세대 번호를 두는 별도 DB 파일 (라이브러리 DB 옆)"""
+    return os.path.splitext(DB_PATH)[0] + "_jobs.db"
+
+
+@contextmanager
+def job_db():
+    """
+    워커 간 작업 공유 DB 연결. 트랜잭션이 항상 짧은 작은 파일이라, 라이브러리 DB 의 긴 쓰기 트랜잭션
+    (스캔 마무리, 폴더 트리 갱신 등)이나 db_write_lock 을 기다리지 않고 리스를 연장할 수 있습니다.
+    """
+    with job_db_lock:
+        if _job_db["conn"] is None:
+            conn = sqlite3.connect(job_db_path(), timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            _job_db["conn"] = conn
+        conn = _job_db["conn"]
+        try:
+            yield conn
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+
+
+def db_pool_stats():
+    now = time.time()
+    idle_ages = [round(now - born, 1) for _, born in list(_read_pool.queue)]
+    looked_up = pool_st["hits"] + pool_st["misses"]
+    return {
+        **pool_st,
+        "hit_rate": round(pool_st["hits"] / looked_up, 3) if looked_up else 0,
+        "idle_readers": len(idle_ages),
+        "idle_reader_ages": idle_ages,
+        "writer_age": round(now - _writer["born"], 1) if _writer["conn"] is not None else None,
+    }
+
+
 def init_db():
     print("[*] 🛠️ DB 엔진 최적화 및 인덱스 점검 중...")
-    with sqlite3.connect(DB_PATH, timeout=600) as conn:
+    with db_write() as conn:
         conn.execute('PRAGMA journal_mode=WAL')
-        conn.execute('PRAGMA cache_size = -2000000')  # 2GB 캐시
-        conn.execute('PRAGMA synchronous = NORMAL')   # 쓰기 성능 향상
-        conn.execute('PRAGMA mmap_size = 30000000000') # 30GB 메모리 맵핑 (검색 속도 폭발)
-        conn.execute('PRAGMA temp_store = MEMORY')
 
         # 1. 기본 테이블 생성
         conn.execute('''
@@ -631,48 +841,545 @@ def init_db():
 
         # 3. 아티스트 캐시 테이블
         conn.execute('CREATE TABLE IF NOT EXISTS artists_cache (artist_name TEXT, cover TEXT, folder_type TEXT, PRIMARY KEY (artist_name, folder_type))')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_artists_cache_folder ON artists_cache(folder_type, artist_name)')
+
+        # 3-1. 파일 경로 고유키 (스캔 결과를 upsert 로 병합하기 위함)
+        migrate_song_url_key(conn)
+        # 3-1-1. 내장 태그에서 읽는 곡 단위 컬럼 (가수/앨범/장르/연도는 기존 컬럼 사용)
+        song_cols = {r[1] for r in conn.execute("PRAGMA table_info(global_songs)")}
+        # 음량 분석 결과 (loudness_at 이 NULL 이면 아직 분석 전 -> 분석 작업의 체크포인트)
+        for col, col_type in (("track_no", "INTEGER"), ("disc_no", "INTEGER"), ("duration", "REAL"),
+                              ("lufs", "REAL"), ("rg_track_gain", "REAL"), ("rg_track_peak", "REAL"), ("loudness_at", "REAL")):
+            if col not in song_cols:
+                conn.execute(f"ALTER TABLE global_songs ADD COLUMN {col} {col_type}")
+
+        # 3-2. 정규화된 가수/앨범 테이블 (앨범 단위 메타데이터는 albums 에 한 번만 저장)
+        conn.execute('CREATE TABLE IF NOT EXISTS artists (id INTEGER PRIMARY KEY, name TEXT, sort_key TEXT UNIQUE)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS albums (
+                id INTEGER PRIMARY KEY, artist_id INTEGER REFERENCES artists(id),
+                name TEXT, sort_key TEXT, category TEXT,
+                poster TEXT, genre TEXT, release_date TEXT, album_artist TEXT,
+                UNIQUE (artist_id, sort_key)
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_albums_category ON albums(category)')
+        # 가수별 앨범 목록을 테이블 조회 없이 인덱스만으로 응답 (커버링 인덱스)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_albums_artist ON albums(artist_id, release_date, name, poster)')
+        # 폴더(카테고리)별 가수 목록: 가수마다 해당 카테고리 앨범 존재/대표 포스터를 인덱스만으로 확인
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_albums_artist_category ON albums(artist_id, category, poster)')
+        migrate_normalized_schema(conn)
+        rekey_normalized(conn)
+        # art_checked: 내장 커버 확인 여부 (NULL: 아직 안 봄, 1: 내장 커버 사용, 0: 없음 -> 네트워크 엔진 대상)
+        # rg_album_*: 앨범 전체 곡 분석이 끝나면 채워지는 ReplayGain 앨범 값
+        album_cols = {r[1] for r in conn.execute("PRAGMA table_info(albums)")}
+        for col, col_type in (("art_checked", "INTEGER"), ("rg_album_gain", "REAL"), ("rg_album_peak", "REAL")):
+            if col not in album_cols:
+                conn.execute(f"ALTER TABLE albums ADD COLUMN {col} {col_type}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_loudness_pending ON global_songs(album_id) WHERE loudness_at IS NULL")
+        # 3-3. 카테고리별 앨범 메타데이터 상태 집계 (albums 트리거로 항상 최신 유지)
+        ensure_meta_status(conn)
+
+        # 3-4. 메타데이터 제공자 응답 캐시 (같은 질의를 다시 묻지 않도록 성공/실패 모두 저장)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS provider_cache (
+                provider TEXT, query TEXT, result TEXT, fetched_at REAL,
+                PRIMARY KEY (provider, query)
+            ) WITHOUT ROWID
+        """)
+
+        # 4. 폴더 스냅샷 (증분 재스캔용: 바뀐 폴더만 다시 읽음)
+        conn.execute('CREATE TABLE IF NOT EXISTS dir_snapshots (path TEXT PRIMARY KEY, parent TEXT, mtime REAL, entry_count INTEGER, scanned_at REAL)')
+
+        # 4-1. 폴더 트리 (탐색 화면용: 직계 하위 폴더를 인덱스로 바로 조회)
+        folders_exist = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'folders'").fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS folders (
+                id INTEGER PRIMARY KEY, parent_id INTEGER, name TEXT, path TEXT UNIQUE,
+                child_count INTEGER, track_count INTEGER, cover_album_id INTEGER
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id, name)')
+        if not folders_exist:
+            print("[*] 📁 폴더 트리 구성 중...")
+            rebuild_folders(conn)
+
+        # 4-2. 워커 간 공유 상태: 작업 리스/진행 스냅샷/세대 번호, 다른 워커가 넘긴 demand 앨범 (별도 DB, job_db)
+        # 예전에는 라이브러리 DB 에 있었음 -> 긴 쓰기 트랜잭션 동안 리스 연장이 막혀 만료될 수 있었으므로 옮김
+        conn.execute('DROP TABLE IF EXISTS job_state')
+        conn.execute('DROP TABLE IF EXISTS meta_demand')
+        with job_db() as jconn:
+            jconn.execute("""
+                CREATE TABLE IF NOT EXISTS job_state (
+                    name TEXT PRIMARY KEY, owner TEXT, lease_until REAL DEFAULT 0, state TEXT,
+                    command TEXT, gen INTEGER DEFAULT 0, updated REAL
+                )
+            """)
+            jconn.execute('CREATE TABLE IF NOT EXISTS meta_demand (album_id INTEGER PRIMARY KEY, at REAL)')
 
-        # 4. 필수 인덱스 (조회 속도용)
+        # 5. 필수 인덱스 (조회 속도용)
         conn.execute('CREATE INDEX IF NOT EXISTS idx_path ON global_songs(parent_path)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_meta_lookup ON global_songs(artist, albumName)')
+        # 테마 상세(큰 하위 트리)를 (가수, 곡명) 순서로 정렬 없이 넘기기 위한 순서 인덱스 (경로 조건도 인덱스 안에서 확인)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_songs_artist_name ON global_songs(artist, name, parent_path)')
+
+        # 6. 검색용 FTS5 인덱스
+        ensure_search_index(conn)
         conn.commit()
     print("[*] ✅ DB 최적화 및 구조 복구 완료.")
 
-def refresh_artist_cache():
+
+def migrate_song_url_key(conn):
+    """
+    예전 방식(스테이징 테이블 복사 후 교체)에서 남은 것들을 정리하고
+    global_songs(stream_url) 고유 인덱스를 보장합니다.
+    """
+    staging = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'global_songs_staging'").fetchone()
+    if staging:
+        # 중단된 스캔이 스테이징에 남긴 곡은 본 테이블로 옮긴 뒤 스테이징 제거
+        conn.execute("""
+            INSERT INTO global_songs (name, artist, albumName, stream_url, parent_path, meta_poster, genre, release_date, album_artist)
+            SELECT name, artist, albumName, stream_url, parent_path, meta_poster, genre, release_date, album_artist
+            FROM global_songs_staging
+            WHERE stream_url NOT IN (SELECT stream_url FROM global_songs WHERE stream_url IS NOT NULL)
+        """)
+        conn.execute("DROP TABLE global_songs_staging")
+
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_songs_url'").fetchone():
+        print("[*] 🔑 파일 경로 고유키 생성 중...")
+        conn.execute("DELETE FROM global_songs WHERE rowid NOT IN (SELECT MIN(rowid) FROM global_songs GROUP BY stream_url)")
+        # 교체되며 딸려온 스테이징용 인덱스/중복 인덱스 정리
+        conn.execute("DROP INDEX IF EXISTS idx_staging_url")
+        conn.execute("DROP INDEX IF EXISTS idx_grouping")
+        conn.execute("CREATE UNIQUE INDEX idx_songs_url ON global_songs(stream_url)")
+
+
+def norm_key(text):
+    """
+    가수/앨범 묶음 기준 키: 유니코드 NFKC 정규화 + 대소문자 접기(casefold) + 앞뒤/연속 공백 정리.
+    전각/반각, 조합형 한글, 호환 문자(ﬁ 등)가 달라도 같은 키가 되도록 합니다.
+    """
+    return " ".join(unicodedata.normalize("NFKC", str(text or "")).casefold().split())
+
+
+def top_folder(parent_path):
+    """parent_path 의 최상위 폴더 (국내, 외국, ...)"""
+    return (parent_path or "").split("/", 1)[0]
+
+
+def migrate_normalized_schema(conn):
+    """
+    기존 평면 global_songs 로부터 artists/albums 를 채우고 곡에 artist_id/album_id 를 연결합니다.
+    album_id 가 비어 있는 곡만 대상으로 하므로 여러 번 실행해도 안전합니다.
+    앨범 포스터는 곡들 중 정상 URL 을 우선, 없으면 FAIL 기록을 그대로 옮깁니다.
+    """
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(global_songs)")}
+    if 'album_id' not in cols:
+        conn.execute("ALTER TABLE global_songs ADD COLUMN artist_id INTEGER")
+        conn.execute("ALTER TABLE global_songs ADD COLUMN album_id INTEGER")
+    # 앨범 -> 대표 폴더 조회가 인덱스만으로 끝나도록 parent_path 까지 포함 (예전 단일 컬럼 인덱스는 교체)
+    conn.execute('DROP INDEX IF EXISTS idx_songs_album')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_songs_album_path ON global_songs(album_id, parent_path)')
+
+    if not conn.execute("SELECT 1 FROM global_songs WHERE album_id IS NULL LIMIT 1").fetchone():
+        return
+    print("[*] 🗂️ 가수/앨범 정규화 테이블 구성 중...")
+    conn.execute("""
+        INSERT OR IGNORE INTO artists (name, sort_key)
+        SELECT TRIM(MIN(artist)), norm_key(artist) FROM global_songs
+        WHERE album_id IS NULL GROUP BY norm_key(artist)
+    """)
+    conn.execute("""
+        UPDATE global_songs SET artist_id = (SELECT id FROM artists WHERE sort_key = norm_key(global_songs.artist))
+        WHERE album_id IS NULL
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO albums (artist_id, name, sort_key, category, poster, genre, release_date, album_artist)
+        SELECT artist_id, TRIM(MIN(albumName)), norm_key(albumName),
+               MIN(CASE WHEN INSTR(parent_path, '/') > 0 THEN SUBSTR(parent_path, 1, INSTR(parent_path, '/') - 1) ELSE parent_path END),
+               COALESCE(MAX(CASE WHEN meta_poster NOT IN ('', 'FAIL') THEN meta_poster END),
+                        MAX(CASE WHEN meta_poster = 'FAIL' THEN 'FAIL' END)),
+               MAX(genre), MAX(release_date), MAX(album_artist)
+        FROM global_songs WHERE album_id IS NULL
+        GROUP BY artist_id, norm_key(albumName)
+    """)
+    conn.execute("""
+        UPDATE global_songs SET album_id = (SELECT id FROM albums
+                                            WHERE artist_id = global_songs.artist_id AND sort_key = norm_key(global_songs.albumName))
+        WHERE album_id IS NULL
+    """)
+
+
+def rekey_normalized(conn):
+    """
+    norm_key 규칙이 바뀌어 저장된 sort_key 와 달라졌으면 키를 다시 계산합니다.
+    새 규칙에서 같은 키가 되는 가수/앨범은 id 가 가장 작은 쪽으로 합치고 곡의 연결도 옮깁니다.
+    같은 묶음의 이름은 규칙이 같으면 항상 같은 키를 내므로, 어긋난 행이 없으면 아무것도 하지 않습니다.
+    """
+    stale = conn.execute("""
+        SELECT 1 FROM artists WHERE sort_key IS NOT norm_key(name)
+        UNION ALL SELECT 1 FROM albums WHERE sort_key IS NOT norm_key(name) LIMIT 1
+    """).fetchone()
+    if not stale:
+        return
+    print("[*] 🔤 가수/앨범 정규화 키 재계산 중...")
+    # 1. 가수: 새 키 기준 대표 id 로 합침
+    conn.execute("DROP TABLE IF EXISTS temp.artist_map")
+    conn.execute("""
+        CREATE TEMP TABLE artist_map AS
+        SELECT id, norm_key(name) AS k, MIN(id) OVER (PARTITION BY norm_key(name)) AS keep FROM artists
+    """)
+    conn.execute("""
+        UPDATE global_songs SET artist_id = (SELECT keep FROM artist_map WHERE id = global_songs.artist_id)
+        WHERE artist_id IN (SELECT id FROM artist_map WHERE id != keep)
+    """)
+    conn.execute("""
+        UPDATE albums SET artist_id = (SELECT keep FROM artist_map WHERE id = albums.artist_id), sort_key = NULL
+        WHERE artist_id IN (SELECT id FROM artist_map WHERE id != keep)
+    """)
+    conn.execute("DELETE FROM artists WHERE id IN (SELECT id FROM artist_map WHERE id != keep)")
+
+    # 2. 앨범: (가수, 새 키) 기준 대표 id 로 합치고 비어 있는 메타데이터는 합쳐지는 쪽에서 채움
+    conn.execute("DROP TABLE IF EXISTS temp.album_map")
+    conn.execute("""
+        CREATE TEMP TABLE album_map AS
+        SELECT id, MIN(id) OVER (PARTITION BY artist_id, norm_key(name)) AS keep FROM albums
+    """)
+    conn.execute("""
+        UPDATE global_songs SET album_id = (SELECT keep FROM album_map WHERE id = global_songs.album_id)
+        WHERE album_id IN (SELECT id FROM album_map WHERE id != keep)
+    """)
+    conn.execute("""
+        UPDATE albums SET
+            poster = COALESCE(NULLIF(poster, 'FAIL'), (SELECT MAX(d.poster) FROM albums d JOIN album_map m ON m.id = d.id
+                                                      WHERE m.keep = albums.id AND m.id != m.keep AND d.poster != 'FAIL'), poster),
+            genre = COALESCE(genre, (SELECT MAX(d.genre) FROM albums d JOIN album_map m ON m.id = d.id WHERE m.keep = albums.id)),
+            release_date = COALESCE(release_date, (SELECT MAX(d.release_date) FROM albums d JOIN album_map m ON m.id = d.id WHERE m.keep = albums.id))
+        WHERE id IN (SELECT keep FROM album_map WHERE id != keep)
+    """)
+    conn.execute("DELETE FROM albums WHERE id IN (SELECT id FROM album_map WHERE id != keep)")
+
+    # 3. 남은 행의 키 갱신 (UNIQUE 충돌을 피하려 먼저 비운 뒤 채움)
+    conn.execute("UPDATE artists SET sort_key = NULL WHERE sort_key IS NOT norm_key(name)")
+    conn.execute("UPDATE artists SET sort_key = norm_key(name) WHERE sort_key IS NULL")
+    conn.execute("UPDATE albums SET sort_key = NULL WHERE sort_key IS NOT norm_key(name)")
+    conn.execute("UPDATE albums SET sort_key = norm_key(name) WHERE sort_key IS NULL")
+    conn.execute("DROP TABLE temp.artist_map")
+    conn.execute("DROP TABLE temp.album_map")
+
+
+def link_rows(conn, rows, ids=None):
+    """
+    get_info 튜플 (name, artist, albumName, stream_url, parent_path) 또는 태그까지 붙은 스캔 행
+    (process_path 참고) 뒤에 (artist_id, album_id) 를 붙여 돌려줍니다.
+    없는 가수/앨범은 이 자리에서 만들고, 스캔 행이면 태그의 장르/연도/앨범 가수로 앨범의 빈 값을 채웁니다.
+    ids 는 스캔 한 번 동안 재사용하는 키 -> id 캐시입니다.
+    """
+    ids = {} if ids is None else ids
+    linked = []
+    for r in rows:
+        art_key = ("artist", norm_key(r[1]))
+        if art_key not in ids:
+            conn.execute("INSERT OR IGNORE INTO artists (name, sort_key) VALUES (?, ?)", (r[1].strip(), art_key[1]))
+            ids[art_key] = conn.execute("SELECT id FROM artists WHERE sort_key = ?", (art_key[1],)).fetchone()[0]
+        artist_id = ids[art_key]
+
+        alb_key = ("album", artist_id, norm_key(r[2]))
+        if alb_key not in ids:
+            conn.execute("INSERT OR IGNORE INTO albums (artist_id, name, sort_key, category) VALUES (?, ?, ?, ?)",
+                         (artist_id, r[2].strip(), alb_key[2], top_folder(r[4])))
+            ids[alb_key] = conn.execute("SELECT id FROM albums WHERE artist_id = ? AND sort_key = ?",
+                                        (artist_id, alb_key[2])).fetchone()[0]
+        album_id = ids[alb_key]
+
+        # 태그의 앨범 가수/연도/장르로 앨범의 빈 칸만 채움 (제공자에서 받은 값은 유지). 세 값이 다 있는 곡을 만나면 그 앨범은 끝
+        if len(r) > 5 and (r[5] or r[8] or r[9]) and ("tagged", album_id) not in ids:
+            conn.execute("""UPDATE albums SET album_artist = COALESCE(album_artist, ?), release_date = COALESCE(release_date, ?),
+                                              genre = COALESCE(genre, ?) WHERE id = ?""", (r[5], r[8], r[9], album_id))
+            if r[5] and r[8] and r[9]: ids[("tagged", album_id)] = True
+        linked.append((*r, artist_id, album_id))
+    return linked
+
+
+def relink_songs(conn, where, params=()):
+    """곡의 artist/albumName 문자열이 바뀐 뒤 artist_id/album_id 를 다시 연결하고 빈 앨범을 정리합니다."""
+    rows = conn.execute(f"SELECT rowid, name, artist, albumName, stream_url, parent_path FROM global_songs WHERE {where}",
+                        params).fetchall()
+    linked = link_rows(conn, [tuple(r)[1:] for r in rows])
+    conn.executemany("UPDATE global_songs SET artist_id = ?, album_id = ? WHERE rowid = ?",
+                     [(l[5], l[6], r[0]) for r, l in zip(rows, linked)])
+    conn.execute("DELETE FROM albums WHERE NOT EXISTS (SELECT 1 FROM global_songs WHERE album_id = albums.id)")
+    return len(rows)
+
+
+def meta_status_sql(ref):
+    """앨범 포스터 값 -> 상태(success/fail/pending) 식. ref 는 new/old/albums 등 행 별칭"""
+    return (f"CASE WHEN {ref}.poster = 'FAIL' THEN 'fail' "
+            f"WHEN {ref}.poster IS NULL OR {ref}.poster = '' THEN 'pending' ELSE 'success' END")
+
+
+def ensure_meta_status(conn):
+    """
+    meta_status(category, status, n) 집계 테이블과 albums 동기화 트리거를 만듭니다.
+    앨범을 만들고 지우거나 포스터/카테고리를 바꾸는 모든 경로(스캔, 메타 매칭, 관리자 수정, 실패 초기화)가
+    트리거를 거치므로 상태 API 는 집계 없이 이 작은 테이블만 읽으면 됩니다.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'meta_status'").fetchone()
+    conn.execute("CREATE TABLE IF NOT EXISTS meta_status (category TEXT, status TEXT, n INTEGER, PRIMARY KEY (category, status))")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS albums_status_ai AFTER INSERT ON albums BEGIN
+            INSERT INTO meta_status (category, status, n) VALUES (COALESCE(new.category, ''), {meta_status_sql('new')}, 1)
+            ON CONFLICT (category, status) DO UPDATE SET n = n + 1;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS albums_status_ad AFTER DELETE ON albums BEGIN
+            UPDATE meta_status SET n = n - 1 WHERE category = COALESCE(old.category, '') AND status = {meta_status_sql('old')};
+        END
+    """)
+    # 장르/발매일 등 상태와 무관한 컬럼 갱신에는 반응하지 않도록 컬럼 지정
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS albums_status_au AFTER UPDATE OF poster, category ON albums BEGIN
+            UPDATE meta_status SET n = n - 1 WHERE category = COALESCE(old.category, '') AND status = {meta_status_sql('old')};
+            INSERT INTO meta_status (category, status, n) VALUES (COALESCE(new.category, ''), {meta_status_sql('new')}, 1)
+            ON CONFLICT (category, status) DO UPDATE SET n = n + 1;
+        END
+    """)
+    if not exists:
+        conn.execute("DELETE FROM meta_status")
+        conn.execute(f"""
+            INSERT INTO meta_status (category, status, n)
+            SELECT COALESCE(category, ''), {meta_status_sql('albums')}, COUNT(*) FROM albums GROUP BY 1, 2
+        """)
+
+
+# 곡 응답 공통 컬럼 - 앨범 단위 메타데이터(포스터/장르/발매일)는 albums 에서 가져옴
+SONG_ALBUM_JOIN = "LEFT JOIN albums al ON al.id = s.album_id"
+SONG_FROM = f"global_songs s {SONG_ALBUM_JOIN}"
+SONG_BASIC_COLUMNS = ("s.rowid AS id, s.name, s.artist, s.albumName, s.stream_url, s.parent_path, al.poster AS meta_poster, s.album_id,"
+                      " s.rg_track_gain, s.rg_track_peak, al.rg_album_gain, al.rg_album_peak")
+# 앨범 목록 응답 공통 컬럼
+ALBUM_FROM = "albums al JOIN artists ar ON ar.id = al.artist_id"
+ALBUM_COLUMNS = "al.id AS album_id, al.name AS name, ar.name AS artist, al.poster AS imageUrl, CAST(SUBSTR(al.release_date, 1, 4) AS INTEGER) AS year"
+SONG_COLUMNS = (SONG_BASIC_COLUMNS + ", COALESCE(al.genre, s.genre) AS genre, COALESCE(al.release_date, s.release_date) AS release_date,"
+                " COALESCE(al.album_artist, s.album_artist) AS album_artist, s.track_no, s.disc_no, s.duration")
+
+
+# 검색 인덱스 사용 가능 여부 (trigram 토크나이저 미지원 SQLite면 LIKE 검색으로 동작)
+FTS_READY = False
+# bm25 컬럼 가중치: name, artist, albumName, album_artist
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 2.0)
+# 아티스트/앨범 그룹 검색 시 그룹핑할 상위 후보 곡 수
+FTS_GROUP_CANDIDATES = 2000
+
+
+def ensure_search_index(conn):
+    """
+    global_songs 의 그림자 검색 인덱스(FTS5, trigram)와 동기화 트리거를 만듭니다.
+    trigram 이라 한글/일본어도 부분 문자열로 검색됩니다.
+    """
+    global FTS_READY
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'global_songs_fts'").fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS global_songs_fts USING fts5(
+                name, artist, albumName, album_artist,
+                content='global_songs', content_rowid='rowid', tokenize='trigram'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS global_songs_fts_ai AFTER INSERT ON global_songs BEGIN
+                INSERT INTO global_songs_fts (rowid, name, artist, albumName, album_artist)
+                VALUES (new.rowid, new.name, new.artist, new.albumName, new.album_artist);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS global_songs_fts_ad AFTER DELETE ON global_songs BEGIN
+                INSERT INTO global_songs_fts (global_songs_fts, rowid, name, artist, albumName, album_artist)
+                VALUES ('delete', old.rowid, old.name, old.artist, old.albumName, old.album_artist);
+            END
+        """)
+        # meta_poster 같은 비검색 컬럼 갱신에는 반응하지 않도록 컬럼 지정
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS global_songs_fts_au AFTER UPDATE OF name, artist, albumName, album_artist ON global_songs BEGIN
+                INSERT INTO global_songs_fts (global_songs_fts, rowid, name, artist, albumName, album_artist)
+                VALUES ('delete', old.rowid, old.name, old.artist, old.albumName, old.album_artist);
+                INSERT INTO global_songs_fts (rowid, name, artist, albumName, album_artist)
+                VALUES (new.rowid, new.name, new.artist, new.albumName, new.album_artist);
+            END
+        """)
+        if not exists:
+            print("[*] 🔎 검색 인덱스(FTS5) 구성 중...")
+            conn.execute("INSERT INTO global_songs_fts (global_songs_fts) VALUES ('rebuild')")
+        FTS_READY = True
+    except sqlite3.OperationalError as e:
+        FTS_READY = False
+        print(f"[!] FTS5 검색 인덱스 사용 불가 (LIKE 검색으로 동작): {e}")
+
+
+def fts_match_expr(q, columns=None):
+    """
+    검색어를 FTS5 MATCH 식으로 변환합니다. trigram 은 3글자 미만을 찾지 못하므로
+    그 경우(또는 인덱스가 없을 때) None 을 반환하고 호출측은 LIKE 로 대체합니다.
+    """
+    if not FTS_READY or len(q) < 3: return None
+    phrase = '"' + q.replace('"', '""') + '"'
+    if columns:
+        return "{" + " ".join(columns) + "} : " + phrase
+    return phrase
+
+
+def fts_hits_sql(limit):
+    """MATCH 결과를 bm25 점수와 함께 돌려주는 CTE 조각 (hits: rowid, score). 파라미터는 MATCH 식 1개."""
+    return (f"hits AS (SELECT rowid, bm25(global_songs_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS score "
+            f"FROM global_songs_fts WHERE global_songs_fts MATCH ? ORDER BY score LIMIT {int(limit)})")
+
+ARTIST_CACHE_SELECT = """
+    SELECT
+        ar.name as name,
+        MAX(al.poster) as cover,
+        CASE WHEN al.category IN ('국내', '외국', '일본', 'DSD', 'OST', '클래식') THEN al.category ELSE '기타' END as folder
+    FROM albums al JOIN artists ar ON ar.id = al.artist_id
+    WHERE ar.name != '' AND ar.name != 'Unknown Artist'
+"""
+
+
+def refresh_artist_cache(artist_ids=None):
+    """
+    artists_cache 갱신. artist_ids 를 주면(증분 스캔) 그 가수들의 행만 지우고 다시 채우므로
+    비용이 바뀐 가수 수에 비례하고, None 이면 전체를 다시 만듭니다.
+    """
     print("[*] 🔄 아티스트 목록 캐시 갱신 중... (대용량 데이터 최적화)")
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute("DELETE FROM artists_cache")
-            # 폴더별(국내, 외국 등) 유니크한 가수와 대표 이미지 추출
-            conn.execute("""
-                INSERT INTO artists_cache (artist_name, cover, folder_type)
-                SELECT
-                    TRIM(artist) as name,
-                    MAX(meta_poster) as cover,
-                    CASE
-                        WHEN parent_path LIKE '국내%' THEN '국내'
-                        WHEN parent_path LIKE '외국%' THEN '외국'
-                        WHEN parent_path LIKE '일본%' THEN '일본'
-                        WHEN parent_path LIKE 'DSD%' THEN 'DSD'
-                        WHEN parent_path LIKE 'OST%' THEN 'OST'
-                        WHEN parent_path LIKE '클래식%' THEN '클래식'
-                        ELSE '기타'
-                    END as folder
-                FROM global_songs
-                WHERE artist != '' AND artist != 'Unknown Artist'
-                GROUP BY UPPER(TRIM(artist)), folder
-            """)
+        with db_write() as conn:
+            if artist_ids is None:
+                conn.execute("DELETE FROM artists_cache")
+                # 폴더별(국내, 외국 등) 유니크한 가수와 대표 이미지 추출 (곡 대신 앨범 테이블 기준)
+                conn.execute(f"INSERT OR REPLACE INTO artists_cache (artist_name, cover, folder_type) "
+                             f"{ARTIST_CACHE_SELECT} GROUP BY ar.id, folder")
+            else:
+                ids = [(i,) for i in artist_ids]
+                conn.executemany("DELETE FROM artists_cache WHERE artist_name = (SELECT name FROM artists WHERE id = ?)", ids)
+                conn.executemany(f"INSERT OR REPLACE INTO artists_cache (artist_name, cover, folder_type) "
+                                 f"{ARTIST_CACHE_SELECT} AND ar.id = ? GROUP BY ar.id, folder", ids)
             conn.commit()
+        bump_library_generation()
         print("[*] ✅ 아티스트 캐시 갱신 완료!")
     except Exception as e:
         print(f"[!] 캐시 생성 에러: {e}")
 
+def rebuild_folders(conn):
+    """
+    global_songs 의 parent_path 들로 folders 트리를 다시 맞춥니다.
+    폴더마다 직계 하위 폴더 수, 하위 전체 곡 수, 대표 앨범(포스터가 있는 앨범 우선)을 기록하고
+    경로가 같은 폴더는 id 를 유지합니다. 곡이 사라진 폴더는 지웁니다.
+    """
+    rows = conn.execute("""
+        SELECT s.parent_path, COUNT(*) AS n,
+               MIN(CASE WHEN al.poster IS NOT NULL AND al.poster NOT IN ('', 'FAIL') THEN s.album_id END) AS good_album,
+               MIN(s.album_id) AS any_album
+        FROM global_songs s LEFT JOIN albums al ON al.id = s.album_id
+        WHERE s.parent_path IS NOT NULL AND s.parent_path != ''
+        GROUP BY s.parent_path
+    """).fetchall()
+
+    # 경로 -> [직계 하위 이름 집합, 곡 수, 포스터 있는 앨범, 아무 앨범]
+    tree = {}
+    for r in rows:
+        parts = r['parent_path'].split('/')
+        for depth in range(1, len(parts) + 1):
+            node = tree.setdefault('/'.join(parts[:depth]), [set(), 0, None, None])
+            node[1] += r['n']
+            if node[2] is None: node[2] = r['good_album']
+            if node[3] is None: node[3] = r['any_album']
+            if depth < len(parts): node[0].add(parts[depth])
+
+    conn.executemany("""
+        INSERT INTO folders (name, path, child_count, track_count, cover_album_id) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET child_count = excluded.child_count, track_count = excluded.track_count,
+                                        cover_album_id = excluded.cover_album_id
+    """, [(path.rsplit('/', 1)[-1], path, len(n[0]), n[1], n[2] or n[3]) for path, n in tree.items()])
+
+    ids = {r[0]: r[1] for r in conn.execute("SELECT path, id FROM folders")}
+    gone = [(fid,) for path, fid in ids.items() if path not in tree]
+    conn.executemany("DELETE FROM folders WHERE id = ?", gone)
+    conn.executemany("UPDATE folders SET parent_id = ? WHERE id = ?",
+                     [(ids[path.rsplit('/', 1)[0]] if '/' in path else None, ids[path]) for path in tree])
+    return len(tree)
+
+
+def folder_ancestors(paths):
+    """parent_path 들과 그 상위 폴더 경로 전부"""
+    out = set()
+    for path in paths:
+        if not path: continue
+        parts = path.split('/')
+        out.update('/'.join(parts[:depth]) for depth in range(1, len(parts) + 1))
+    return out
+
+
+def update_folders(conn, paths):
+    """
+    rebuild_folders 의 증분판. 주어진 parent_path 들과 그 상위 폴더만 다시 계산합니다 (스캔 묶음, 매칭 결과 등).
+    깊은 폴더부터 위로 올라가며 폴더 값 = 직속 곡 + 직계 하위 폴더 행의 합이므로, 상위 폴더도 하위 트리를 다시 읽지 않습니다.
+    곡이 모두 사라진 폴더는 지웁니다. 하위 트리째 사라진 폴더는 호출하는 쪽이 먼저 folders 에서 지워야 합니다.
+    """
+    nodes = folder_ancestors(paths)
+    # 새 폴더는 위에서부터 만들어야 parent_id 를 걸 수 있음
+    for path in sorted(nodes, key=lambda p: p.count('/')):
+        parent = path.rsplit('/', 1)[0] if '/' in path else None
+        conn.execute("""INSERT INTO folders (name, path, parent_id, child_count, track_count)
+                        VALUES (?, ?, (SELECT id FROM folders WHERE path = ?), 0, 0) ON CONFLICT(path) DO NOTHING""",
+                     (path.rsplit('/', 1)[-1], path, parent))
+
+    for path in sorted(nodes, key=lambda p: -p.count('/')):
+        fid = conn.execute("SELECT id FROM folders WHERE path = ?", (path,)).fetchone()[0]
+        own = conn.execute("""
+            SELECT COUNT(*) AS n, MIN(CASE WHEN al.poster IS NOT NULL AND al.poster NOT IN ('', 'FAIL') THEN s.album_id END) AS good,
+                   MIN(s.album_id) AS any_album
+            FROM global_songs s LEFT JOIN albums al ON al.id = s.album_id WHERE s.parent_path = ?
+        """, (path,)).fetchone()
+        subs = conn.execute("""
+            SELECT f.track_count, f.cover_album_id, al.poster IS NOT NULL AND al.poster NOT IN ('', 'FAIL') AS good
+            FROM folders f LEFT JOIN albums al ON al.id = f.cover_album_id WHERE f.parent_id = ? ORDER BY f.name
+        """, (fid,)).fetchall()
+        total = own['n'] + sum(r['track_count'] for r in subs)
+        if not total:
+            conn.execute("DELETE FROM folders WHERE id = ?", (fid,))
+            continue
+        # rebuild_folders 와 같은 순서(직속 곡 -> 하위 폴더 이름순)로 포스터 있는 앨범 우선
+        cover = (own['good'] or next((r['cover_album_id'] for r in subs if r['good']), None)
+                 or own['any_album'] or next((r['cover_album_id'] for r in subs if r['cover_album_id']), None))
+        conn.execute("UPDATE folders SET child_count = ?, track_count = ?, cover_album_id = ? WHERE id = ?",
+                     (len(subs), total, cover, fid))
+    return len(nodes)
+
+
+def album_folder_paths(conn, album_ids):
+    """앨범들의 곡이 들어 있는 parent_path 목록 (포스터가 바뀐 앨범의 폴더 대표 이미지 갱신용)"""
+    return [r[0] for r in conn.execute(
+        "SELECT DISTINCT parent_path FROM global_songs WHERE album_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(album_ids)),))]
+
+
+def refresh_folders(album_ids=None):
+    """album_ids 를 주면 그 앨범이 든 폴더와 상위 폴더만, None 이면 트리 전체를 다시 맞춤"""
+    try:
+        with db_write() as conn:
+            if album_ids is None:
+                count = rebuild_folders(conn)
+            else:
+                count = update_folders(conn, album_folder_paths(conn, album_ids))
+        print(f"[*] ✅ 폴더 트리 갱신 완료! ({count:,}개)")
+    except Exception as e:
+        print(f"[!] 폴더 트리 갱신 에러: {e}")
+
+
 def load_cache():
     global cache
     print("[*] 🔄 시스템 캐시 로딩 시작...")
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
             total_count = 0
             for t in ["charts", "collections", "artists", "genres"]:
                 rows = conn.execute("SELECT name, path, image_url FROM themes WHERE type=?", (t,)).fetchall()
@@ -682,6 +1389,7 @@ def load_cache():
                 print(f"    - {t.upper():<12}: {count}개 항목 로드됨")
 
             print(f"[*] 🎉 캐시 로딩 완료 (총 {total_count}개 항목)")
+            bump_library_generation(shared=False)  # DB 는 그대로이므로 이 워커의 응답 캐시만 비움
 
             # 데이터가 비어있으면 경고 로그 출력
             if total_count == 0:
@@ -752,10 +1460,16 @@ def get_info(f, d):
     stream_url = f"{BASE_URL}/stream/{urllib.parse.quote(rel_file)}"
     return (tit, art, os.path.basename(d), stream_url, rel_dir)
 
+def song_file_path(stream_url):
+    """get_info 가 만든 stream_url -> 실제 파일 경로. 라이브러리 밖이면 None"""
+    if not stream_url or "/stream/" not in stream_url: return None
+    return safe_join(MUSIC_BASE, urllib.parse.unquote(stream_url.split("/stream/", 1)[1]))
+
+
 def fix_unknown_artists_in_db(target_tag=None):
     print(f"[*] 🛠️ DB 내 Unknown Artist 복구 시작... (대상: {target_tag if target_tag else '전체'})")
     try:
-        with sqlite3.connect(DB_PATH, timeout=120) as conn:
+        with db_write() as conn:
             # 타겟 태그가 있으면 LIKE 문에 반영, 없으면 전체 대상으로 쿼리
             sql = """UPDATE global_songs
                      SET artist = SUBSTR(parent_path, INSTR(parent_path, '/가수/') + 10,
@@ -768,138 +1482,407 @@ def fix_unknown_artists_in_db(target_tag=None):
                 params.append(f"{target_tag}%")
 
             conn.execute(sql, params)
+            # 가수명이 바뀐 곡을 새 가수/앨범에 다시 연결
+            relinked = relink_songs(conn, "artist_id IN (SELECT id FROM artists WHERE sort_key = norm_key('Unknown Artist')) "
+                                          "AND artist != 'Unknown Artist'")
             conn.commit()
-            print(f"[*] ✅ {target_tag if target_tag else '전체'} 복구 완료.")
+            bump_library_generation()
+            print(f"[*] ✅ {target_tag if target_tag else '전체'} 복구 완료. ({relinked:,}곡 재연결)")
     except Exception as e:
         print(f"[!] 복구 중 오류: {e}")
 
 
+# easy 모드 키 -> ID3 프레임. EasyID3/EasyMP4/Vorbis 는 왼쪽 이름으로, easy 모드가 없는 형식(DSF 의 ID3)은 프레임으로 찾음
+TAG_KEYS = {"title": "TIT2", "artist": "TPE1", "album": "TALB", "albumartist": "TPE2",
+            "tracknumber": "TRCK", "discnumber": "TPOS", "date": "TDRC", "genre": "TCON"}
+READ_TAGS = True  # 스캔 시 내장 태그 읽기 (mutagen 이 있을 때만)
+
+
+def read_tags(path):
+    """
+    파일 내장 태그 -> {TAG_KEYS 키: 문자열, "duration": 초}.
+    mutagen 은 태그/스트림 헤더 블록만 읽고 오디오 데이터는 읽지 않습니다. 못 읽으면 빈 dict
+    """
+    if mutagen is None or not READ_TAGS: return {}
+    try:
+        f = mutagen.File(path, easy=True)
+    except Exception:
+        return {}
+    if f is None: return {}
+    tags, raw = {}, f.tags or {}
+    for key, frame in TAG_KEYS.items():
+        try:
+            val = raw.get(key) or raw.get(frame)
+        except Exception:
+            val = None
+        val = getattr(val, "text", val)  # ID3 프레임이면 값 목록
+        if isinstance(val, (list, tuple)): val = val[0] if val else None
+        val = str(val).strip() if val is not None else ""
+        if val: tags[key] = val
+    if f.info and getattr(f.info, "length", None):
+        tags["duration"] = round(f.info.length, 2)
+    return tags
+
+
+def tag_number(val):
+    """'3/12', '03' -> 3. 숫자가 없으면 None"""
+    m = re.match(r'\s*(\d+)', val or '')
+    return int(m.group(1)) if m else None
+
+
 def process_path(full_path):
+    """
+    파일 하나 -> 스캔 행 (name, artist, albumName, stream_url, parent_path,
+    album_artist, track_no, disc_no, release_date, genre, duration).
+    제목/가수/앨범은 내장 태그가 있으면 태그를, 없으면 get_info 의 경로/파일명 추정을 씁니다.
+    """
     if not full_path: return None
     try:
-        return get_info(os.path.basename(full_path), os.path.dirname(full_path))
+        tit, art, alb, stream_url, rel_dir = get_info(os.path.basename(full_path), os.path.dirname(full_path))
     except:
         return None
+    tags = read_tags(full_path)
+    return (tags.get("title") or tit, tags.get("artist") or art, tags.get("album") or alb, stream_url, rel_dir,
+            tags.get("albumartist"), tag_number(tags.get("tracknumber")), tag_number(tags.get("discnumber")),
+            tags.get("date"), tags.get("genre"), tags.get("duration"))
+
+
+AUDIO_EXTS = ('.mp3', '.m4a', '.flac', '.dsf')
+
+
+def rel_dir(path):
+    """MUSIC_BASE 기준 상대 폴더 경로 (MUSIC_BASE 자신은 '')"""
+    rel = os.path.relpath(path, MUSIC_BASE)
+    return "" if rel == "." else rel
+
+
+def iter_changed_dirs(scan_root, snap_updates, snap_deletes, full=False):
+    """
+    dir_snapshots 에 기록된 mtime 과 비교해 바뀐 폴더만 목록을 읽고 (폴더, [오디오 파일명]) 을 돌려줍니다.
+    안 바뀐 폴더는 stat 한 번만 하고, 지난번에 기록해 둔 하위 폴더로 바로 내려갑니다.
+    (폴더 mtime 은 직속 항목이 추가/삭제/이름변경될 때만 바뀌므로 하위 폴더는 따로 확인해야 함)
+    새로 읽은 폴더의 스냅샷은 snap_updates 에, 사라진 하위 폴더는 snap_deletes 에 모아 둡니다.
+    """
+    root_rel = rel_dir(scan_root)
+    known, children = {}, {}
+    if not full:
+        with db_read() as conn:
+            if root_rel:
+                rows = conn.execute(
+                    "SELECT path, parent, mtime FROM dir_snapshots WHERE path = ? OR (path > ? AND path < ?)",
+                    (root_rel, root_rel + "/", root_rel + "0")
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT path, parent, mtime FROM dir_snapshots").fetchall()
+        for r in rows:
+            known[r['path']] = r['mtime']
+            children.setdefault(r['parent'], []).append(r['path'])
+
+    stack = [scan_root]
+    while stack:
+        d = stack.pop()
+        rel = rel_dir(d)
+        try:
+            mtime = os.stat(d).st_mtime
+        except OSError:
+            continue
+
+        if known.get(rel) == mtime:
+            stack.extend(os.path.join(MUSIC_BASE, c) for c in children.get(rel, ()))
+            continue
+
+        try:
+            with os.scandir(d) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = [e.path for e in entries if e.is_dir(follow_symlinks=False)]
+        files = [e.name for e in entries
+                 if e.is_file(follow_symlinks=False) and e.name.lower().endswith(AUDIO_EXTS)]
+
+        snap_updates.append((rel, os.path.dirname(rel) if rel else None, mtime, len(entries), time.time()))
+        snap_deletes.extend(set(children.get(rel, ())) - {rel_dir(sd) for sd in subdirs})
+        stack.extend(subdirs)
+        if files: yield d, files
+
+
+def save_dir_snapshots(snap_updates, snap_deletes):
+    """스캔이 끝난 뒤에만 기록 - 중간에 실패하면 다음 스캔이 같은 폴더를 다시 읽습니다."""
+    with db_write() as conn:
+        for path in snap_deletes:
+            conn.execute("DELETE FROM dir_snapshots WHERE path = ? OR (path > ? AND path < ?)",
+                         (path, path + "/", path + "0"))
+        conn.executemany("INSERT OR REPLACE INTO dir_snapshots (path, parent, mtime, entry_count, scanned_at) VALUES (?,?,?,?,?)",
+                         snap_updates)
+
+
+SCAN_QUEUE_SIZE = 64     # 단계 사이 큐에 쌓아 둘 최대 묶음(폴더) 수 - 라이브러리 크기와 무관하게 메모리 고정
+SCAN_BATCH_SIZE = 5000   # 한 번에 DB에 쓰는 곡 수
+SONG_DURATION_EPSILON = 0.5  # 같은 경로의 곡 길이가 이만큼(초) 넘게 달라지면 파일이 교체된 것으로 봄
+# 파일 경로(stream_url) 고유키 기준 upsert - 앨범 메타데이터는 albums 에 있으므로 곡 행에는 연결 id 와 곡 태그만 기록
+# (태그가 없는 행은 기존 장르/연도/앨범 가수 값을 지우지 않음)
+# 같은 경로에 길이가 다른 파일이 들어왔으면 예전 음량 분석 결과를 지워 다시 분석 대상(loudness_at NULL)으로 돌림
+SONG_REPLACED = f"excluded.duration IS NOT NULL AND (duration IS NULL OR ABS(excluded.duration - duration) > {SONG_DURATION_EPSILON})"
+UPSERT_SONG_SQL = f"""
+    INSERT INTO global_songs (name, artist, albumName, stream_url, parent_path,
+                              album_artist, track_no, disc_no, release_date, genre, duration, artist_id, album_id)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(stream_url) DO UPDATE SET
+        name = excluded.name, artist = excluded.artist, albumName = excluded.albumName, parent_path = excluded.parent_path,
+        album_artist = COALESCE(excluded.album_artist, album_artist), track_no = excluded.track_no,
+        disc_no = excluded.disc_no, release_date = COALESCE(excluded.release_date, release_date),
+        genre = COALESCE(excluded.genre, genre), duration = excluded.duration,
+        artist_id = excluded.artist_id, album_id = excluded.album_id,
+        lufs = CASE WHEN {SONG_REPLACED} THEN NULL ELSE lufs END,
+        rg_track_gain = CASE WHEN {SONG_REPLACED} THEN NULL ELSE rg_track_gain END,
+        rg_track_peak = CASE WHEN {SONG_REPLACED} THEN NULL ELSE rg_track_peak END,
+        loudness_at = CASE WHEN {SONG_REPLACED} THEN NULL ELSE loudness_at END
+"""
+PARSE_MODE = "process"   # 파싱 방식: "process"(프로세스 풀) / "thread"(스레드 풀) / "single"(단일 스레드)
+PARSE_WORKERS = os.cpu_count() or 4
+PARSE_CHUNK = 2000       # 풀 작업 하나에 담는 경로 수
+
+
+def run_stage(source, maxsize=SCAN_QUEUE_SIZE):
+    """
+    제너레이터 source 를 별도 스레드에서 돌리고 크기 제한 큐로 결과를 넘겨받습니다.
+    큐가 차면 앞 단계가 기다리므로 뒷 단계가 느려도 메모리가 늘지 않습니다.
+    source 의 예외는 소비하는 쪽에서 다시 발생합니다.
+    """
+    q = queue.Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump():
+        try:
+            for item in source:
+                if not put(item): return
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    Thread(target=pump, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is done: return
+            if isinstance(item, Exception): raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def parse_paths(paths):
+    """경로 묶음을 한 번에 파싱 (풀 작업 단위). 결과는 process_path 스캔 행 목록, 실패한 파일은 빠짐."""
+    return [r for r in map(process_path, paths) if r]
+
+
+def iter_path_chunks(listed, stats, size):
+    """폴더 단위 목록을 size 개 안팎의 경로 묶음으로 다시 묶음 (작업 하나당 오버헤드를 줄이기 위함)"""
+    chunk = []
+    for d, names in listed:
+        stats["listed_dirs"] += 1
+        stats["listed_files"] += len(names)
+        chunk.extend(os.path.join(d, n) for n in names)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def parse_stage(listed, stats, mode=None, workers=None):
+    """
+    경로 묶음 -> 스캔 행 목록 (파일당 정확히 한 번 파싱 + 태그 읽기).
+    get_info 는 순수 파이썬 정규식/문자열 작업이라 스레드로는 GIL 에 막히므로
+    기본은 프로세스 풀에 PARSE_CHUNK 개씩 보내는 방식입니다.
+    동시에 띄워 두는 작업 수를 workers * 2 로 제한해 메모리를 고정하고,
+    태그 헤더를 읽는 동시 파일 수도 workers 개로 묶여 네트워크 마운트에 부담이 커지지 않습니다.
+    """
+    mode = mode or PARSE_MODE
+    workers = workers or PARSE_WORKERS
+    chunks = iter_path_chunks(listed, stats, PARSE_CHUNK)
+
+    if mode == "single":
+        for paths in chunks:
+            rows = parse_paths(paths)
+            stats["parsed"] += len(paths)
+            yield rows
+        return
+
+    pool_cls = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as exe:
+        pending = deque()
+        for paths in chunks:
+            pending.append((exe.submit(parse_paths, paths), len(paths)))
+            if len(pending) >= workers * 2:
+                fut, n = pending.popleft()
+                rows = fut.result()
+                stats["parsed"] += n
+                yield rows
+        while pending:
+            fut, n = pending.popleft()
+            rows = fut.result()
+            stats["parsed"] += n
+            yield rows
+
+
+def song_changed(stored_duration, duration):
+    """이미 색인된 곡을 다시 저장해야 하는지: 태그 없이 색인됐던 곡을 태그와 함께 읽었거나, 길이가 달라짐(파일 교체)"""
+    return duration is not None and (stored_duration is None or abs(stored_duration - duration) > SONG_DURATION_EPSILON)
+
+
+def dedupe_stage(parsed, stats):
+    """
+    이미 색인된 곡을 폴더 단위로 걸러냄 (idx_path 인덱스로 해당 폴더만 조회).
+    태그 없이 색인됐던 곡(duration 없음)을 이번에 태그와 함께 읽었거나, 같은 경로의 파일이 길이가 다른
+    파일로 바뀌었으면 다시 저장합니다.
+    """
+    for rows in parsed:
+        by_dir = {}
+        for r in rows:
+            by_dir.setdefault(r[4], []).append(r)
+        fresh = []
+        with db_read() as conn:
+            for parent_path, dir_rows in by_dir.items():
+                stored = {r[0]: r[1] for r in conn.execute(
+                    "SELECT stream_url, duration FROM global_songs WHERE parent_path = ?", (parent_path,))}
+                fresh.extend(r for r in dir_rows if r[3] not in stored or song_changed(stored[r[3]], r[10]))
+        stats["skipped"] += len(rows) - len(fresh)
+        if fresh: yield fresh
+
+
+def update_scan_progress(display_name, stats, lister_done):
+    """단계별 실제 처리량으로 진행률/속도/남은 시간을 계산해 idx_st 에 반영"""
+    elapsed = time.time() - idx_st["start_time"]
+    processed = stats["skipped"] + stats["written"]
+    speed = int(stats["parsed"] / elapsed) if elapsed > 0 else 0
+    if not lister_done:
+        eta = f"목록 수집 중 ({stats['listed_files']:,}개 발견)"
+    elif speed > 0:
+        eta = f"{int((stats['listed_files'] - processed) / speed)}초"
+    else:
+        eta = "계산 중..."
+    idx_st.update({
+        "total_dirs": stats["listed_files"], "processed_dirs": processed, "songs_found": processed,
+        "speed": speed, "eta": eta, "stages": dict(stats),
+        "last_log": f"⏳ {display_name} 처리 중: 폴더 {stats['listed_dirs']:,}개 | 파싱 {stats['parsed']:,} | 신규 저장 {stats['written']:,}"
+    })
 
 
-def scan_all_songs(target_folder=None):
+def scan_all_songs(target_folder=None, full=False, parse_mode=None, parse_workers=None):
+    """호출하는 쪽이 claim_job("indexing") 으로 리스를 잡은 뒤 실행하며, 끝나면 리스를 놓습니다."""
     global idx_st
-    if idx_st["is_running"]: return
 
     # target_folder가 있으면 해당 폴더만, 없으면 전체(MUSIC_BASE)
     scan_root = os.path.join(MUSIC_BASE, target_folder) if target_folder and target_folder != "전체" else MUSIC_BASE
     display_name = target_folder if target_folder and target_folder != "전체" else "전체"
 
+    idx_stop.clear()
     idx_st.update({
         "is_running": True, "songs_found": 0, "processed_dirs": 0, "total_dirs": 0,
         "start_time": time.time(), "speed": 0, "eta": "계산 중...",
-        "last_log": f"🚀 [{display_name}] 스캔 엔진 가동! 목록 수집 중..."
+        "last_log": f"🚀 [{display_name}] 스캔 엔진 가동! 변경된 폴더 확인 중..."
     })
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute(f"PRAGMA temp_store_directory = '{WRITEABLE_DIR}'")
-            conn.execute("PRAGMA journal_mode = WAL")
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS global_songs_staging (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT, artist TEXT, albumName TEXT,
-                    stream_url TEXT, parent_path TEXT, meta_poster TEXT,
-                    genre TEXT, release_date TEXT, album_artist TEXT
-                )
-            """)
-            try: conn.execute("ALTER TABLE global_songs_staging ADD COLUMN albumName TEXT")
-            except: pass
-            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_staging_url ON global_songs_staging(stream_url)")
-
-            cursor = conn.execute("SELECT stream_url FROM global_songs_staging UNION SELECT stream_url FROM global_songs")
-            indexed_urls = {row[0] for row in cursor.fetchall()}
-
-        # [수정] scan_root를 사용하여 선택한 폴더만 탐색
-        command = ['find', scan_root, '-type', 'f', '(', '-iname', '*.mp3', '-o', '-iname', '*.m4a', '-o', '-iname',
-                   '*.flac', '-o', '-iname', '*.dsf', ')']
-        all_files = []
-        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-        for line in iter(proc.stdout.readline, ''):
-            all_files.append(line.strip())
-            if len(all_files) % 10000 == 0:
-                idx_st["last_log"] = f"🔍 {display_name} 파일 탐색 중... {len(all_files):,}개 발견"
-        proc.wait()
-
-        total_files = len(all_files)
-        idx_st["total_dirs"] = total_files
-
-        files_to_process = []
-        skipped_count = 0
-        for f in all_files:
-            info = get_info(os.path.basename(f), os.path.dirname(f))
-            if info[3] in indexed_urls:
-                skipped_count += 1
-            else:
-                files_to_process.append(f)
-
-        idx_st["processed_dirs"] = skipped_count
-        idx_st["songs_found"] = skipped_count
-
-        if not files_to_process:
-            idx_st["last_log"] = f"✅ [{display_name}] 추가할 새 파일이 없습니다."
-        else:
-            idx_st["last_log"] = f"⏭️ {skipped_count:,}곡 유지, 새 파일 {len(files_to_process):,}곡 처리 시작!"
-            batch = []
-            BATCH_SIZE = 5000
-            processing_start = time.time()
-            done_in_this_run = 0
-
-            with ThreadPoolExecutor(max_workers=12) as exe:
-                futures = {exe.submit(process_path, f): f for f in files_to_process}
-                for future in as_completed(futures):
-                    res = future.result()
-                    if res: batch.append(res)
-                    if len(batch) >= BATCH_SIZE:
-                        with sqlite3.connect(DB_PATH) as conn:
-                            conn.executemany("INSERT OR IGNORE INTO global_songs_staging (name, artist, albumName, stream_url, parent_path, meta_poster) VALUES (?,?,?,?,?,NULL)", batch)
-                            conn.commit()
-                        done_in_this_run += len(batch)
-                        idx_st["processed_dirs"] = skipped_count + done_in_this_run
-                        elapsed = time.time() - processing_start
-                        speed = int(done_in_this_run / elapsed) if elapsed > 0 else 0
-                        idx_st.update({"speed": speed, "last_log": f"⏳ {display_name} 처리 중: {idx_st['processed_dirs']:,} / {total_files:,}"})
-                        batch = []
-
-            if batch:
-                with sqlite3.connect(DB_PATH) as conn:
-                    conn.executemany("INSERT OR IGNORE INTO global_songs_staging (name, artist, albumName, stream_url, parent_path, meta_poster) VALUES (?,?,?,?,?,NULL)", batch)
-                    conn.commit()
+        # 목록(변경 폴더만) -> 파싱 -> 중복 제거 -> 묶음 저장, 각 단계는 크기 제한 큐로 연결
+        snap_updates, snap_deletes = [], []
+        stats = {"listed_dirs": 0, "listed_files": 0, "parsed": 0, "skipped": 0, "written": 0}
+        lister_state = {"done": False}
+        link_ids = {}
+        touched = {"artists": set(), "albums": set()}  # 이번 스캔에서 곡이 들어오거나 떠난 가수/앨범 (마무리 정리 대상)
+
+        def lister():
+            for item in iter_changed_dirs(scan_root, snap_updates, snap_deletes, full=full):
+                if idx_stop.is_set(): return  # 뒤 단계는 이미 받은 묶음만 마저 흘려보내고 끝남
+                yield item
+            lister_state["done"] = True
+
+        def write_batch(rows):
+            with db_write() as conn:
+                # 다시 저장되는 곡이 원래 붙어 있던 가수/앨범도 정리 대상 (태그로 다른 앨범에 옮겨 갔을 수 있음)
+                for r in conn.execute(f"""SELECT artist_id, album_id FROM global_songs
+                                          WHERE stream_url IN (SELECT value FROM json_each(?))""",
+                                      (json.dumps([r[3] for r in rows]),)):
+                    touched["artists"].add(r[0])
+                    touched["albums"].add(r[1])
+                linked = link_rows(conn, rows, link_ids)
+                conn.executemany(UPSERT_SONG_SQL, linked)
+                # 분석 대기 곡(새 곡, 교체된 곡)이 생긴 앨범의 ReplayGain 앨범 값은 더 이상 맞지 않음 -> 다 분석되면 다시 계산
+                conn.execute("""UPDATE albums SET rg_album_gain = NULL, rg_album_peak = NULL
+                                WHERE rg_album_gain IS NOT NULL AND id IN (
+                                    SELECT album_id FROM global_songs
+                                    WHERE stream_url IN (SELECT value FROM json_each(?)) AND loudness_at IS NULL)""",
+                             (json.dumps([r[3] for r in rows]),))
+                # 이 묶음의 곡이 들어간 폴더와 그 상위 폴더만 다시 계산 (스캔이 끝날 때 트리 전체를 다시 만들지 않음)
+                update_folders(conn, {r[4] for r in rows})
+            touched["artists"].update(l[11] for l in linked)
+            touched["albums"].update(l[12] for l in linked)
+            stats["written"] += len(rows)
+            bump_library_generation()
+
+        batch = []
+        parsed = run_stage(parse_stage(run_stage(lister()), stats, mode=parse_mode, workers=parse_workers))
+        fresh = run_stage(dedupe_stage(parsed, stats))
+        for rows in fresh:
+            if idx_stop.is_set(): continue  # 중지: 남은 묶음은 저장하지 않고 흘려보냄
+            batch.extend(rows)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                write_batch(batch)
+                batch = []
+            update_scan_progress(display_name, stats, lister_state["done"])
+        if idx_stop.is_set():
+            # 스냅샷을 남기지 않으므로 다음 스캔이 같은 폴더를 다시 확인 (이미 저장된 곡은 중복 제거 단계에서 건너뜀)
+            idx_st.update({"is_running": False, "last_log": f"⏹️ [{display_name}] 스캔 중지됨 (저장 {stats['written']:,}곡)"})
+            return
+        if batch: write_batch(batch)
+        update_scan_progress(display_name, stats, True)
 
-        idx_st["last_log"] = f"💾 [{display_name}] 라이브러리 병합 중..."
-        finalize_library()
+        save_dir_snapshots(snap_updates, snap_deletes)
+        idx_st["last_log"] = f"💾 [{display_name}] 라이브러리 병합 중... (새 파일 {stats['written']:,}곡)"
+        finalize_library(touched, snap_deletes)
 
     except Exception as e:
         idx_st.update({"is_running": False, "last_log": f"❌ 오류: {str(e)}"})
+    finally:
+        release_job("indexing")
 
-def finalize_library():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("PRAGMA journal_mode = WAL")
-        # [수정] 모든 컬럼을 명시하여 데이터 유실 방지
-        conn.execute("""
-            INSERT OR IGNORE INTO global_songs_staging (name, artist, albumName, stream_url, parent_path, meta_poster, genre, release_date, album_artist)
-            SELECT name, artist, albumName, stream_url, parent_path, meta_poster, genre, release_date, album_artist FROM global_songs
-        """)
-
-        # (중략: 메타데이터 복구 쿼리 동일)
-        conn.execute("""
-            UPDATE global_songs_staging
-            SET meta_poster = (SELECT meta_poster FROM global_songs WHERE global_songs.artist = global_songs_staging.artist AND global_songs.albumName = global_songs_staging.albumName AND meta_poster IS NOT NULL LIMIT 1)
-            WHERE meta_poster IS NULL
-        """)
-
-        conn.execute("DROP TABLE IF EXISTS global_songs")
-        conn.execute("ALTER TABLE global_songs_staging RENAME TO global_songs")
-        # 인덱스 재생성
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_grouping ON global_songs(artist, albumName)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_meta_lookup ON global_songs(artist, albumName)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_path ON global_songs(parent_path)")
-        conn.commit()
+def finalize_library(touched, removed_dirs=()):
+    """
+    스캔 마무리. 곡은 스캔 중에 global_songs 에 바로 upsert 되고(폴더 트리도 묶음마다 해당 경로만 갱신), 새 곡은 albums 를 통해
+    같은 앨범의 기존 메타데이터를 자동으로 공유하므로 아티스트 목록 캐시만 갱신합니다.
+    사라진 폴더의 곡을 지우고, 태그로 가수/앨범이 바뀌었거나 폴더가 사라져 곡이 모두 떠난 앨범을 정리합니다.
+    정리와 아티스트 캐시 갱신은 touched(이번 스캔이 건드린 가수/앨범 id)만 보므로 비용이 바뀐 파일 수에 비례합니다.
+    새 앨범은 내장 커버를 먼저 꺼내 포스터로 씁니다 (없는 앨범만 메타데이터 엔진이 네트워크로 찾음).
+    """
+    with db_write() as conn:
+        for path in removed_dirs:
+            where = "parent_path = ? OR (parent_path > ? AND parent_path < ?)"
+            span = (path, path + "/", path + "0")
+            for r in conn.execute(f"SELECT DISTINCT artist_id, album_id FROM global_songs WHERE {where}", span):
+                touched["artists"].add(r[0])
+                touched["albums"].add(r[1])
+            conn.execute(f"DELETE FROM global_songs WHERE {where}", span)
+            # 사라진 폴더의 하위 트리는 통째로 지우고, 남은 상위 폴더만 다시 계산
+            conn.execute("DELETE FROM folders WHERE path = ? OR (path > ? AND path < ?)", span)
+        update_folders(conn, [path.rsplit('/', 1)[0] for path in removed_dirs if '/' in path])
+        conn.executemany("DELETE FROM albums WHERE id = ? AND NOT EXISTS (SELECT 1 FROM global_songs WHERE album_id = ?)",
+                         [(i, i) for i in touched["albums"] if i is not None])
+    art_albums = extract_embedded_art()
+    refresh_artist_cache({i for i in touched["artists"] if i is not None})
+    if art_albums:
+        refresh_folders(art_albums)  # 내장 커버를 찾은 앨범의 폴더 대표 이미지
+    bump_library_generation()
     idx_st.update({"is_running": False, "last_log": "✅ 라이브러리 업데이트 완료!"})
 
 
@@ -921,13 +1904,16 @@ def rebuild_library():
                  for s in os.scandir(i.path) if s.is_dir()]
         if all_a: a_list = random.sample(all_a, min(len(all_a), 60))
 
-    with sqlite3.connect(DB_PATH) as conn:
+    if theme_stop.is_set():
+        print("[*] ⏹️ 테마 갱신 중지됨 (작업 리스를 다른 워커가 가져감)")
+        return
+    with db_write() as conn:
         conn.execute("DELETE FROM themes")
         for t, l in [('charts', c_list), ('collections', m_list), ('artists', a_list), ('genres', g_list)]:
             for item in l:
                 # [개선] meta_poster가 NULL, 'FAIL', 빈 문자열이 아닌 정상적인 URL만 가져오도록 함
                 row = conn.execute(
-                    "SELECT meta_poster FROM global_songs WHERE parent_path LIKE ? AND meta_poster IS NOT NULL AND meta_poster != 'FAIL' AND meta_poster != '' LIMIT 1",
+                    f"SELECT al.poster FROM {SONG_FROM} WHERE s.parent_path LIKE ? AND al.poster IS NOT NULL AND al.poster != 'FAIL' AND al.poster != '' LIMIT 1",
                     (f"{item['path']}%",)
                 ).fetchone()
                 img = row[0] if row else None
@@ -937,6 +1923,7 @@ def rebuild_library():
         conn.commit()
 
     cache.update({"charts": c_list, "collections": m_list, "artists": a_list, "genres": g_list})
+    bump_library_generation(themes=True)
     print(f"[*] ✅ 테마 이미지 갱신 완료! (차트:{len(c_list)}, 모음:{len(m_list)}, 가수:{len(a_list)})")
     load_cache()
 
@@ -1034,9 +2021,208 @@ def fetch_metadata_smart(artist, album, title, folder_type=None):
             elif engine == "itunes":
                 res = fetch_itunes_metadata(a_q, b_q)
             if res and res.get('poster'): return res
-        time.sleep(0.1)
     return None
 
+# ------------------------------------------
+# 제공자 응답 캐시
+# ------------------------------------------
+PROVIDER_HIT_TTL = 30 * 86400  # 찾은 결과는 오래 보관
+PROVIDER_MISS_TTL = 3 * 86400  # 못 찾은 결과는 짧게 (제공자 쪽에 새로 등록될 수 있으므로)
+
+_provider_ctx = threading.local()
+
+# 연결을 재사용하는 공용 HTTP 세션 (요청마다 TCP/TLS 연결을 새로 맺지 않음)
+http_session = requests.Session()
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=META_CONCURRENCY))
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=META_CONCURRENCY))
+
+# 제공자별 토큰 버킷 + 적응형 동시 요청 한도 + 차단기 (엔진 작업 스레드들이 함께 씀)
+provider_buckets = {
+    name: {"tokens": float(lim["burst"]), "at": time.monotonic(), "lock": threading.Lock(), "waited": 0.0, "requests": 0,
+           # 아래는 cond 로 보호
+           "cond": threading.Condition(), "limit": float(lim["concurrency"]), "in_flight": 0, "cut_at": 0.0,
+           "latency": 0.0, "outcomes": deque(maxlen=PROVIDER_WINDOW), "fails_in_row": 0,
+           "circuit": "closed", "open_until": 0.0, "cooldown": PROVIDER_COOLDOWN[0], "probing": False, "trips": 0}
+    for name, lim in PROVIDER_LIMITS.items()
+}
+meta_stop = threading.Event()  # 엔진 중지 시 토큰 대기 중인 요청을 바로 풀어 줌
+
+
+def acquire_provider_token(provider):
+    """토큰이 생길 때까지 기다림. 엔진 중지 신호가 오면 False"""
+    lim, bucket = PROVIDER_LIMITS[provider], provider_buckets[provider]
+    while True:
+        with bucket["lock"]:
+            now = time.monotonic()
+            bucket["tokens"] = min(lim["burst"], bucket["tokens"] + (now - bucket["at"]) * lim["rate"])
+            bucket["at"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                bucket["requests"] += 1
+                return True
+            wait = (1 - bucket["tokens"]) / lim["rate"]
+            bucket["waited"] += wait
+        if meta_stop.wait(wait):
+            return False
+
+
+def admit_provider_request(provider):
+    """
+    차단기 확인. closed 면 통과, open 이면 거절,
+    대기 시간이 지나면 half_open 으로 바꾸고 시험 요청 하나만 통과시킵니다.
+    """
+    bucket = provider_buckets[provider]
+    with bucket["cond"]:
+        if bucket["circuit"] == "open":
+            if time.monotonic() < bucket["open_until"]:
+                return False
+            bucket["circuit"] = "half_open"
+            bucket["probing"] = False
+        if bucket["circuit"] == "half_open":
+            if bucket["probing"]:
+                return False
+            bucket["probing"] = True
+        return True
+
+
+def acquire_provider_slot(provider):
+    """진행 중인 요청 수가 현재 한도(limit) 아래로 내려갈 때까지 기다림. 엔진 중지 시 False"""
+    bucket = provider_buckets[provider]
+    with bucket["cond"]:
+        while bucket["in_flight"] >= int(bucket["limit"]):
+            if meta_stop.is_set():
+                return False
+            bucket["cond"].wait(0.2)
+        bucket["in_flight"] += 1
+        return True
+
+
+def release_provider_slot(provider, ok, elapsed):
+    """
+    요청 결과를 반영합니다.
+    - AIMD: 성공하면 한도를 요청 한 번에 1/limit 씩(대략 한 바퀴에 +1) 올리고,
+      실패하거나 평균 응답이 PROVIDER_SLOW_SECONDS 보다 느리면 절반으로 줄임 (응답 시간 한 번에 한 번만)
+    - 차단기: 연속 실패/오류율이 기준을 넘으면 open. half_open 시험 요청이 성공하면 closed, 실패하면 대기 시간을 늘려 다시 open
+    """
+    bucket, cap = provider_buckets[provider], PROVIDER_LIMITS[provider]["concurrency"]
+    with bucket["cond"]:
+        now = time.monotonic()
+        bucket["in_flight"] -= 1
+        bucket["latency"] = elapsed if not bucket["outcomes"] else bucket["latency"] * 0.8 + elapsed * 0.2
+        bucket["outcomes"].append(ok)
+        bucket["fails_in_row"] = 0 if ok else bucket["fails_in_row"] + 1
+
+        if ok and bucket["latency"] < PROVIDER_SLOW_SECONDS:
+            bucket["limit"] = min(cap, bucket["limit"] + 1 / bucket["limit"])
+        elif now - bucket["cut_at"] >= max(bucket["latency"], 1.0):
+            bucket["limit"] = max(1.0, bucket["limit"] / 2)
+            bucket["cut_at"] = now
+
+        if bucket["circuit"] == "half_open" and bucket["probing"]:
+            bucket["probing"] = False
+            if ok:
+                bucket.update(circuit="closed", cooldown=PROVIDER_COOLDOWN[0], fails_in_row=0)
+                bucket["outcomes"].clear()
+            else:
+                bucket["cooldown"] = min(PROVIDER_COOLDOWN[1], bucket["cooldown"] * 2)
+                bucket.update(circuit="open", open_until=now + bucket["cooldown"])
+        elif bucket["circuit"] == "closed" and not ok:
+            errors = bucket["outcomes"].count(False)
+            if (bucket["fails_in_row"] >= PROVIDER_TRIP_FAILURES or
+                    (len(bucket["outcomes"]) >= PROVIDER_WINDOW // 2 and errors / len(bucket["outcomes"]) >= PROVIDER_TRIP_ERROR_RATE)):
+                bucket.update(circuit="open", open_until=now + bucket["cooldown"], trips=bucket["trips"] + 1)
+                print(f"[!] {provider} 차단기 열림: {bucket['cooldown']}초 후 시험 요청")
+        bucket["cond"].notify_all()
+
+
+def provider_state(provider):
+    """/api/metadata/status 용 제공자 상태 요약"""
+    bucket = provider_buckets[provider]
+    with bucket["cond"]:
+        outcomes = bucket["outcomes"]
+        return {"requests": bucket["requests"], "waited_s": round(bucket["waited"], 1),
+                "circuit": bucket["circuit"], "trips": bucket["trips"],
+                "retry_in_s": round(max(0.0, bucket["open_until"] - time.monotonic()), 1) if bucket["circuit"] == "open" else 0,
+                "concurrency": round(bucket["limit"], 1), "max_concurrency": PROVIDER_LIMITS[provider]["concurrency"],
+                "in_flight": bucket["in_flight"], "latency_ms": round(bucket["latency"] * 1000),
+                "error_rate": round(outcomes.count(False) / len(outcomes), 2) if outcomes else 0.0}
+
+
+def mark_provider_failed():
+    # failed: provider_cached 가 이번 호출 결과를 캐시하지 않게 함
+    # transient: 앨범 매칭 전체에서 일시 장애가 있었음 -> FAIL 대신 재시도
+    _provider_ctx.failed = True
+    _provider_ctx.transient = True
+
+
+def provider_request(provider, url, timeout=5, **kw):
+    """
+    제공자 HTTP 요청. 차단기, 제공자별 토큰 버킷, 적응형 동시 요청 한도를 거쳐 공용 세션으로 보냅니다.
+    네트워크 오류나 5xx/429 는 '결과 없음'이 아니라 '실패'로 표시해서
+    provider_cached 가 이 응답을 미스로 캐시하지 않고, 엔진이 앨범을 FAIL 대신 재시도하게 합니다.
+    """
+    if not admit_provider_request(provider):
+        mark_provider_failed()
+        raise RuntimeError(f"{provider} 차단 중")
+    if not acquire_provider_token(provider) or not acquire_provider_slot(provider):
+        with provider_buckets[provider]["cond"]:
+            provider_buckets[provider]["probing"] = False
+        mark_provider_failed()
+        raise RuntimeError("메타데이터 엔진 중지됨")
+    ok, t0 = False, time.monotonic()
+    try:
+        res = http_session.get(url, timeout=timeout, **kw)
+        ok = not (res.status_code == 429 or res.status_code >= 500)
+    finally:
+        release_provider_slot(provider, ok, time.monotonic() - t0)
+        if not ok:
+            mark_provider_failed()
+    return res
+
+
+def provider_cached(provider):
+    """
+    fetch_*_metadata 용 데코레이터. (제공자, 정규화한 질의) 로 provider_cache 를 먼저 보고,
+    없거나 만료됐을 때만 실제로 요청합니다. 결과 없음도 PROVIDER_MISS_TTL 동안 캐시합니다.
+    """
+    def wrap(fn):
+        @wraps(fn)
+        def cached(*args, **kwargs):
+            query = "\x1f".join([norm_key(a) for a in args] + [f"{k}={norm_key(v)}" for k, v in sorted(kwargs.items())])
+            now = time.time()
+            try:
+                with db_read() as conn:
+                    row = conn.execute("SELECT result, fetched_at FROM provider_cache WHERE provider = ? AND query = ?",
+                                       (provider, query)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row and now - row['fetched_at'] < (PROVIDER_HIT_TTL if row['result'] else PROVIDER_MISS_TTL):
+                record_cache_lookup(hit=True)
+                return json.loads(row['result']) if row['result'] else None
+
+            record_cache_lookup(hit=False)
+            _provider_ctx.failed = False
+            res = fn(*args, **kwargs)
+            if res or not _provider_ctx.failed:
+                try:
+                    with db_write() as conn:
+                        conn.execute("INSERT OR REPLACE INTO provider_cache (provider, query, result, fetched_at) VALUES (?, ?, ?, ?)",
+                                     (provider, query, json.dumps(res, ensure_ascii=False) if res else None, now))
+                except sqlite3.Error as e:
+                    print(f"[!] 제공자 캐시 저장 실패: {e}")
+            return res
+        return cached
+    return wrap
+
+
+def record_cache_lookup(hit):
+    """캐시 적중/미스 집계 (엔진 작업 스레드들이 동시에 부르므로 update_lock 안에서)"""
+    with update_lock:
+        up_st["cache_hits" if hit else "cache_misses"] += 1
+        total = up_st["cache_hits"] + up_st["cache_misses"]
+        up_st["cache_hit_rate"] = round(up_st["cache_hits"] / total, 3)
+
+
 def fetch_deezer_metadata(artist, title_or_album):
     if not title_or_album: return None
     try:
@@ -1045,14 +2231,14 @@ def fetch_deezer_metadata(artist, title_or_album):
         if artist and artist != 'Unknown Artist':
             query = f'artist:"{artist}" ' + query
 
-        url = f"https://api.deezer.com/search?q={urllib.parse.quote(query)}&limit=1"
-        res = requests.get(url, timeout=5).json()
+        url = f"{DEEZER_API}/search?q={urllib.parse.quote(query)}&limit=1"
+        res = provider_request("deezer", url, timeout=5).json()
 
         # 2. 결과 없으면 일반 텍스트 검색으로 재시도
         if (not res.get("data") or len(res["data"]) == 0) and artist:
             query_gen = f"{artist} {title_or_album}"
-            url = f"https://api.deezer.com/search?q={urllib.parse.quote(query_gen)}&limit=1"
-            res = requests.get(url, timeout=5).json()
+            url = f"{DEEZER_API}/search?q={urllib.parse.quote(query_gen)}&limit=1"
+            res = provider_request("deezer", url, timeout=5).json()
 
         if res.get("data") and len(res["data"]) > 0:
             track = res["data"][0]
@@ -1063,12 +2249,13 @@ def fetch_deezer_metadata(artist, title_or_album):
         pass
     return None
 
+@provider_cached("maniadb")
 def fetch_maniadb_metadata(artist, album):
     # 앨범으로 먼저 찾고, 없으면 곡(song)으로 한 번 더 찾습니다.
     for mode in ['album', 'song']:
         try:
-            url = f"http://www.maniadb.com/api/search/{urllib.parse.quote(f'{artist} {album}')}/?sr={mode}&display=1&key=example&v=0.5"
-            res = requests.get(url, timeout=8, headers={'User-Agent': 'Mozilla/5.0'})
+            url = f"{MANIADB_API}/api/search/{urllib.parse.quote(f'{artist} {album}')}/?sr={mode}&display=1&key=example&v=0.5"
+            res = provider_request("maniadb", url, timeout=8, headers={'User-Agent': 'Mozilla/5.0'})
             if res.status_code == 200:
                 img = re.search(r'<image><!\[CDATA\[(.*?)]]>', res.text)
                 if img: return {"poster": img.group(1).replace("/s/", "/l/"), "genre": "K-Pop"}
@@ -1077,13 +2264,14 @@ def fetch_maniadb_metadata(artist, album):
     return None
 
 
+@provider_cached("itunes")
 def fetch_itunes_metadata(artist, term):
     """서구권 음원에 가장 강력한 iTunes API (고해상도 커버 지원)"""
     if not term: return None
     try:
         q = f"{artist} {term}".strip()
-        url = f"https://itunes.apple.com/search?term={urllib.parse.quote(q)}&limit=1&entity=song"
-        res = requests.get(url, timeout=5).json()
+        url = f"{ITUNES_API}/search?term={urllib.parse.quote(q)}&limit=1&entity=song"
+        res = provider_request("itunes", url, timeout=5).json()
         if res.get("resultCount", 0) > 0:
             item = res["results"][0]
             # 100x100 이미지를 1000x1000 고해상도로 변경
@@ -1098,14 +2286,15 @@ def fetch_itunes_metadata(artist, term):
     return None
 
 
+@provider_cached("deezer")
 def fetch_deezer_metadata(artist, term, search_type="track"):
     """search_type을 track 또는 album으로 명확히 구분"""
     if not term: return None
     try:
         # 1. Strict Search (필터 사용)
         q = f'artist:"{artist}" {search_type}:"{term}"' if artist else f'{search_type}:"{term}"'
-        url = f"https://api.deezer.com/search?q={urllib.parse.quote(q)}&limit=1"
-        res = requests.get(url, timeout=5).json()
+        url = f"{DEEZER_API}/search?q={urllib.parse.quote(q)}&limit=1"
+        res = provider_request("deezer", url, timeout=5).json()
 
         if res.get("data"):
             data = res["data"][0]
@@ -1115,8 +2304,8 @@ def fetch_deezer_metadata(artist, term, search_type="track"):
 
         # 2. Fuzzy Search (실패 시 일반 키워드 검색)
         q_gen = f"{artist} {term}"
-        url_gen = f"https://api.deezer.com/search?q={urllib.parse.quote(q_gen)}&limit=1"
-        res_gen = requests.get(url_gen, timeout=5).json()
+        url_gen = f"{DEEZER_API}/search?q={urllib.parse.quote(q_gen)}&limit=1"
+        res_gen = provider_request("deezer", url_gen, timeout=5).json()
         if res_gen.get("data"):
             data = res_gen["data"][0]
             alb = data.get('album', {})
@@ -1131,11 +2320,13 @@ def update_theme_incremental(category, name, path, poster_url=None):
     기존 테마 DB를 삭제하지 않고, 변경된 아티스트/앨범 정보만 갱신(UPSERT)합니다.
     """
     try:
-        with sqlite3.connect(DB_PATH, timeout=60) as conn:
+        with db_write() as conn:
             # 1. 포스터 URL이 없으면 DB에서 최신 정보를 재조회
             if not poster_url:
                 row = conn.execute(
-                    "SELECT meta_poster FROM global_songs WHERE (artist=? OR albumName=?) AND meta_poster IS NOT NULL AND meta_poster != 'FAIL' LIMIT 1",
+                    """SELECT al.poster FROM albums al JOIN artists ar ON ar.id = al.artist_id
+                       WHERE (ar.sort_key = norm_key(?) OR al.sort_key = norm_key(?))
+                       AND al.poster IS NOT NULL AND al.poster != 'FAIL' LIMIT 1""",
                     (name, name)
                 ).fetchone()
                 poster_url = row[0] if row else None
@@ -1150,12 +2341,134 @@ def update_theme_incremental(category, name, path, poster_url=None):
         print(f"[!] 테마 갱신 에러: {e}")
 
 
-def start_metadata_update_thread(query_tag=None):
-    global up_st
-    if up_st["is_running"]: return
+# ------------------------------------------
+# 메타데이터 매칭 대기열 (우선순위)
+# ------------------------------------------
+META_PRIORITIES = {"demand": 0, "backlog": 1}  # 작을수록 먼저. demand: 사용자가 방금 화면에서 본 앨범
+META_DEMAND_TARGET = "요청 앨범"  # backlog 없이 대기열만 처리하는 실행의 표시 이름
+META_TARGET_WHERE = """(al.poster IS NULL OR al.poster = '' OR al.poster = 'FAIL')
+                       AND ar.name != 'Unknown Artist' AND ar.name != ''"""
+
+meta_heap = []  # (우선순위, 순번, album_id)
+meta_queued = {}  # album_id -> 현재 우선순위. 우선순위가 올라가면 힙에 남은 예전 항목은 꺼낼 때 버림
+meta_cond = threading.Condition()
+meta_seq = itertools.count()
+meta_sched = {"thread": None}
+
+
+def enqueue_meta(album_ids, priority="backlog"):
+    """앨범들을 매칭 대기열에 넣음. 이미 있으면 더 높은 우선순위로만 올림. 새로 들어간 수를 반환"""
+    rank = META_PRIORITIES[priority]
+    added = 0
+    with meta_cond:
+        for album_id in album_ids:
+            old = meta_queued.get(album_id)
+            if old is not None and old <= rank:
+                continue
+            added += old is None
+            meta_queued[album_id] = rank
+            heapq.heappush(meta_heap, (rank, next(meta_seq), album_id))
+        meta_cond.notify_all()
+    if added and up_st["is_running"]:
+        with update_lock:
+            up_st["total"] += added
+    return added
+
+
+def pop_meta():
+    """대기열에서 가장 급한 album_id 하나. 비었으면 None"""
+    with meta_cond:
+        while meta_heap:
+            rank, _, album_id = heapq.heappop(meta_heap)
+            if meta_queued.get(album_id) == rank:
+                del meta_queued[album_id]
+                return album_id
+        return None
 
+
+def clear_meta_queue():
+    with meta_cond:
+        meta_heap.clear()
+        meta_queued.clear()
+
+
+def meta_queue_depths():
+    """우선순위별 대기 중인 앨범 수"""
+    names = {rank: name for name, rank in META_PRIORITIES.items()}
+    depths = dict.fromkeys(META_PRIORITIES, 0)
+    with meta_cond:
+        for rank in meta_queued.values():
+            depths[names[rank]] += 1
+    return depths
+
+
+def hint_missing_art(rows, id_key="album_id", poster_key="meta_poster"):
+    """
+    응답에 나간 앨범 중 아직 포스터가 없는 것(FAIL 은 제외)을 대기열 맨 앞(demand)으로 올립니다.
+    응답을 늦추지 않도록 DB 를 다시 읽지 않고 이미 조회한 행만 봅니다.
+    """
+    ids = {r[id_key] for r in rows if r[id_key] and not r[poster_key]}
+    if ids:
+        enqueue_meta(ids, "demand")
+        ensure_meta_scheduler()
+
+
+def ensure_meta_scheduler():
+    with meta_cond:
+        if meta_sched["thread"] is None:
+            meta_sched["thread"] = Thread(target=meta_scheduler, daemon=True, name="meta-scheduler")
+            meta_sched["thread"].start()
+
+
+def meta_scheduler():
+    """
+    백그라운드 상주 스레드. 엔진이 돌고 있으면 그 실행이 대기열을 함께 비우므로 기다리고,
+    쉬고 있을 때 대기열에 앨범이 있으면 대기열만 처리하는 실행을 시작합니다.
+    다른 워커가 엔진 리스를 쥐고 있으면 대기열을 meta_demand 로 넘기고, 넘겨받은 앨범이 있는데
+    아무도 돌리지 않으면 이 워커가 실행을 시작합니다.
+    """
+    while True:
+        with meta_cond:
+            meta_cond.wait_for(lambda: meta_queued and not up_st["is_running"], timeout=JOB_SYNC_INTERVAL)
+            local = bool(meta_queued)
+        if up_st["is_running"] or not (local or has_forwarded_meta_demand()):
+            continue
+        if claim_job("metadata"):
+            start_metadata_update_thread(backlog=False)
+        elif meta_queued:
+            forward_meta_demand()  # 다른 워커가 엔진을 돌리는 중 -> 그 워커의 대기열로 넘김
+        time.sleep(1)
+
+
+def queue_meta_backlog(query_tag=None):
+    """1~2단계: 가수명 복구 후 포스터 없는 앨범을 backlog 우선순위로 대기열에 넣음. 새로 넣은 수를 반환"""
+    display_name = query_tag if query_tag else "전체"
+    up_st["last_log"] = f"[*] 1단계: {display_name} 가수명 일괄 복구 중..."
+    fix_unknown_artists_in_db(target_tag=query_tag)
+    up_st["last_log"] = f"[*] 2단계: {display_name} 매칭 대상 조회 중..."
+
+    with db_read() as conn:
+        # 앨범 테이블에서 바로 대상 선정 (곡 전체 GROUP BY 불필요). 검색어는 매칭할 때 앨범별로 읽음
+        sql = f"SELECT al.id FROM {ALBUM_FROM} WHERE {META_TARGET_WHERE}"
+        params = []
+        if query_tag:
+            sql += " AND al.category = ?"
+            params.append(query_tag)
+        sql += " LIMIT 30000"
+        ids = [r[0] for r in conn.execute(sql, params)]
+    return enqueue_meta(ids, "backlog")
+
+
+def start_metadata_update_thread(query_tag=None, backlog=True):
+    """
+    매칭 엔진 한 번 실행. backlog 면 대상 앨범을 대기열에 채운 뒤 시작하고,
+    아니면(meta_scheduler) 이미 들어와 있는 대기열만 비웁니다. 어느 쪽이든 도중에 들어온 demand 앨범이 먼저 처리됩니다.
+    호출하는 쪽이 claim_job("metadata") 으로 리스를 잡은 뒤 실행하며, 끝나면 리스를 놓습니다.
+    """
+    global up_st
     up_st["is_running"] = True
-    up_st["target"] = query_tag if query_tag else "전체"
+    meta_stop.clear()
+    up_st["target"] = (query_tag if query_tag else "전체") if backlog else META_DEMAND_TARGET
     display_name = up_st["target"]
 
     # 테마 갱신을 위한 큐와 워커 스레드 설정
@@ -1170,156 +2483,504 @@ def start_metadata_update_thread(query_tag=None):
 
     Thread(target=theme_worker, daemon=True).start()
 
-    up_st["last_log"] = f"[*] 1단계: {display_name} 가수명 일괄 복구 중..."
-
     try:
-        fix_unknown_artists_in_db(target_tag=query_tag)
-        up_st["last_log"] = f"[*] 2단계: {display_name} 매칭 대상 조회 중..."
-
-        with sqlite3.connect(DB_PATH, timeout=120) as conn:
-            conn.row_factory = sqlite3.Row
-            sql = """SELECT artist, albumName, MAX(name) as title
-                     FROM global_songs
-                     WHERE (meta_poster IS NULL OR meta_poster = '' OR meta_poster = 'FAIL')
-                     AND artist != 'Unknown Artist' AND artist != '' """
-            params = []
-            if query_tag:
-                sql += " AND parent_path LIKE ?"
-                params.append(f"{query_tag}%")
-            sql += " GROUP BY artist, albumName LIMIT 30000"
-            targets = conn.execute(sql, params).fetchall()
+        if backlog:
+            queue_meta_backlog(query_tag)
+        with meta_cond:
+            pending = len(meta_queued)
 
-        if not targets:
+        if not pending:
             up_st["last_log"] = f"✅ {display_name}: 모든 대상이 이미 매칭되었습니다."
             up_st["is_running"] = False
+            theme_q.put(None)
             return
 
-        up_st.update({"total": len(targets), "current": 0, "success": 0, "fail": 0})
+        up_st.update({"total": pending, "current": 0, "success": 0, "fail": 0, "requeued": 0, "deferred": 0,
+                      "cache_hits": 0, "cache_misses": 0, "cache_hit_rate": 0.0})
         db_q = queue.Queue()
+        matched = set()  # 포스터를 찾은 앨범 (끝나고 그 폴더들의 대표 이미지만 갱신)
 
         def db_worker():
-            batch = []
+            # 100개씩 모아 저장하되, 화면에서 기다리는 demand 앨범이 묶여 있지 않도록 1초 넘게 쌓아 두지 않음
+            batch, since = [], 0
             while True:
                 try:
-                    item = db_q.get()
+                    item = db_q.get(timeout=1)
                     if item is None: break
+                    if not batch: since = time.monotonic()
                     batch.append(item)
-                    if len(batch) >= 100:
-                        save_batch(batch)
-                        batch = []
-                except:
+                except queue.Empty:
                     pass
+                except:
+                    continue
+                if batch and (len(batch) >= 100 or time.monotonic() - since >= 1):
+                    save_batch(batch)
+                    batch = []
             if batch: save_batch(batch)
 
         def save_batch(items):
             try:
-                with sqlite3.connect(DB_PATH, timeout=60) as conn:
-                    for art, alb, res in items:
+                with db_write() as conn:
+                    for album_id, res in items:
                         if res and res.get('poster'):
                             conn.execute(
-                                "UPDATE global_songs SET meta_poster=?, genre=?, release_date=?, album_artist=? WHERE artist=? AND albumName=?",
-                                (res['poster'], res.get('genre'), res.get('release_date'), res.get('album_artist'), art,
-                                 alb))
+                                "UPDATE albums SET poster=?, genre=?, release_date=?, album_artist=? WHERE id=?",
+                                (res['poster'], res.get('genre'), res.get('release_date'), res.get('album_artist'), album_id))
+                            matched.add(album_id)
                             with update_lock:
                                 up_st["success"] += 1
                         else:
-                            conn.execute("UPDATE global_songs SET meta_poster='FAIL' WHERE artist=? AND albumName=?",
-                                         (art, alb))
+                            conn.execute("UPDATE albums SET poster='FAIL' WHERE id=?", (album_id,))
                             with update_lock:
                                 up_st["fail"] += 1
                     conn.commit()
+                bump_library_generation()
             except Exception as e:
                 with update_lock:
                     up_st["last_log"] = f"⚠️ DB 저장 오류: {str(e)}"
 
-        Thread(target=db_worker, daemon=True).start()
+        db_thread = Thread(target=db_worker, daemon=True)
+        db_thread.start()
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for row in targets:
-                if not up_st["is_running"]: break
+        def run_match(album_id, last_try=True):
+            """앨범 하나 매칭. 일시 장애로 결과를 못 얻었으면 'retry' 를 돌려주고 아무것도 저장하지 않음"""
+            try:
+                with db_read() as conn:
+                    r = conn.execute(f"""SELECT ar.name AS artist, al.name AS albumName, al.category,
+                                               (SELECT MAX(name) FROM global_songs WHERE album_id = al.id) AS title
+                                         FROM {ALBUM_FROM} WHERE al.id = ? AND {META_TARGET_WHERE}""",
+                                     (album_id,)).fetchone()
+                if r is None:
+                    # 대기하는 사이 매칭됐거나 지워진 앨범
+                    with update_lock:
+                        up_st["current"] += 1
+                    return
+                # 검색 전략은 실행 대상(전체/카테고리)이 아니라 앨범 자신의 카테고리를 따름
+                f_type = r['category']
+
+                _provider_ctx.transient = False
+                res = fetch_metadata_smart(r['artist'], r['albumName'], r['title'], folder_type=f_type)
+                if meta_stop.is_set():
+                    return  # 중지로 끊긴 요청의 빈 결과를 FAIL 로 저장하지 않음
+                if not res and _provider_ctx.transient:
+                    # 제공자 오류/차단으로 못 찾은 것은 '없음'이 아니므로 FAIL 로 저장하지 않음
+                    if not last_try:
+                        return "retry"
+                    with update_lock:
+                        up_st["current"] += 1
+                        up_st["deferred"] += 1
+                        up_st["last_log"] = f"[{display_name}] {up_st['current']}/{up_st['total']} | {r['artist']} - {r['albumName']} -> ⏸️ 다음 실행으로 미룸"
+                    update_meta_speed()
+                    return
+
+                # 테마 갱신을 직접 호출하지 않고 큐에 넣음 (DB Lock 방지)
+                if res and res.get('poster'):
+                    cat = 'artists' if f_type == '외국' else 'charts'
+                    theme_q.put((cat, r['artist'], f"{f_type}/가수/{r['artist']}", res['poster']))
+
+                db_q.put((album_id, res))
 
-                def run_match(r=row, f_type=query_tag):
-                    try:
-                        res = fetch_metadata_smart(r['artist'], r['albumName'], r['title'], folder_type=f_type)
+                with update_lock:
+                    up_st["current"] += 1
+                    log_art = clean_query_text(r['artist'], is_artist=True)
+                    log_tit = clean_query_text(r['title'], is_artist=False)
+                    up_st[
+                        "last_log"] = f"[{display_name}] {up_st['current']}/{up_st['total']} | {log_art} - {log_tit} -> {'✅' if res else '❌'}"
+            except Exception as e:
+                with update_lock:
+                    up_st["current"] += 1
+                    up_st[
+                        "last_log"] = f"[{display_name}] {up_st['current']}/{up_st['total']} | 오류: {str(e)[:20]}"
+            update_meta_speed()
 
-                        # 테마 갱신을 직접 호출하지 않고 큐에 넣음 (DB Lock 방지)
-                        if res and res.get('poster'):
-                            cat = 'artists' if f_type == '외국' else 'charts'
-                            theme_q.put((cat, r['artist'], f"{f_type}/가수/{r['artist']}", res['poster']))
-
-                        db_q.put((r['artist'], r['albumName'], res))
-
-                        with update_lock:
-                            up_st["current"] += 1
-                            log_art = clean_query_text(r['artist'], is_artist=True)
-                            log_tit = clean_query_text(r['title'], is_artist=False)
-                            up_st[
-                                "last_log"] = f"[{display_name}] {up_st['current']}/{up_st['total']} | {log_art} - {log_tit} -> {'✅' if res else '❌'}"
-                    except Exception as e:
-                        with update_lock:
-                            up_st["current"] += 1
-                            up_st[
-                                "last_log"] = f"[{display_name}] {up_st['current']}/{up_st['total']} | 오류: {str(e)[:20]}"
-
-                futures.append(executor.submit(run_match))
-                time.sleep(0.02)
-            for future in as_completed(futures): pass
+        # 속도 조절은 sleep 대신 provider_request 의 제공자별 토큰 버킷이 담당
+        up_st.update({"started_at": time.time(), "albums_per_min": 0.0})
+        asyncio.run(run_meta_engine(run_match))
 
         db_q.put(None)
+        db_thread.join()
         theme_q.put(None)  # 테마 갱신 작업 마무리
-        up_st["last_log"] = f"🏁 {display_name} 엔진 작업 완료!"
+        if matched:
+            refresh_folders(matched)  # 새로 찾은 포스터를 그 앨범이 든 폴더(와 상위 폴더) 대표 이미지에 반영
+        start_cover_prefetch()  # 새 포스터를 로컬 커버 캐시에 미리 받아 둠
+        if meta_stop.is_set():
+            clear_meta_queue()  # 중지하면 남은 대기열도 버림 (다시 보는 앨범은 새로 들어옴)
+            up_st["last_log"] = f"⏹️ {display_name} 엔진 중지됨 ({up_st['current']:,}/{up_st['total']:,})"
+        else:
+            deferred = f", 제공자 장애로 {up_st['deferred']:,}개 미룸" if up_st["deferred"] else ""
+            up_st["last_log"] = f"🏁 {display_name} 엔진 작업 완료! ({up_st['albums_per_min']:,} 앨범/분{deferred})"
 
     except Exception as e:
+        clear_meta_queue()
         up_st["last_log"] = f"❌ {display_name} 엔진 중단됨: {str(e)}"
     finally:
         up_st["is_running"] = False
+        meta_stop.clear()
+        release_job("metadata")
 
-@app.route('/api/library/browse')
-def browse_library():
-    path = request.args.get('path', '').strip()
-    if not path: return jsonify({"error": "Path is required"}), 400
+
+async def run_meta_engine(run_match, concurrency=None):
+    """
+    asyncio 로 매칭 대기열을 비웁니다. 자리가 날 때마다 대기열에서 가장 급한 앨범을 꺼내므로
+    실행 도중 들어온 demand 앨범도 남은 backlog 보다 먼저 처리됩니다.
+    대기열이 비고 진행 중인 작업이 모두 끝나면 종료하고, 중지 요청(up_st['is_running'] False)이 오면 즉시 취소합니다.
+    실제 HTTP 속도는 provider_request 의 제공자별 토큰 버킷/동시 요청 한도가 정합니다.
+    run_match 가 'retry' 를 돌려주면 META_RETRY_DELAY 부터 두 배씩 늘려 가며 최대 META_MAX_RETRIES 번 다시 시도합니다.
+    """
+    concurrency = concurrency or META_CONCURRENCY
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="meta")
+    gate = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def one(album_id):
+        # 첫 시도는 꺼낼 때 잡은 자리(gate)로 실행. 'retry' 면 자리를 내주고 기다렸다가 다시 줄을 섬
+        for attempt in range(META_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(META_RETRY_DELAY * 2 ** (attempt - 1))
+                await gate.acquire()
+            try:
+                outcome = await loop.run_in_executor(executor, run_match, album_id, attempt == META_MAX_RETRIES)
+            finally:
+                gate.release()
+            if outcome != "retry":
+                return
+            with update_lock:
+                up_st["requeued"] += 1
 
     try:
-        with sqlite3.connect(DB_PATH, timeout=20) as conn:
-            conn.row_factory = sqlite3.Row
-            search_path = path if path.endswith('/') else path + '/'
+        while up_st["is_running"]:
+            # 빈자리가 난 뒤에 꺼내야 그 사이 들어온 demand 가 앞설 수 있음 (one() 이 자리를 내주면 깨어남)
+            # 중지하면 meta_stop 으로 진행 중인 요청이 곧 끝나며 자리가 나므로 여기서 오래 묶이지 않음
+            await gate.acquire()
+            album_id = pop_meta() if up_st["is_running"] else None
+            if album_id is None:
+                gate.release()
+                if not tasks or not up_st["is_running"]:
+                    break
+                await asyncio.wait(tasks, timeout=0.2, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            task = asyncio.create_task(one(album_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if not up_st["is_running"]:
+            meta_stop.set()
+            for t in tasks: t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        # 진행 중이던 요청은 토큰 대기가 풀리면서 곧바로 끝남
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def update_meta_speed():
+    elapsed = time.time() - up_st.get("started_at", time.time())
+    if elapsed > 0:
+        up_st["albums_per_min"] = round(up_st["current"] / elapsed * 60, 1)
+
+def encode_cursor(*key):
+    """마지막 행의 정렬 키(+rowid)를 다음 페이지 요청용 불투명 토큰으로 만듭니다."""
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """encode_cursor 토큰 -> 정렬 키 리스트. 잘못된 토큰이면 None"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return key if isinstance(key, list) else None
+    except:
+        return None
+
+
+def paged_response(rows, limit, key):
+    """
+    목록 응답. 한 페이지가 꽉 찼으면 마지막 행의 키로 만든 커서를 X-Next-Cursor 헤더에 실어 보냅니다.
+    앱은 page 대신 cursor=<토큰> 으로 다음 페이지를 요청하면 앞쪽 행을 건너뛰는 비용 없이 이어서 받습니다.
+    """
+    resp = jsonify(rows)
+    if rows and len(rows) >= limit:
+        resp.headers["X-Next-Cursor"] = encode_cursor(*key(rows[-1]))
+    return resp
+
+
+def page_args(limit, shape):
+    """
+    (cursor 키 또는 None, offset). cursor 가 있으면 offset 은 0.
+    shape 는 라우트가 encode_cursor 에 넣는 키의 타입 튜플(예: (str, str, int))이며,
+    풀리지 않거나 개수/타입이 다른 cursor 는 ValueError (라우트에서 400)
+    """
+    token = request.args.get('cursor')
+    if token:
+        key = decode_cursor(token)
+        # bool 은 int 의 하위 타입이라 isinstance 대신 type 으로 비교
+        if key is None or len(key) != len(shape) or any(type(v) is not t for v, t in zip(key, shape)):
+            raise ValueError("잘못된 cursor 입니다.")
+        return key, 0
+    page = int(request.args.get('page', 1))
+    return None, (page - 1) * limit
+
+
+# ------------------------------------------
+# 응답 직렬화/압축 (orjson + gzip/brotli 협상 + 스트리밍 배열)
+# ------------------------------------------
+COMPRESS_MIN_SIZE = 1024  # 이보다 작은 본문은 압축 헤더/CPU 가 더 손해
+COMPRESS_MIMETYPES = {"application/json", "text/html", "text/plain"}  # 오디오/이미지는 이미 압축된 형식
+GZIP_LEVEL = 5  # 6 이상은 목록 JSON 에서 크기는 거의 그대로, CPU 만 늘어남
+BROTLI_QUALITY = 5
+STREAM_CHUNK_ROWS = 200  # 스트리밍 배열에서 이만큼 모일 때마다 내보냄(압축 시 flush)
+
+
+def json_bytes(obj):
+    """응답 본문용 직렬화. orjson 이 있으면 그대로 쓰고, 없으면 한글을 이스케이프하지 않는 json.dumps"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=DefaultJSONProvider.default).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 가 json_bytes 를 쓰도록 바꿔 끼우는 Flask JSON 공급자 (키 정렬/들여쓰기 없음)"""
+    ensure_ascii = False
+    sort_keys = False
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_bytes(obj), mimetype=self.mimetype)
+
 
-            # 🚀 한 번의 쿼리로 하위 폴더들과 각각의 대표 이미지를 즉시 가져옴
-            rows = conn.execute("""
-                SELECT parent_path, MAX(meta_poster) as poster
-                FROM global_songs
-                WHERE parent_path LIKE ?
-                GROUP BY parent_path
-            """, (f"{search_path}%",)).fetchall()
+app.json = FastJSONProvider(app)
 
-            sub_folders = {}
+
+def negotiate_encoding():
+    """요청의 Accept-Encoding 에서 쓸 압축 방식 (br > gzip > None)"""
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def make_compressor(enc):
+    """
+    (data, final=False) -> bytes 함수. final 이 아니면 매번 sync flush 하므로
+    내보낸 조각까지는 받는 쪽이 바로 풀어 볼 수 있습니다.
+    """
+    if enc == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return lambda data, final=False: c.process(data) + (c.finish() if final else c.flush())
+    if enc == "gzip":
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip 헤더
+        return lambda data, final=False: c.compress(data) + c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return lambda data, final=False: data
+
+
+def compress_body(body, enc):
+    return make_compressor(enc)(body, final=True)
+
+
+@app.after_request
+def compress_response(resp):
+    """
+    JSON/텍스트 응답을 협상한 방식으로 압축합니다. 파일 전송(direct_passthrough), 스트리밍 응답,
+    부분 응답, 이미 Content-Encoding 이 붙은 응답(응답 캐시/스트리밍 배열이 직접 압축)은 건드리지 않습니다.
+    """
+    if (resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed
+            or "Content-Encoding" in resp.headers or resp.mimetype not in COMPRESS_MIMETYPES):
+        return resp
+    body = resp.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    enc = negotiate_encoding()
+    if enc:
+        resp.set_data(compress_body(body, enc))
+        resp.headers["Content-Encoding"] = enc
+    return resp
+
+
+def stream_json_array(rows, transform=dict):
+    """
+    행 목록을 JSON 배열로 흘려 보내는 응답. STREAM_CHUNK_ROWS 개씩 인코딩해서 내보내므로
+    큰 폴더 목록도 전체 JSON 문자열을 메모리에 만들지 않고 앞부분부터 전송됩니다.
+    행은 호출하는 쪽이 미리 읽어 DB 연결을 반납한 뒤 넘깁니다 (느린 클라이언트가 받는 동안 풀 연결을 쥐지 않도록).
+    압축은 여기서 조각마다 flush 하며 직접 합니다. 헤더가 이미 나간 뒤의 오류는 로그를 남기고 다시 던져서
+    배열을 닫지 않은 채 연결을 끊습니다 (잘린 목록을 정상 응답으로 오해하지 않게).
+    """
+    enc = negotiate_encoding()
+
+    def generate():
+        comp = make_compressor(enc)
+        buf, n = [b"["], 0
+        try:
             for r in rows:
-                p_path = r['parent_path']
-                if p_path == path: continue
-                rel = p_path[len(search_path):]
-                segment = rel.split('/')[0]
-                if segment:
-                    # 이미지가 있는 폴더를 우선적으로 캐싱
-                    if segment not in sub_folders or (not sub_folders[segment] and r['poster']):
-                        sub_folders[segment] = r['poster']
-
-            if sub_folders:
+                if n: buf.append(b",")
+                buf.append(json_bytes(transform(r)))
+                n += 1
+                if n % STREAM_CHUNK_ROWS == 0:
+                    yield comp(b"".join(buf))
+                    buf = []
+        except Exception as e:
+            print(f"[!] 목록 스트리밍 중 오류 ({n}행 전송 후): {e}")
+            raise
+        buf.append(b"]")
+        yield comp(b"".join(buf), final=True)
+
+    resp = Response(generate(), mimetype="application/json")
+    resp.vary.add("Accept-Encoding")
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    return resp
+
+
+# ------------------------------------------
+# 응답 캐시 (라이브러리 세대 번호 기준 무효화 + ETag/304)
+# ------------------------------------------
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024  # 캐시한 응답 본문 합계 상한 (넘으면 오래 안 쓴 것부터 버림)
+RESPONSE_CACHE_MAX_ENTRY = RESPONSE_CACHE_BYTES // 8  # 이보다 큰 응답은 캐시하지 않음
+
+library_gen = {"n": 0}  # 곡/앨범/테마 데이터를 바꾸는 쪽이 올림 -> 이전 세대 캐시는 모두 무효
+response_cache = OrderedDict()  # (엔드포인트, 경로, 인자) -> 응답 항목
+response_cache_lock = threading.Lock()
+response_cache_st = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "bytes": 0}
+
+
+def bump_library_generation(shared=True, themes=False):
+    """
+    스캔/테마 재구성/메타데이터 저장 등 응답 내용이 바뀌는 쓰기를 마친 뒤 호출.
+    shared 면 다른 워커에도 알리고(다음 동기화 때 묶어서 한 번), themes 면 다른 워커가 테마 캐시도 다시 읽음.
+    """
+    with response_cache_lock:
+        library_gen["n"] += 1
+    if shared:
+        with job_lock:
+            job_sync["pending"]["library"] += 1
+            job_sync["pending"]["themes"] += themes
+
+
+def cache_entry_size(entry):
+    return len(entry["body"]) + sum(len(b) for b in entry["encoded"].values())
+
+
+def evict_response_cache():
+    """한도를 넘으면 오래 안 쓴 항목부터 버림 (response_cache_lock 을 쥔 채 호출)"""
+    while response_cache_st["bytes"] > RESPONSE_CACHE_BYTES and response_cache:
+        _, evicted = response_cache.popitem(last=False)
+        response_cache_st["bytes"] -= cache_entry_size(evicted)
+        response_cache_st["evictions"] += 1
+
+
+def cached_response(fn):
+    """
+    읽기 전용 라우트용 데코레이터. 같은 경로/인자의 200 응답을 세대 번호와 함께 메모리에 두고,
+    세대가 그대로면 SQL/JSON 변환 없이 그대로 돌려줍니다. 본문 해시로 만든 강한 ETag 를 붙이므로
+    앱이 If-None-Match 로 다시 물으면 본문 없이 304 로 답합니다. gzip/br 압축본도 항목에 같이 두고
+    (ETag 는 표현마다 -gzip/-br 접미사) 처음 요청될 때 한 번만 압축합니다.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (request.endpoint, request.path, tuple(sorted(request.args.items(multi=True))))
+        gen = library_gen["n"]  # 만드는 도중 세대가 바뀌면 이 항목은 다음 요청에서 버려짐
+        with response_cache_lock:
+            entry = response_cache.get(key)
+            if entry and entry["gen"] == gen:
+                response_cache.move_to_end(key)
+                response_cache_st["hits"] += 1
+            else:
+                entry = None
+                response_cache_st["misses"] += 1
+
+        if entry is None:
+            resp = app.make_response(fn(*args, **kwargs))
+            if resp.status_code != 200 or resp.direct_passthrough:
+                return resp
+            body = resp.get_data()
+            entry = {"gen": gen, "body": body, "mimetype": resp.mimetype, "encoded": {},
+                     "etag": hashlib.sha1(body).hexdigest(),
+                     "headers": {k: v for k, v in resp.headers.items() if k == "X-Next-Cursor"}}
+            if len(body) <= RESPONSE_CACHE_MAX_ENTRY:
+                with response_cache_lock:
+                    old = response_cache.pop(key, None)
+                    if old: response_cache_st["bytes"] -= cache_entry_size(old)
+                    response_cache[key] = entry
+                    response_cache_st["bytes"] += len(body)
+                    evict_response_cache()
+
+        # 앱은 매번 재검증(no-cache)하고, 내용이 같으면 304 만 받음
+        enc = negotiate_encoding() if len(entry["body"]) >= COMPRESS_MIN_SIZE else None
+        etag = f"{entry['etag']}-{enc}" if enc else entry["etag"]
+        headers = {**entry["headers"], "ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if request.if_none_match.contains(etag):
+            with response_cache_lock:
+                response_cache_st["not_modified"] += 1
+            return Response(status=304, headers=headers)
+        if not enc:
+            return Response(entry["body"], mimetype=entry["mimetype"], headers=headers)
+
+        body = entry["encoded"].get(enc)
+        if body is None:
+            body = compress_body(entry["body"], enc)
+            with response_cache_lock:
+                if enc not in entry["encoded"] and response_cache.get(key) is entry:
+                    entry["encoded"][enc] = body
+                    response_cache_st["bytes"] += len(body)
+                    evict_response_cache()
+        return Response(body, mimetype=entry["mimetype"], headers={**headers, "Content-Encoding": enc})
+    return wrapper
+
+
+@app.route('/api/admin/response_cache')
+def get_response_cache_stats():
+    """응답 캐시 상태 (적중률, 304 수, 사용량, 현재 세대)"""
+    with response_cache_lock:
+        total = response_cache_st["hits"] + response_cache_st["misses"]
+        return jsonify({**response_cache_st, "entries": len(response_cache), "budget": RESPONSE_CACHE_BYTES,
+                        "generation": library_gen["n"],
+                        "hit_rate": round(response_cache_st["hits"] / total, 3) if total else 0.0})
+
+
+BROWSE_SORTS = {"name": "f.name", "tracks": "f.track_count", "children": "f.child_count"}
+
+@app.route('/api/library/browse')
+def browse_library():
+    path = request.args.get('path', '').strip().rstrip('/')
+    if not path: return jsonify({"error": "Path is required"}), 400
+    # 정렬: name(기본) / tracks(곡 수) / children(하위 폴더 수), order=asc|desc
+    # 페이지: limit 를 주면 page 단위로 잘라서 반환 (생략 시 전체)
+    sort_col = BROWSE_SORTS.get(request.args.get('sort', 'name'), 'f.name')
+    order = 'DESC' if request.args.get('order', 'asc') == 'desc' else 'ASC'
+    limit = request.args.get('limit', type=int) or -1
+    offset = max(request.args.get('page', 1, type=int) - 1, 0) * max(limit, 0)
+
+    try:
+        with db_read() as conn:
+            # 🚀 폴더 트리에서 직계 하위 폴더만 인덱스(parent_id, name)로 조회
+            folder = conn.execute("SELECT id, child_count FROM folders WHERE path = ?", (path,)).fetchone()
+            if folder and folder['child_count']:
+                rows = conn.execute(f"""
+                    SELECT f.name, f.path, f.child_count, f.track_count, f.cover_album_id, al.poster
+                    FROM folders f LEFT JOIN albums al ON al.id = f.cover_album_id
+                    WHERE f.parent_id = ?
+                    ORDER BY {sort_col} {order}, f.name LIMIT ? OFFSET ?
+                """, (folder['id'], limit, offset)).fetchall()
+                hint_missing_art(rows, "cover_album_id", "poster")
                 result = [{
-                    "name": name, "path": f"{search_path}{name}", "is_dir": True,
-                    "cover": p if p and p not in ('', 'FAIL') else None
-                } for name, p in sorted(sub_folders.items())]
+                    "name": r['name'], "path": r['path'], "is_dir": True,
+                    "cover": r['poster'] if r['poster'] and r['poster'] not in ('', 'FAIL') else None,
+                    "child_count": r['child_count'], "track_count": r['track_count'], "cover_id": r['cover_album_id']
+                } for r in rows]
                 return jsonify(result)
 
             # 🎵 노래 목록 반환 시 rowid AS id 를 추가하여 곡 전환 문제 해결
-            songs = conn.execute("""
-                SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster
-                FROM global_songs WHERE parent_path = ? ORDER BY name
-            """, (path,)).fetchall()
-            return jsonify([{**dict(s), "is_dir": False, "path": s['parent_path']} for s in songs])
+            # 행은 여기서 다 읽고 연결을 반납한 뒤, 곡 수가 많은 폴더도 조각 단위로 인코딩/압축하며 스트리밍
+            songs = conn.execute(f"""
+                SELECT {SONG_BASIC_COLUMNS}
+                FROM {SONG_FROM} WHERE s.parent_path = ? ORDER BY s.disc_no, s.track_no, s.name LIMIT ? OFFSET ?
+            """, (path, limit, offset)).fetchall()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    hint_missing_art(songs)
+    return stream_json_array(songs, lambda s: {**dict(s), "is_dir": False, "path": s['parent_path']})
+
 
 
 @app.route('/api/admin/data', methods=['GET'])
@@ -1327,50 +2988,57 @@ def get_admin_data():
     """데이터 탐색기용 API - 디버깅 로그 포함"""
     cat = request.args.get('category', 'All')
     q = request.args.get('q', '').strip()
-    page = int(request.args.get('page', 1))
 
     # [추가] 실패 필터 파라미터 받기
     show_fail = request.args.get('fail_only', 'false') == 'true'
 
     limit = 50
-    offset = (page - 1) * limit
+    try:
+        cursor, offset = page_args(limit, shape=(int,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # [로그] 요청 파라미터 확인
     print(f"--- [DEBUG] get_admin_data Call ---")
-    print(f"[*] Category: {cat}, Search: '{q}', Page: {page}")
+    print(f"[*] Category: {cat}, Search: '{q}', Offset: {offset}, Cursor: {cursor}")
 
     # [수정] id -> rowid AS id (SQLite 내장 행 번호 사용)
-    query = "SELECT rowid AS id, name, artist, albumName, meta_poster, genre FROM global_songs WHERE 1=1"
+    query = f"""SELECT s.rowid AS id, s.name, s.artist, s.albumName, al.poster AS meta_poster,
+                       COALESCE(al.genre, s.genre) AS genre FROM {SONG_FROM} WHERE 1=1"""
     params = []
 
     if cat != 'All' and cat != '':
-        query += " AND parent_path LIKE ?"
+        query += " AND s.parent_path LIKE ?"
         params.append(f"{cat}%")
 
     if q:
-        query += " AND (name LIKE ? OR artist LIKE ? OR albumName LIKE ?)"
+        query += " AND (s.name LIKE ? OR s.artist LIKE ? OR s.albumName LIKE ?)"
         params.extend([f"%{q}%", f"%{q}%", f"%{q}%"])
 
     # [추가] 실패 항목만 보기 필터 로직
     if show_fail:
-        query += " AND (meta_poster = 'FAIL' OR meta_poster IS NULL OR meta_poster = '')"
+        query += " AND (al.poster = 'FAIL' OR al.poster IS NULL OR al.poster = '')"
+
+    # 커서가 있으면 마지막으로 받은 rowid 다음부터 (rowid 역순이므로 <)
+    if cursor:
+        query += " AND s.rowid < ?"
+        params.append(cursor[0])
 
-    query += f" ORDER BY id DESC LIMIT {limit} OFFSET {offset}"
+    query += f" ORDER BY s.rowid DESC LIMIT {limit} OFFSET {offset}"
 
     # [로그] 최종 쿼리와 파라미터 확인
     print(f"[*] SQL Query: {query}")
     print(f"[*] SQL Params: {params}")
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
             rows = conn.execute(query, params).fetchall()
 
             # [로그] 결과 개수 확인
             print(f"[*] Found Rows: {len(rows)}")
             print(f"----------------------------------")
 
-            return jsonify([dict(r) for r in rows])
+            return paged_response([dict(r) for r in rows], limit, lambda r: [r['id']])
     except Exception as e:
         print(f"[!] Admin API Error: {e}")
         import traceback
@@ -1384,8 +3052,8 @@ def admin_search_meta():
     if not q: return jsonify([])
     try:
         # Deezer API를 활용해 수동 검색 결과 10개 반환
-        url = f"https://api.deezer.com/search?q={urllib.parse.quote(q)}&limit=10"
-        res = requests.get(url, timeout=5).json()
+        url = f"{DEEZER_API}/search?q={urllib.parse.quote(q)}&limit=10"
+        res = http_session.get(url, timeout=5).json()
         results = []
         if res.get("data"):
             for t in res["data"]:
@@ -1411,13 +3079,15 @@ def admin_apply_meta():
         return jsonify({"error": "필수 데이터 누락"}), 400
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            # 선택한 가수와 앨범명을 가진 모든 곡의 메타데이터를 일괄 업데이트 (매우 효율적)
+        with db_write() as conn:
+            # 앨범 행 하나만 갱신하면 해당 앨범의 모든 곡에 적용됨
             conn.execute(
-                "UPDATE global_songs SET meta_poster=? WHERE artist=? AND albumName=?",
+                """UPDATE albums SET poster=?
+                   WHERE artist_id = (SELECT id FROM artists WHERE sort_key = norm_key(?)) AND sort_key = norm_key(?)""",
                 (poster, artist, album)
             )
             conn.commit()
+        bump_library_generation()
         return jsonify({"status": "ok", "message": f"[{artist} - {album}] 메타데이터가 일괄 적용되었습니다."})
     except Exception as e:
         return jsonify({"error": str(e)})
@@ -1435,18 +3105,22 @@ def run_query():
         return jsonify({"error": "데이터 변경(DML/DDL) 권한이 없습니다."})
 
     try:
-        with sqlite3.connect(DB_PATH, timeout=10) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
             res = conn.execute(sql).fetchall()
             return jsonify([dict(r) for r in res])
     except Exception as e:
         return jsonify({"error": str(e)})
 
 
+@app.route('/api/admin/db_pool')
+def get_db_pool():
+    """DB 연결 풀 상태 (재사용 적중/미스, 연결 나이)"""
+    return jsonify(db_pool_stats())
+
+
 @app.route('/api/metadata/stop')
 def stop_meta():
-    global up_st
-    up_st["is_running"] = False
+    send_job_command("metadata", "stop")
     return jsonify({"status": "ok", "message": "엔진 중지 명령을 보냈습니다."})
 
 
@@ -1455,18 +3129,23 @@ def render_monitor(): return render_template_string(MONITOR_HTML)
 
 
 @app.route('/api/indexing/status')
-def get_idx(): return jsonify(idx_st)
+def get_idx(): return jsonify(job_status("indexing"))
 
 
 @app.route('/api/metadata/start')
 def start_meta():
     q = request.args.get('q')
     print(f"[*] 🔔 메타데이터 가동 요청 수신! (대상: {q if q else '전체'})")
-    if not up_st["is_running"]:
+    if claim_job("metadata"):
         Thread(target=start_metadata_update_thread, args=(q,)).start()
         return jsonify({"status": "ok", "message": f"[{q if q else '전체'}] 엔진을 가동합니다."})
+    st = job_status("metadata")
+    if st["target"] == META_DEMAND_TARGET:
+        # 요청 앨범만 처리하던 실행이면(다른 워커여도) 그 대기열 뒤에 backlog 를 이어 붙임
+        send_job_command("metadata", f"backlog:{q or ''}")
+        return jsonify({"status": "ok", "message": f"[{q if q else '전체'}] 대상을 진행 중인 엔진 대기열에 추가합니다."})
     else:
-        return jsonify({"status": "error", "message": f"이미 엔진이 작동 중입니다. (현재 대상: {up_st['target']})"})
+        return jsonify({"status": "error", "message": f"이미 엔진이 작동 중입니다. (현재 대상: {st['target']})"})
 
 
 # @app.route('/api/themes')
@@ -1482,6 +3161,7 @@ def start_meta():
 
 # [교체할 API] 전체 데이터 덤프 대신 목록만 우선 제공
 @app.route('/api/themes/list')
+@cached_response
 def get_themes_list():
     """앱 초기 화면용: 메타데이터 없는 단순 경로 목록만 반환"""
     return jsonify({
@@ -1495,44 +3175,65 @@ def get_themes_list():
 def get_themes_by_category(category):
     """
     카테고리별로 페이징된 테마 목록을 반환
-    예: /api/themes/charts?page=1
+    예: /api/themes/charts?page=1 또는 ?cursor=<X-Next-Cursor>
+    메모리 캐시 목록이라 건너뛰는 비용은 없지만, 앱이 모든 목록을 같은 커서 방식으로 넘길 수 있도록
+    다음 위치를 커서로도 돌려줍니다.
     """
-    page = int(request.args.get('page', 1))
     limit = 50
-    offset = (page - 1) * limit
+    try:
+        cursor, offset = page_args(limit, shape=(int,))
+        if cursor:
+            offset = cursor[0]
+            if offset < 0:
+                raise ValueError("잘못된 cursor 입니다.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # 캐시에서 해당 카테고리 데이터 가져오기
     data = cache.get(category, [])
     paginated_data = data[offset: offset + limit]
 
-    return jsonify(paginated_data)
+    return paged_response(paginated_data, limit, lambda r: [offset + len(paginated_data)])
 
 @app.route('/api/theme-details/<path:tp>')
 def get_details(tp):
     p = urllib.parse.unquote(tp)
-    page = int(request.args.get('page', 1))  # 페이지 파라미터 추가
     limit = 100  # 한 번에 100개씩만
-    offset = (page - 1) * limit
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        # LIMIT과 OFFSET 추가 (가장 중요)
-        rows = conn.execute(
-            """SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster
-               FROM global_songs WHERE parent_path LIKE ?
-               ORDER BY artist, name ASC LIMIT ? OFFSET ?""",
-            (f"{p}%", limit, offset)
-        ).fetchall()
-        return jsonify([dict(r) for r in rows])
+    try:
+        cursor, offset = page_args(limit, shape=(str, str, int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with db_read() as conn:
+        # 큰 하위 트리(장르 루트 등)는 (가수, 곡명) 순서 인덱스를 커서 위치부터 걸으며 경로가 맞는 곡만 limit 개 모음
+        # -> 페이지마다 하위 트리 전체를 정렬하지 않고, 가수/곡명이 같은 곡 묶음 안에서만 rowid 로 정렬. 작은 트리는 경로 범위로 읽어 정렬하는 편이 더 쌈
+        #    (순서 인덱스로 한 페이지를 채우려면 대략 limit * 전체 곡 수 / 트리 곡 수 만큼 읽어야 하므로)
+        folder = conn.execute("SELECT track_count FROM folders WHERE path = ?", (p,)).fetchone()
+        total = conn.execute("SELECT SUM(track_count) FROM folders WHERE parent_id IS NULL").fetchone()[0] or 0
+        ordered = bool(folder) and folder['track_count'] ** 2 > limit * total
+
+        # 경로 접두사는 LIKE 대신 범위 조건으로 걸어 idx_path(또는 순서 인덱스 안의 parent_path)로 거름
+        songs = "global_songs s INDEXED BY idx_songs_artist_name" if ordered else "global_songs s"
+        sql = f"""SELECT {SONG_BASIC_COLUMNS}
+                  FROM {songs} {SONG_ALBUM_JOIN} WHERE s.parent_path >= ? AND s.parent_path < ?"""
+        params = [p, p + "\U0010ffff"]
+        if cursor:
+            # (가수, 곡명, rowid) 순서에서 마지막으로 받은 곡 다음부터
+            sql += " AND (s.artist, s.name, s.rowid) > (?, ?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY s.artist, s.name, s.rowid LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, params + [limit, offset]).fetchall()
+    hint_missing_art(rows)
+    return paged_response([dict(r) for r in rows], limit, lambda r: [r['artist'], r['name'], r['id']])
 
 
 @app.route('/api/top100')
+@cached_response
 def get_top100():
     try:
         base_rel_path = os.path.relpath(WEEKLY_CHART_PATH, MUSIC_BASE).replace('\\', '/')
 
-        with sqlite3.connect(DB_PATH, timeout=20) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
 
             # 1. 최신 주차 폴더명 하나만 찾기 (가장 정확한 쿼리)
             latest_folder_row = conn.execute(
@@ -1545,19 +3246,20 @@ def get_top100():
 
             # 2. [핵심] 100곡만 확실하게 제한하여 가져오기
             rows = conn.execute(
-                """SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster
-                   FROM global_songs
-                   WHERE parent_path = ?
-                   ORDER BY name ASC LIMIT 100""",
+                f"""SELECT {SONG_BASIC_COLUMNS}
+                    FROM {SONG_FROM}
+                    WHERE s.parent_path = ?
+                    ORDER BY s.name ASC LIMIT 100""",
                 (latest_path,)
             ).fetchall()
 
+            hint_missing_art(rows)
             result = [dict(r) for r in rows]
             # 3. 파일명 숫자 정렬은 서버에서 하지 말고 앱으로 넘기는 것이 서버 부하 방지에 좋습니다.
             return jsonify(result)
     except Exception as e:
         print(f"[!] Top100 오류: {e}")
-        return jsonify([])
+        return jsonify([]), 500  # 빈 목록을 200 으로 주면 응답 캐시에 남아 다음 세대까지 계속 빈 목록이 나감
 
 @app.route('/api/search')
 def search_songs():
@@ -1565,15 +3267,25 @@ def search_songs():
     q = request.args.get('q', '').strip()
     if not q: return jsonify([])
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
+            match = fts_match_expr(q)
+            if match:
+                # 🚀 FTS5 인덱스에서 bm25 순으로 상위 100곡만 뽑은 뒤 본문 조인
+                rows = conn.execute(
+                    f"""WITH {fts_hits_sql(limit=100)}
+                        SELECT {SONG_COLUMNS}, 0 as is_dir
+                        FROM hits JOIN global_songs s ON s.rowid = hits.rowid {SONG_ALBUM_JOIN}
+                        ORDER BY hits.score""",
+                    (match,)
+                ).fetchall()
+                return jsonify([dict(r) for r in rows])
+
             # 0 as is_dir을 추가하여 앱에서 '노래'로 정상 인식하게 함
             rows = conn.execute(
-                """SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster,
-                          genre, release_date, album_artist, 0 as is_dir
-                   FROM global_songs
-                   WHERE name LIKE ? OR artist LIKE ? OR albumName LIKE ?
-                   LIMIT 100""",
+                f"""SELECT {SONG_COLUMNS}, 0 as is_dir
+                    FROM {SONG_FROM}
+                    WHERE s.name LIKE ? OR s.artist LIKE ? OR s.albumName LIKE ?
+                    LIMIT 100""",
                 (f"%{q}%", f"%{q}%", f"%{q}%")
             ).fetchall()
             return jsonify([dict(r) for r in rows])
@@ -1585,28 +3297,39 @@ def search_songs():
 
 @app.route('/api/refresh')
 def refresh():
-    Thread(target=rebuild_library).start()
+    if not claim_job("themes"):
+        return jsonify({"status": "running"})
+    Thread(target=run_rebuild_library).start()
     return jsonify({"status": "started"})
 
 
+def run_rebuild_library():
+    theme_stop.clear()
+    try:
+        rebuild_library()
+    finally:
+        release_job("themes")
+
+
 @app.route('/api/metadata/reset_fail')
 def reset_fail():
     # 관리자 페이지에서 전달받은 카테고리(q) 파라미터 확인
     cat = request.args.get('q')
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            # 기본 SQL: 실패 기록만 초기화
-            sql = "UPDATE global_songs SET meta_poster = NULL WHERE (meta_poster = 'FAIL' OR meta_poster = '')"
+        with db_write() as conn:
+            # 기본 SQL: 실패 기록만 초기화 (앨범 단위)
+            sql = "UPDATE albums SET poster = NULL WHERE (poster = 'FAIL' OR poster = '')"
             params = []
 
-            # 카테고리가 지정되어 있다면 해당 경로의 노래들만 타겟팅
+            # 카테고리가 지정되어 있다면 해당 폴더의 앨범들만 타겟팅
             if cat and cat != "All":
-                sql += " AND parent_path LIKE ?"
-                params.append(f"{cat}%")
+                sql += " AND category = ?"
+                params.append(cat)
 
             cursor = conn.execute(sql, params)
             count = cursor.rowcount
             conn.commit()
+        bump_library_generation()
 
         msg = f"🔄 {'전체' if not cat or cat == 'All' else cat} 카테고리의 실패 기록 {count:,}개를 초기화했습니다."
         up_st["last_log"] = msg
@@ -1635,36 +3358,151 @@ def reset_fail():
 
 @app.route('/api/metadata/status')
 def get_meta():
-    global cached_db_stats
-    now = time.time()
-
-    # 30초 이내의 데이터는 캐시에서 즉시 반환
-    if cached_db_stats["data"] and (now - cached_db_stats["time"] < 30):
-        res = up_st.copy()
-        res.update(cached_db_stats["data"])
-        return jsonify(res)
-
-    res = up_st.copy()
+    res = job_status("metadata")
     try:
-        with sqlite3.connect(DB_PATH, timeout=5) as conn:
-            # 47만 건의 통계는 매우 무거운 작업입니다.
-            stats = conn.execute("""
-                SELECT COUNT(*), COUNT(CASE WHEN status='success' THEN 1 END),
-                       COUNT(CASE WHEN status='fail' THEN 1 END), COUNT(CASE WHEN status='pending' THEN 1 END)
-                FROM (
-                    SELECT CASE WHEN MAX(meta_poster) IS NOT NULL AND MAX(meta_poster) NOT IN ('', 'FAIL') THEN 'success'
-                                WHEN MAX(meta_poster) = 'FAIL' THEN 'fail' ELSE 'pending' END as status
-                    FROM global_songs GROUP BY artist, albumName
-                )
-            """).fetchone()
-            if stats:
-                stat_data = {"db_total": stats[0], "db_success": stats[1], "db_fail": stats[2], "db_pending": stats[3]}
-                cached_db_stats = {"data": stat_data, "time": now}
-                res.update(stat_data)
+        res.update(meta_db_counts())
     except:
         pass
     return jsonify(res)
 
+
+def meta_db_counts():
+    """카테고리별 매칭 현황. 집계 대신 트리거로 유지되는 meta_status 만 읽으므로 캐시 없이 항상 최신 값"""
+    with db_read() as conn:
+        rows = conn.execute("SELECT category, status, n FROM meta_status").fetchall()
+    totals = {"success": 0, "fail": 0, "pending": 0}
+    categories = {}
+    for r in rows:
+        cat = categories.setdefault(r['category'], {"total": 0, "success": 0, "fail": 0, "pending": 0})
+        cat[r['status']] += r['n']
+        cat["total"] += r['n']
+        totals[r['status']] += r['n']
+    return {"db_total": sum(totals.values()), "db_success": totals["success"],
+            "db_fail": totals["fail"], "db_pending": totals["pending"], "categories": categories}
+
+
+# ------------------------------------------
+# 실시간 진행 피드 (SSE): /monitor 가 폴링 대신 구독
+# ------------------------------------------
+EVENT_INTERVAL = 1.0  # 작업이 도는 동안 변화를 모아 보내는 주기(초). 그 사이 바뀐 로그는 마지막 줄만 감
+EVENT_IDLE_INTERVAL = 5.0  # 아무 작업도 돌지 않을 때 확인 주기 (이 워커에서 작업을 시작하면 바로 깸)
+EVENT_HEARTBEAT = 25  # 변화가 없어도 이 간격으로 주석 한 줄 (프록시가 연결을 끊지 않게, 끊긴 뷰어를 알아채게)
+EVENT_QUEUE_SIZE = 16  # 뷰어별 밀린 이벤트 한도. 넘치면 밀린 것을 버리고 전체 상태를 다시 보냄
+
+event_subscribers = set()  # 뷰어별 queue.Queue
+event_lock = threading.Condition()
+event_wake = threading.Event()
+event_st = {"pid": None, "seq": 0, "state": {}, "gen": None}  # state: 뷰어들이 지금 들고 있는 전체 상태
+
+
+def progress_state(prev):
+    """
+    피드에 싣는 전체 상태. 뷰어 수와 상관없이 주기마다 한 번만 만듭니다.
+    DB 집계(meta_db_counts)는 작업이 돌거나 라이브러리 세대가 바뀌었을 때만 다시 읽고, 아니면 이전 값을 씁니다.
+    """
+    idx = job_status("indexing")
+    meta = job_status("metadata")
+    meta.pop("providers", None)  # 지연 시간 등 매초 바뀌는 값은 /api/metadata/status 에서만
+    prev_meta = prev.get("metadata", {})
+    if meta["is_running"] or idx["is_running"] or "db_total" not in prev_meta or event_st["gen"] != library_gen["n"]:
+        event_st["gen"] = library_gen["n"]
+        meta.update(meta_db_counts())
+    else:
+        meta.update({k: prev_meta[k] for k in ("db_total", "db_success", "db_fail", "db_pending", "categories")})
+    return {"indexing": idx, "metadata": meta}
+
+
+def state_delta(old, new):
+    """구역별로 바뀐 키만 (없으면 빈 dict)"""
+    delta = {}
+    for section, values in new.items():
+        before = old.get(section, {})
+        changed = {k: v for k, v in values.items() if before.get(k) != v}
+        if changed: delta[section] = changed
+    return delta
+
+
+def event_frame(event, data):
+    return f"id: {event_st['seq']}\nevent: {event}\ndata: ".encode() + json_bytes(data) + b"\n\n"
+
+
+def publish_event(frame):
+    """모든 뷰어 큐에 같은 바이트를 넣음. 느린 뷰어는 밀린 것을 버리고 전체 상태로 다시 맞춤"""
+    for q in list(event_subscribers):
+        try:
+            q.put_nowait(frame)
+        except queue.Full:
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(event_frame("snapshot", event_st["state"]))
+
+
+def ensure_event_broadcaster():
+    with event_lock:
+        if event_st["pid"] == os.getpid(): return
+        event_st["pid"] = os.getpid()
+    Thread(target=event_broadcaster, daemon=True, name="event-broadcaster").start()
+
+
+def event_broadcaster():
+    """
+    워커마다 하나. 뷰어가 없으면 잠들어 아무 일도 하지 않고, 있으면 주기마다 상태를 한 번 만들어
+    바뀐 부분만 모든 뷰어에게 보냅니다.
+    """
+    last_sent = time.monotonic()
+    while True:
+        with event_lock:
+            event_lock.wait_for(lambda: event_subscribers)
+        try:
+            state = progress_state(event_st["state"])
+        except Exception as e:
+            print(f"[!] 진행 피드 상태 수집 오류: {e}")
+            time.sleep(EVENT_IDLE_INTERVAL)
+            continue
+        with event_lock:
+            delta = state_delta(event_st["state"], state)
+            if delta:
+                event_st["seq"] += 1
+                event_st["state"] = state
+                publish_event(event_frame("progress", delta))
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= EVENT_HEARTBEAT:
+                publish_event(b": keepalive\n\n")
+                last_sent = time.monotonic()
+        running = state["indexing"]["is_running"] or state["metadata"]["is_running"]
+        event_wake.wait(EVENT_INTERVAL if running else EVENT_IDLE_INTERVAL)
+        event_wake.clear()
+
+
+@app.route('/api/events')
+def progress_events():
+    """
+    스캔/메타데이터 진행 상황 SSE. 연결하면 전체 상태(snapshot)를 한 번 보내고, 이후에는 바뀐 키만(progress) 보냅니다.
+    뷰어는 브로드캐스터가 만든 바이트를 큐에서 꺼내 쓰기만 하므로 뷰어 수만큼 DB 를 읽지 않습니다.
+    """
+    q = queue.Queue(EVENT_QUEUE_SIZE)
+    with event_lock:
+        first = event_frame("snapshot", event_st["state"])
+        event_subscribers.add(q)
+        event_lock.notify_all()
+    ensure_event_broadcaster()
+    event_wake.set()  # 새 뷰어가 지난 상태를 오래 보고 있지 않도록 바로 한 번 돌림
+
+    def stream():
+        try:
+            yield b"retry: 3000\n\n" + first
+            while True:
+                try:
+                    yield q.get(timeout=EVENT_HEARTBEAT * 2)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+        finally:
+            with event_lock:
+                event_subscribers.discard(q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ==========================================
 # 5. 애플뮤직 스타일 통합 검색 및 계층형 API
 # ==========================================
@@ -1677,34 +3515,61 @@ def search_integrated():
     if not q: return jsonify({"artists": [], "albums": [], "songs": []})
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
             search_val = f"%{q}%"
 
-            # 1. 아티스트 검색 (최대 5명 - 원형 프로필용)
+            if fts_match_expr(q):
+                # 🚀 FTS5 인덱스 경로: 컬럼 필터로 각 섹션을 좁히고 bm25 순으로 정렬
+                artists = conn.execute(
+                    f"""WITH {fts_hits_sql(limit=FTS_GROUP_CANDIDATES)}
+                        SELECT ar.name as name, MAX(al.poster) as cover
+                        FROM hits JOIN global_songs s ON s.rowid = hits.rowid {SONG_ALBUM_JOIN} JOIN artists ar ON ar.id = s.artist_id
+                        GROUP BY s.artist_id ORDER BY MIN(hits.score) LIMIT 5""",
+                    (fts_match_expr(q, ["artist"]),)
+                ).fetchall()
+
+                albums = conn.execute(
+                    f"""WITH {fts_hits_sql(limit=FTS_GROUP_CANDIDATES)}
+                        SELECT {ALBUM_COLUMNS}
+                        FROM hits JOIN global_songs s ON s.rowid = hits.rowid JOIN albums al ON al.id = s.album_id JOIN artists ar ON ar.id = al.artist_id
+                        GROUP BY s.album_id ORDER BY MIN(hits.score) LIMIT 15""",
+                    (fts_match_expr(q, ["albumName"]),)
+                ).fetchall()
+
+                songs = conn.execute(
+                    f"""WITH {fts_hits_sql(limit=50)}
+                        SELECT {SONG_COLUMNS}, 0 as is_dir
+                        FROM hits JOIN global_songs s ON s.rowid = hits.rowid {SONG_ALBUM_JOIN} ORDER BY hits.score""",
+                    (fts_match_expr(q, ["name", "artist"]),)
+                ).fetchall()
+
+                return jsonify({
+                    "artists": [dict(r) for r in artists],
+                    "albums": [dict(r) for r in albums],
+                    "songs": [dict(r) for r in songs]
+                })
+
+            # 1. 아티스트 검색 (최대 5명 - 원형 프로필용) - 곡 대신 가수 테이블에서 검색
             artists = conn.execute(
-                """SELECT TRIM(artist) as name, MAX(meta_poster) as cover
-                   FROM global_songs
-                   WHERE artist LIKE ?
-                   GROUP BY UPPER(TRIM(artist)) LIMIT 5""",
+                """SELECT ar.name as name, MAX(al.poster) as cover
+                   FROM artists ar LEFT JOIN albums al ON al.artist_id = ar.id
+                   WHERE ar.name LIKE ?
+                   GROUP BY ar.id LIMIT 5""",
                 (search_val,)
             ).fetchall()
 
-            # 2. 앨범 검색 (최대 15개 - 가로 스크롤용)
+            # 2. 앨범 검색 (최대 15개 - 가로 스크롤용) - 앨범 테이블에서 검색
             albums = conn.execute(
-                """SELECT albumName as name, artist, MAX(meta_poster) as imageUrl,
-                          CAST(MAX(SUBSTR(release_date, 1, 4)) AS INTEGER) as year
-                   FROM global_songs
-                   WHERE albumName LIKE ?
-                   GROUP BY albumName, artist LIMIT 15""",
+                f"""SELECT {ALBUM_COLUMNS}
+                    FROM {ALBUM_FROM}
+                    WHERE al.name LIKE ? LIMIT 15""",
                 (search_val,)
             ).fetchall()
 
             # 3. 노래 검색 (최대 50곡 - 세로 리스트용)
             songs = conn.execute(
-                """SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster,
-                          genre, release_date, album_artist, 0 as is_dir
-                   FROM global_songs WHERE name LIKE ? OR artist LIKE ? LIMIT 50""",
+                f"""SELECT {SONG_COLUMNS}, 0 as is_dir
+                    FROM {SONG_FROM} WHERE s.name LIKE ? OR s.artist LIKE ? LIMIT 50""",
                 (search_val, search_val)
             ).fetchall()
 
@@ -1719,107 +3584,1234 @@ def search_integrated():
 
 @app.route('/api/library/artists/<folder_type>')
 def get_library_artists(folder_type):
-    page = int(request.args.get('page', 1))
     limit = 60
-    offset = (page - 1) * limit
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        cursor, offset = page_args(limit, shape=(str,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with db_read() as conn:
+            # 가수 정렬 키 인덱스를 커서 위치부터 훑으면서 해당 폴더 앨범이 있는 가수만 limit 명 채움
             rows = conn.execute(
-                """SELECT TRIM(artist) as clean_artist, MAX(meta_poster) as cover
-                   FROM global_songs
-                   WHERE parent_path LIKE ?
-                   GROUP BY UPPER(TRIM(artist))
-                   ORDER BY clean_artist ASC
-                   LIMIT ? OFFSET ?""",
-                (f"{folder_type}%", limit, offset)
+                f"""SELECT ar.name as clean_artist, ar.sort_key,
+                           (SELECT MAX(al.poster) FROM albums al WHERE al.artist_id = ar.id AND al.category = ?1) as cover
+                    FROM artists ar
+                    WHERE EXISTS (SELECT 1 FROM albums al WHERE al.artist_id = ar.id AND al.category = ?1)
+                    {"AND ar.sort_key > ?4" if cursor else ""}
+                    ORDER BY ar.sort_key ASC
+                    LIMIT ?2 OFFSET ?3""",
+                (folder_type, limit, offset) + ((cursor[0],) if cursor else ())
             ).fetchall()
-            return jsonify([{"name": r['clean_artist'], "cover": r['cover']} for r in rows])
+            return paged_response([{"name": r['clean_artist'], "cover": r['cover']} for r in rows],
+                                  limit, lambda _: [rows[-1]['sort_key']])
     except Exception as e:
         return jsonify([])
 
 # 2. 특정 가수의 앨범 목록 조회 (애플뮤직 스타일 1단계)
 @app.route('/api/library/albums_by_artist/<artist_name>')
+@cached_response
 def get_albums_by_artist(artist_name):
     try:
         name = urllib.parse.unquote(artist_name).strip()
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_read() as conn:
             rows = conn.execute(
-                """SELECT albumName as name, artist, MAX(meta_poster) as imageUrl,
-                          CAST(MAX(SUBSTR(release_date, 1, 4)) AS INTEGER) as year
-                   FROM global_songs
-                   WHERE UPPER(TRIM(artist)) = UPPER(TRIM(?))
-                   GROUP BY albumName
-                   ORDER BY year DESC""",
+                f"""SELECT {ALBUM_COLUMNS}
+                    FROM {ALBUM_FROM}
+                    WHERE ar.sort_key = norm_key(?)
+                    ORDER BY al.release_date DESC""",
                 (name,)
             ).fetchall()
+            hint_missing_art(rows, "album_id", "imageUrl")
             return jsonify([dict(r) for r in rows])
     except Exception as e:
-        return jsonify([])
+        print(f"Error in get_albums_by_artist: {e}")
+        return jsonify([]), 500
 
 # 3. 특정 앨범의 전곡 조회 (애플뮤직 스타일 2단계 - 컴필레이션 지원)
 @app.route('/api/library/songs_by_album/<artist_name>/<album_name>')
+@cached_response
 def get_songs_by_album(artist_name, album_name):
     try:
         art = urllib.parse.unquote(artist_name).strip()
         alb = urllib.parse.unquote(album_name).strip()
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            # 1. 먼저 해당 가수의 해당 앨범이 있는 대표 폴더를 찾음
+        with db_read() as conn:
+            # 1. 먼저 해당 가수의 해당 앨범이 있는 대표 폴더를 찾음 (정규화 키 -> 앨범 id -> 곡)
             path_row = conn.execute(
-                """SELECT parent_path FROM global_songs
-                   WHERE UPPER(TRIM(artist)) = UPPER(TRIM(?))
-                   AND UPPER(TRIM(albumName)) = UPPER(TRIM(?)) LIMIT 1""",
+                f"""SELECT s.parent_path FROM {ALBUM_FROM} JOIN global_songs s ON s.album_id = al.id
+                    WHERE ar.sort_key = norm_key(?) AND al.sort_key = norm_key(?) LIMIT 1""",
                 (art, alb)
             ).fetchone()
 
             if path_row:
                 # 🚀 [수정] rowid AS id 를 추가하여 앱이 클릭한 곡을 정확히 찾게 함
                 rows = conn.execute(
-                    """SELECT rowid AS id, name, artist, albumName, stream_url, parent_path, meta_poster,
-                              genre, release_date, album_artist, 0 as is_dir
-                       FROM global_songs WHERE parent_path = ? ORDER BY name""",
+                    f"""SELECT {SONG_COLUMNS}, 0 as is_dir
+                        FROM {SONG_FROM} WHERE s.parent_path = ? ORDER BY s.disc_no, s.track_no, s.name""",
                     (path_row['parent_path'],)
                 ).fetchall()
                 return jsonify([dict(r) for r in rows])
             return jsonify([])
     except Exception as e:
         print(f"Error in get_songs_by_album: {e}")
-        return jsonify([])
+        return jsonify([]), 500
 
 # 4. 아티스트 페이징 목록 (무한스크롤 지원)
 @app.route('/api/library/artists_paged/<folder_type>')
+@cached_response
 def get_library_artists_paged(folder_type):
-    page = int(request.args.get('page', 1))
     limit = 60
-    offset = (page - 1) * limit
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            # 캐시 테이블 조회로 성능 극대화
+        cursor, offset = page_args(limit, shape=(str,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with db_read() as conn:
+            # 캐시 테이블 조회로 성능 극대화 (folder_type, artist_name) 인덱스를 커서 위치부터 읽음
             rows = conn.execute(
-                "SELECT artist_name as name, cover FROM artists_cache WHERE folder_type = ? ORDER BY name ASC LIMIT ? OFFSET ?",
-                (folder_type, limit, offset)
+                """SELECT artist_name as name, cover FROM artists_cache
+                   WHERE folder_type = ? AND artist_name > ?
+                   ORDER BY artist_name ASC LIMIT ? OFFSET ?""",
+                (folder_type, cursor[0] if cursor else '', limit, offset)
             ).fetchall()
-            return jsonify([dict(r) for r in rows])
-    except:
-        return jsonify([])
+            return paged_response([dict(r) for r in rows], limit, lambda r: [r['name']])
+    except Exception as e:
+        print(f"Error in get_library_artists_paged: {e}")
+        return jsonify([]), 500
 
 @app.route('/api/indexing/start')
 def start_indexing():
     target = request.args.get('target', '전체')
-    if not idx_st["is_running"]:
-        Thread(target=scan_all_songs, args=(target,)).start()
+    # full=true 면 폴더 스냅샷을 무시하고 전체 목록을 다시 읽음
+    full = request.args.get('full', 'false') == 'true'
+    # 파싱 방식/작업자 수 (미지정 시 PARSE_MODE, PARSE_WORKERS)
+    mode = request.args.get('mode')
+    workers = request.args.get('workers', type=int)
+    if mode and mode not in ("process", "thread", "single"):
+        return jsonify({"status": "error", "message": f"알 수 없는 파싱 방식입니다: {mode}"})
+    if claim_job("indexing"):
+        Thread(target=scan_all_songs, args=(target, full, mode, workers)).start()
         return jsonify({"status": "ok", "message": f"[{target}] 스캔을 시작합니다."})
     else:
         return jsonify({"status": "error", "message": "이미 다른 스캔이 진행 중입니다."})
 
+# ==========================================
+# 스트리밍 (Range / 재검증 / sendfile)
+# ==========================================
+# NAS(네트워크 마운트) 특성상 작은 read 를 여러 번 하면 왕복 지연이 쌓이므로 큰 블록으로 미리 읽음
+STREAM_BLOCK_SIZE = 1024 * 1024
+# 이 크기 이상인 응답은 os.sendfile 로 커널에서 바로 소켓으로 보냄 (파이썬 메모리 복사 없음)
+STREAM_SENDFILE_MIN = 256 * 1024
+STREAM_MAX_AGE = 86400
+AUDIO_MIMETYPES = {'.mp3': 'audio/mpeg', '.m4a': 'audio/mp4', '.flac': 'audio/flac', '.dsf': 'audio/x-dsf'}
+
+
+def read_file_range(path, start, length, block_size=STREAM_BLOCK_SIZE):
+    """start 부터 length 바이트를 block_size 단위로 읽어 내보냄 (커널에 순차 읽기 힌트를 줘서 미리 읽게 함)"""
+    with open(path, 'rb', buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            try: os.posix_fadvise(f.fileno(), start, length, os.POSIX_FADV_SEQUENTIAL)
+            except OSError: pass
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(block_size, remaining))
+            if not chunk: break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sendfile_range(path, start, length, sock):
+    """
+    개발 서버(werkzeug) 소켓으로 파일 구간을 바로 보냄.
+    빈 조각을 먼저 내보내면 서버가 상태줄/헤더를 써서 flush 하므로, 그 뒤 본문은 socket.sendfile 이 전송합니다.
+    """
+    with open(path, 'rb') as f:
+        yield b""
+        sock.sendfile(f, offset=start, count=length)
+
+
+# ------------------------------------------
+# 실시간 변환 (ffmpeg) + 변환 결과 디스크 캐시
+# ------------------------------------------
+FFMPEG_BIN = "ffmpeg"
+TRANSCODE_CACHE_DIR = os.path.join(WRITEABLE_DIR, "transcode_cache")
+TRANSCODE_CACHE_BYTES = 20 * 1024 ** 3  # 캐시 전체 용량 상한 (넘으면 오래 안 쓴 파일부터 삭제)
+TRANSCODE_CHUNK = 64 * 1024
+# codec: (ffmpeg 인코더 옵션, 확장자, MIME) - 파이프로 바로 내보낼 수 있는 스트림형 컨테이너만 사용
+TRANSCODE_CODECS = {
+    "aac": (["-c:a", "aac", "-ar", "44100", "-f", "adts"], ".aac", "audio/aac"),
+    "opus": (["-c:a", "libopus", "-ar", "48000", "-f", "ogg"], ".opus", "audio/ogg"),
+    "mp3": (["-c:a", "libmp3lame", "-ar", "44100", "-f", "mp3"], ".mp3", "audio/mpeg"),
+}
+TRANSCODE_BITRATE_RANGE = (32, 320)  # kbps
+
+TRANSCODE_PART_STALE = 60  # 이 시간(초) 동안 자라지 않은 .part 는 멈추거나 죽은 워커가 남긴 것으로 보고 지움
+TRANSCODE_POLL = 0.05  # 다른 워커가 쓰는 .part 를 따라 읽을 때 새 데이터 확인 간격(초)
+
+# 여러 워커(프로세스)가 같은 캐시 폴더를 쓰므로 파일 시스템이 기준:
+# - 변환은 .part 를 O_CREAT|O_EXCL 로 만든 워커 하나만 하고, 다른 워커는 그 .part(끝나면 같은 파일이 된 캐시 파일)를 따라 읽음
+# - 용량/LRU 는 폴더를 읽어 계산 (mtime = 마지막 사용 시각)
+transcode_jobs = {}  # 캐시 파일명 -> 이 워커가 진행 중인 변환 작업 (같은 워커의 같은 요청은 이 작업을 함께 따라감)
+transcode_lock = threading.Lock()
+transcode_st = {"loaded": False, "bytes": 0, "files": 0, "hits": 0, "started": 0, "shared": 0, "followed": 0,
+                "failed": 0, "evicted": 0}
+
+
+def load_transcode_cache():
+    """처음 한 번 캐시 폴더를 만들고, 오래 멈춘 .part 만 지웁니다 (다른 워커가 쓰는 중인 것은 그대로). (transcode_lock 안에서 호출)"""
+    if transcode_st["loaded"]:
+        return
+    os.makedirs(TRANSCODE_CACHE_DIR, exist_ok=True)
+    for e in os.scandir(TRANSCODE_CACHE_DIR):
+        if e.name.endswith(".part"):
+            remove_stale_part(e.path)
+    transcode_st["loaded"] = True
+
+
+def remove_stale_part(part):
+    """.part 가 TRANSCODE_PART_STALE 넘게 자라지 않았으면 지우고 True. 쓰는 중이거나 이미 없으면 False"""
+    try:
+        st = os.stat(part)
+        if time.time() - st.st_mtime < TRANSCODE_PART_STALE:
+            return False
+        # 판단한 뒤 그 자리에 새 .part 가 생겼으면 건드리지 않음
+        if os.stat(part).st_ino == st.st_ino:
+            os.remove(part)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def transcode_cache_entries():
+    """캐시 폴더의 완성된 변환 파일 [(mtime, 이름, 크기)] - 오래 안 쓴 순서"""
+    entries = []
+    for e in os.scandir(TRANSCODE_CACHE_DIR):
+        if e.name.endswith(".part"): continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:
+            continue  # 다른 워커가 방금 지움
+        entries.append((st.st_mtime, e.name, st.st_size))
+    return sorted(entries)
+
+
+def evict_transcode_cache():
+    """
+    폴더 전체 크기(모든 워커의 결과 합)가 상한을 넘으면 오래 안 쓴 파일부터 지웁니다.
+    가장 최근 파일 하나는 남깁니다. (transcode_lock 안에서 호출)
+    """
+    entries = transcode_cache_entries()
+    total = sum(size for _, _, size in entries)
+    for _, name, size in entries[:-1]:
+        if total <= TRANSCODE_CACHE_BYTES: break
+        try:
+            os.remove(os.path.join(TRANSCODE_CACHE_DIR, name))
+            transcode_st["evicted"] += 1
+        except FileNotFoundError:
+            pass  # 다른 워커가 먼저 지움
+        total -= size
+    transcode_st.update({"bytes": total, "files": len(entries)})
+
+
+def run_transcode(job, src, codec, bitrate, out):
+    """ffmpeg 출력(stdout)을 .part 파일에 이어 쓰면서 대기 중인 요청들을 깨우고, 끝나면 캐시 파일로 확정합니다."""
+    opts = TRANSCODE_CODECS[codec][0]
+    cmd = [FFMPEG_BIN, "-nostdin", "-v", "error", "-i", src, "-map", "0:a:0", "-vn", "-b:a", f"{bitrate}k", *opts, "pipe:1"]
+    rc, proc = -1, None
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        while True:
+            chunk = proc.stdout.read(TRANSCODE_CHUNK)
+            if not chunk: break
+            out.write(chunk)
+            out.flush()
+            with job["cond"]:
+                job["written"] += len(chunk)
+                job["cond"].notify_all()
+        rc = proc.wait()
+    except Exception as e:
+        job["error"] = str(e)
+        if proc and proc.poll() is None:
+            proc.kill()
+    finally:
+        out.close()
+
+    with transcode_lock:
+        try:
+            if rc != 0 or job["written"] == 0:
+                raise RuntimeError(job["error"] or f"ffmpeg 종료 코드 {rc}")
+            os.replace(job["part"], job["final"])  # 따라 읽던 다른 워커는 같은 파일을 끝까지 읽음
+            evict_transcode_cache()
+        except Exception as e:
+            # os.replace 실패: 너무 오래 멈춰 다른 워커가 .part 를 지운 경우
+            job["error"] = job["error"] or str(e)
+            transcode_st["failed"] += 1
+            try: os.remove(job["part"])
+            except OSError: pass
+        transcode_jobs.pop(job["name"], None)
+    with job["cond"]:
+        job["done"] = True
+        job["cond"].notify_all()
+
+
+def follow_transcode(job):
+    """진행 중인 변환 결과를 처음부터 따라 읽음. 아직 안 쓰인 부분은 작업이 더 쓸 때까지 기다립니다."""
+    try:
+        f = open(job["part"], 'rb')
+    except FileNotFoundError:
+        f = open(job["final"], 'rb')  # 그 사이 변환이 끝나 캐시 파일로 옮겨진 경우
+    with f:
+        pos = 0
+        while True:
+            with job["cond"]:
+                while pos >= job["written"] and not job["done"]:
+                    job["cond"].wait()
+                end, done = job["written"], job["done"]
+            while pos < end:
+                chunk = f.read(min(TRANSCODE_CHUNK * 4, end - pos))
+                if not chunk: break
+                pos += len(chunk)
+                yield chunk
+            if done and pos >= end:
+                if job["error"]:
+                    raise IOError(f"변환 실패로 응답이 잘림: {job['error']}")
+                break
+
+
+def transcode_finished(f, final):
+    """따라 읽는 .part 가 캐시 파일로 확정됐는지 (os.replace 는 같은 파일을 옮기므로 inode 가 같음)"""
+    try:
+        return os.stat(final).st_ino == os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def follow_other_worker(f, part, final):
+    """
+    다른 워커가 쓰는 .part 를 따라 읽음. 캐시 파일로 확정되면 끝까지 읽고 끝내고,
+    확정 없이 .part 가 사라지거나 TRANSCODE_PART_STALE 동안 자라지 않으면 변환 실패로 보고 응답을 끊습니다.
+    """
+    with f:
+        idle = time.monotonic()
+        while True:
+            finished = transcode_finished(f, final)  # 읽기 전에 확인해야 확정 직전에 쓰인 끝부분을 놓치지 않음
+            chunk = f.read(TRANSCODE_CHUNK * 4)
+            if chunk:
+                idle = time.monotonic()
+                yield chunk
+                continue
+            if finished:
+                break
+            if not os.path.exists(part) or time.monotonic() - idle > TRANSCODE_PART_STALE:
+                raise IOError("다른 워커의 변환이 끝나지 않아 응답이 잘림")
+            time.sleep(TRANSCODE_POLL)
+
+
+def transcode_cache_path(path, codec, bitrate):
+    """원본(경로/크기/수정 시각)과 변환 설정으로 정해지는 캐시 파일 경로 - 모든 워커가 같은 이름을 씀"""
+    st = os.stat(path)
+    name = hashlib.sha1(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0{codec}\0{bitrate}".encode()).hexdigest()
+    return os.path.join(TRANSCODE_CACHE_DIR, name + TRANSCODE_CODECS[codec][1])
+
+
+def stream_transcoded(path, codec, bitrate):
+    """
+    변환본 응답. 캐시에 있으면 일반 파일처럼(Range/ETag 포함) 보내고,
+    없으면 ffmpeg 작업을 하나만 띄워 출력이 나오는 대로 보냅니다. 같은 요청이 겹치면 그 작업을 공유하고,
+    다른 워커가 이미 변환 중이면 그 .part 를 따라 읽습니다.
+    """
+    mimetype = TRANSCODE_CODECS[codec][2]
+    final = transcode_cache_path(path, codec, bitrate)
+    name, part = os.path.basename(final), final + ".part"
+    headers = {"Cache-Control": "no-store", "X-Transcode": f"{codec}/{bitrate}k"}
+
+    with transcode_lock:
+        load_transcode_cache()
+        job = transcode_jobs.get(name)
+        if job is not None:
+            transcode_st["shared"] += 1
+        while job is None:
+            if os.path.exists(final):
+                transcode_st["hits"] += 1
+                try: os.utime(final)  # 사용 시각 = LRU 순서 (모든 워커가 폴더의 mtime 으로 판단)
+                except OSError: pass
+                return send_cached_file(final, mimetype)
+            try:
+                out = os.fdopen(os.open(part, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), 'wb')
+            except FileExistsError:
+                if remove_stale_part(part):
+                    continue  # 멈춘 변환이 남긴 .part -> 지우고 다시 맡음
+                try:
+                    f = open(part, 'rb')
+                except FileNotFoundError:
+                    continue  # 그 사이 끝났거나(캐시 파일) 실패해서 지워짐 -> 다시 확인
+                transcode_st["followed"] += 1
+                break
+            job = {"name": name, "part": part, "final": final, "written": 0,
+                   "done": False, "error": None, "cond": threading.Condition()}
+            transcode_jobs[name] = job
+            transcode_st["started"] += 1
+            Thread(target=run_transcode, args=(job, path, codec, bitrate, out), daemon=True).start()
+
+    if job is None:
+        # 다른 워커의 첫 출력을 기다림 (그 변환이 출력 없이 실패하면 여기서 오류로 알림)
+        deadline = time.monotonic() + 30
+        while os.fstat(f.fileno()).st_size == 0 and not transcode_finished(f, final):
+            if not os.path.exists(part) or time.monotonic() > deadline:
+                f.close()
+                return jsonify({"error": "변환 실패: 다른 워커의 변환이 출력 없이 끝났습니다."}), 500
+            time.sleep(TRANSCODE_POLL)
+        return Response(follow_other_worker(f, part, final), mimetype=mimetype, direct_passthrough=True, headers=headers)
+
+    # 첫 출력이 나오거나 실패할 때까지 기다렸다가 응답 (ffmpeg 실패를 200 빈 응답 대신 오류로 알림)
+    with job["cond"]:
+        job["cond"].wait_for(lambda: job["written"] > 0 or job["done"], timeout=30)
+    if job["error"] and not job["written"]:
+        return jsonify({"error": f"변환 실패: {job['error']}"}), 500
+    return Response(follow_transcode(job), mimetype=mimetype, direct_passthrough=True, headers=headers)
+
+
+@app.route('/api/admin/transcode')
+def get_transcode_stats():
+    """변환 캐시 상태 (사용량, 적중/공유/실패, 진행 중 작업)"""
+    with transcode_lock:
+        load_transcode_cache()
+        entries = transcode_cache_entries()
+        transcode_st.update({"bytes": sum(size for _, _, size in entries), "files": len(entries)})
+        parts = sum(1 for e in os.scandir(TRANSCODE_CACHE_DIR) if e.name.endswith(".part"))
+        return jsonify({**transcode_st, "budget": TRANSCODE_CACHE_BYTES, "running": len(transcode_jobs),
+                        "running_all_workers": parts})
+
+
+# ------------------------------------------
+# 음량 분석 (ReplayGain 2 / EBU R128)
+# ------------------------------------------
+RG_REFERENCE_LUFS = -18.0  # ReplayGain 2 기준 음량
+LOUDNESS_CPU_BUDGET = 0.5  # 분석에 쓸 CPU 비율. 코어 수 x 비율 = 동시에 돌리는 1스레드 ffmpeg 수
+LOUDNESS_NICE = 10  # 재생/변환보다 낮은 우선순위로 실행
+LOUDNESS_TIMEOUT = 600
+
+rg_st = {"is_running": False, "total": 0, "done": 0, "fail": 0, "tracks_per_min": 0.0, "audio_hours_per_min": 0.0,
+         "workers": 0, "last_log": "대기 중..."}
+rg_stop = threading.Event()
+
+
+def measure_loudness(path):
+    """ffmpeg ebur128 필터로 곡 하나를 끝까지 디코딩해 (통합 음량 LUFS, 트루 피크 dBTP, 길이 초). 실패 시 None"""
+    cmd = [FFMPEG_BIN, "-nostdin", "-hide_banner", "-nostats", "-threads", "1", "-i", path,
+           "-map", "0:a:0", "-af", "ebur128=peak=true:framelog=verbose", "-f", "null", "-"]
+    if shutil.which("nice"):
+        cmd = ["nice", "-n", str(LOUDNESS_NICE)] + cmd
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=LOUDNESS_TIMEOUT)
+    except Exception:
+        return None
+    log = proc.stderr.decode("utf-8", "replace")
+    # 요약(Summary)은 로그 맨 끝에 나오므로 마지막 값을 씀
+    lufs = re.findall(r"I:\s+(-?[\d.]+) LUFS", log)
+    peak = re.findall(r"Peak:\s+(-?[\d.]+|-inf) dBFS", log)
+    dur = re.search(r"Duration: (\d+):(\d+):([\d.]+)", log)
+    if proc.returncode != 0 or not lufs:
+        return None
+    seconds = int(dur.group(1)) * 3600 + int(dur.group(2)) * 60 + float(dur.group(3)) if dur else None
+    return float(lufs[-1]), (float(peak[-1]) if peak else None), seconds
+
+
+def album_loudness(conn, album_id):
+    """
+    앨범 곡들의 음량을 길이 가중 에너지 평균으로 합쳐 ReplayGain 앨범 값을 기록.
+    (앨범 전체를 이어서 한 번 측정한 값의 근사 - 곡마다 다시 디코딩하지 않기 위함)
+    """
+    rows = conn.execute("SELECT lufs, rg_track_peak, duration FROM global_songs WHERE album_id = ? AND lufs IS NOT NULL",
+                        (album_id,)).fetchall()
+    if not rows: return
+    weight = sum(r['duration'] or 1 for r in rows)
+    energy = sum((r['duration'] or 1) * 10 ** (r['lufs'] / 10) for r in rows) / weight
+    conn.execute("UPDATE albums SET rg_album_gain = ?, rg_album_peak = ? WHERE id = ?",
+                 (round(RG_REFERENCE_LUFS - 10 * math.log10(energy), 2), max(r['rg_track_peak'] or 0 for r in rows), album_id))
+
+
+def loudness_job():
+    """
+    분석 안 된 곡(loudness_at IS NULL)을 앨범 순서로 꺼내 분석합니다. 묶음마다 결과를 DB 에 기록하므로
+    중지하거나 서버가 꺼져도 다음 실행은 남은 곡부터 이어집니다. 앨범의 마지막 곡이 끝나면 앨범 값도 계산합니다.
+    """
+    workers = max(1, int((os.cpu_count() or 2) * LOUDNESS_CPU_BUDGET))
+    batch_size = workers * 4
+    try:
+        with db_read() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM global_songs WHERE loudness_at IS NULL").fetchone()[0]
+        rg_st.update({"total": total, "done": 0, "fail": 0, "tracks_per_min": 0.0, "audio_hours_per_min": 0.0,
+                      "workers": workers, "last_log": f"🔊 음량 분석 시작 ({total:,}곡, 동시 {workers}개)"})
+        started, audio_seconds, last = time.time(), 0.0, (-1, -1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loudness") as exe:
+            while not rg_stop.is_set():
+                with db_read() as conn:
+                    # idx_songs_loudness_pending 부분 인덱스로 남은 곡만 (앨범, rowid) 순서로 훑음
+                    rows = conn.execute("""SELECT rowid, stream_url, album_id FROM global_songs
+                                           WHERE loudness_at IS NULL AND (album_id, rowid) > (?, ?)
+                                           ORDER BY album_id, rowid LIMIT ?""", (*last, batch_size)).fetchall()
+                if not rows: break
+                last = (rows[-1]['album_id'], rows[-1]['rowid'])
+                results = list(exe.map(lambda r: measure_loudness(song_file_path(r['stream_url']) or ""), rows))
+
+                now = time.time()
+                with db_write() as conn:
+                    for r, res in zip(rows, results):
+                        if res:
+                            lufs, peak, seconds = res
+                            conn.execute("""UPDATE global_songs SET lufs = ?, rg_track_gain = ?, rg_track_peak = ?,
+                                                   duration = COALESCE(duration, ?), loudness_at = ? WHERE rowid = ?""",
+                                         (lufs, round(RG_REFERENCE_LUFS - lufs, 2),
+                                          round(10 ** (peak / 20), 6) if peak is not None else None, seconds, now, r['rowid']))
+                            audio_seconds += seconds or 0
+                        else:
+                            conn.execute("UPDATE global_songs SET loudness_at = ? WHERE rowid = ?", (now, r['rowid']))
+                    # 이번 묶음에서 분석이 모두 끝난 앨범은 앨범 값 계산
+                    for album_id in {r['album_id'] for r in rows if r['album_id']}:
+                        if not conn.execute("SELECT 1 FROM global_songs WHERE album_id = ? AND loudness_at IS NULL LIMIT 1",
+                                            (album_id,)).fetchone():
+                            album_loudness(conn, album_id)
+                bump_library_generation()
+
+                ok = sum(1 for res in results if res)
+                minutes = max(time.time() - started, 1e-6) / 60
+                rg_st.update({"done": rg_st["done"] + ok, "fail": rg_st["fail"] + len(rows) - ok,
+                              "tracks_per_min": round((rg_st["done"] + ok) / minutes, 1),
+                              "audio_hours_per_min": round(audio_seconds / 3600 / minutes, 2)})
+                rg_st["last_log"] = (f"🔊 {rg_st['done'] + rg_st['fail']:,}/{total:,} | {rg_st['tracks_per_min']:,} 곡/분, "
+                                     f"{rg_st['audio_hours_per_min']} 오디오 시간/분")
+        rg_st["last_log"] = ("⏹️ 음량 분석 중지됨 - 다음 실행 때 이어서 진행" if rg_stop.is_set() else
+                             f"✅ 음량 분석 완료 ({rg_st['done']:,}곡, 실패 {rg_st['fail']:,}곡, {rg_st['tracks_per_min']:,} 곡/분)")
+    except Exception as e:
+        rg_st["last_log"] = f"❌ 음량 분석 중단됨: {e}"
+    finally:
+        rg_st["is_running"] = False
+        rg_stop.clear()
+        release_job("loudness")
+
+
+@app.route('/api/loudness/start')
+def start_loudness():
+    """음량 분석 시작/이어하기 (진행 중이면 상태만 반환)"""
+    if not shutil.which(FFMPEG_BIN):
+        return jsonify({"status": "error", "message": "ffmpeg 를 찾을 수 없어 분석할 수 없습니다."}), 503
+    if rg_st["is_running"] or not claim_job("loudness"):
+        return jsonify({"status": "running", **job_status("loudness")})
+    rg_st["is_running"] = True
+    rg_stop.clear()
+    Thread(target=loudness_job, daemon=True).start()
+    return jsonify({"status": "ok", **rg_st})
+
+
+@app.route('/api/loudness/stop')
+def stop_loudness():
+    send_job_command("loudness", "stop")
+    return jsonify({"status": "ok", "message": "진행 중인 묶음까지 기록하고 중지합니다."})
+
+
+@app.route('/api/loudness/status')
+def get_loudness_status():
+    with db_read() as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM global_songs WHERE loudness_at IS NULL").fetchone()[0]
+    return jsonify({**job_status("loudness"), "pending": pending})
+
+
+# ------------------------------------------
+# 앨범 커버 프록시 (원격 포스터를 한 번만 받아 두고 크기별 썸네일 제공)
+# ------------------------------------------
+COVER_CACHE_DIR = os.path.join(WRITEABLE_DIR, "cover_cache")
+COVER_SIZES = (150, 300, 600)
+COVER_MAX_AGE = 30 * 86400
+COVER_PREFETCH_WORKERS = 4
+COVER_JPEG_QUALITY = 85
+# 원본은 받은 형식 그대로 저장 (썸네일은 항상 JPEG 로 다시 인코딩)
+COVER_EXTS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
+cover_locks = {}  # 캐시 파일명 -> 받는 중 잠금 (같은 커버를 동시에 두 번 받지 않도록)
+cover_lock = threading.Lock()
+cover_st = {"is_running": False, "total": 0, "done": 0, "fetched": 0, "fail": 0, "last_log": "대기 중..."}
+cover_stop = threading.Event()
+
+
+def cover_file(album_id, url, size=None, ext=".jpg"):
+    """원본은 orig/, 썸네일은 <size>/ 아래. 파일명에 URL 해시를 넣어 포스터가 바뀌면 새로 받게 함"""
+    name = f"{album_id}-{hashlib.sha1(url.encode()).hexdigest()[:12]}{ext}"
+    return os.path.join(COVER_CACHE_DIR, str(size) if size else "orig", name)
+
+
+def find_cover_orig(album_id, url):
+    """받아 둔 원본 경로 (원본은 받은 형식의 확장자로 저장되므로 형식별로 확인). 없으면 None"""
+    for ext in dict.fromkeys(COVER_EXTS.values()):
+        path = cover_file(album_id, url, ext=ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def cover_ext(content_type, data):
+    """원본 저장 확장자: PIL 로 내용을 확인하고, 안 되면 Content-Type, 그래도 모르면 .jpg"""
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                ext = COVER_EXTS.get(Image.MIME.get(img.format))
+            if ext: return ext
+        except Exception:
+            pass
+    return COVER_EXTS.get((content_type or "").split(";")[0].strip().lower(), ".jpg")
+
+
+def atomic_write(dest, write):
+    """
+    dest 와 같은 폴더의 고유 임시 파일에 write(파일 객체) 로 쓴 뒤 dest 로 교체합니다.
+    임시 이름은 mkstemp 가 정하므로 fork 된 워커들의 스레드(get_ident 가 겹칠 수 있음)가 같은 파일을 쓸 일이 없습니다.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=os.path.basename(dest) + ".", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp 기본값(0600) 대신 일반 파일 권한
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, dest)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+
+def fetch_cover(album_id, url):
+    """원본 포스터를 받아 저장하고 경로를 돌려줌. 이미 있으면 바로 반환, 실패 시 None"""
+    if url.startswith(ART_URL_PREFIX):
+        # 내장 커버는 이미 로컬 저장소에 있음
+        path = art_store_path(url[len(ART_URL_PREFIX):])
+        return path if os.path.isfile(path) else None
+    orig = find_cover_orig(album_id, url)
+    if orig:
+        return orig
+    key = cover_file(album_id, url)
+    with cover_lock:
+        lock = cover_locks.setdefault(key, threading.Lock())
+    with lock:
+        try:
+            orig = find_cover_orig(album_id, url)
+            if orig:
+                return orig
+            res = requests.get(url, timeout=10)
+            content_type = res.headers.get("Content-Type", "image/")
+            if res.status_code != 200 or not content_type.startswith("image/"):
+                return None
+            orig = cover_file(album_id, url, ext=cover_ext(content_type, res.content))
+            os.makedirs(os.path.dirname(orig), exist_ok=True)
+            atomic_write(orig, lambda f: f.write(res.content))
+            return orig
+        except Exception as e:
+            print(f"[!] 커버 다운로드 실패 ({album_id}): {e}")
+            return None
+        finally:
+            with cover_lock:
+                cover_locks.pop(key, None)
+
+
+def make_thumbnail(orig, thumb, size):
+    """원본에서 size x size 안에 들어가는 JPEG 썸네일 생성. PIL 이 없거나 실패하면 None"""
+    if Image is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(thumb), exist_ok=True)
+        with Image.open(orig) as img:
+            img = img.convert("RGB")
+            img.thumbnail((size, size), Image.LANCZOS)
+            atomic_write(thumb, lambda f: img.save(f, "JPEG", quality=COVER_JPEG_QUALITY, optimize=True, progressive=True))
+        return thumb
+    except Exception as e:
+        print(f"[!] 썸네일 생성 실패 ({orig}): {e}")
+        return None
+
+
+def cover_path(album_id, url, size=None):
+    """요청 크기의 커버 파일 경로 (없으면 받아서/줄여서 만듦). 썸네일을 못 만들면 원본 경로"""
+    orig = fetch_cover(album_id, url)
+    if not orig or not size:
+        return orig
+    thumb = cover_file(album_id, url, size)
+    if os.path.exists(thumb):
+        return thumb
+    return make_thumbnail(orig, thumb, size) or orig
+
+
+@app.route('/cover/<int:album_id>')
+def get_cover(album_id):
+    """
+    앨범 커버. ?size=150|300|600 (생략 시 원본). 목록 화면은 작은 썸네일을 받아 항목당 수 KB 만 내려받음.
+    """
+    size = request.args.get('size', type=int)
+    if size is not None:
+        # 요청 크기 이상인 가장 작은 규격으로 맞춤 (규격 밖 크기로 캐시가 늘어나지 않게)
+        size = next((s for s in COVER_SIZES if s >= size), None)
+    with db_read() as conn:
+        row = conn.execute("SELECT poster FROM albums WHERE id = ?", (album_id,)).fetchone()
+    url = row['poster'] if row else None
+    if not url or not url.startswith("http"):
+        abort(404)
+    path = cover_path(album_id, url, size)
+    if not path:
+        abort(502)
+    return send_cached_file(path, max_age=COVER_MAX_AGE)
+
+
+def prefetch_covers():
+    """포스터가 있는 모든 앨범의 원본과 썸네일을 미리 받아 둠 (동시 다운로드 수 제한)"""
+    with db_read() as conn:
+        rows = conn.execute("SELECT id, poster FROM albums WHERE poster LIKE 'http%'").fetchall()
+    todo = [(r['id'], r['poster']) for r in rows
+            if not (os.path.exists(cover_file(r['id'], r['poster'], COVER_SIZES[-1])) if Image else find_cover_orig(r['id'], r['poster']))]
+    cover_st.update({"total": len(todo), "done": 0, "fetched": 0, "fail": 0, "last_log": f"🖼️ 커버 {len(todo):,}개 받는 중..."})
+
+    def work(album_id, url):
+        if cover_stop.is_set(): return
+        path = fetch_cover(album_id, url)
+        if path:
+            for size in COVER_SIZES:
+                cover_path(album_id, url, size)
+        cover_st["fetched" if path else "fail"] += 1
+        cover_st["done"] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=COVER_PREFETCH_WORKERS) as executor:
+            for f in as_completed([executor.submit(work, a, u) for a, u in todo]): pass
+        cover_st["last_log"] = (f"⏹️ 커버 미리 받기 중지됨 ({cover_st['done']:,}/{cover_st['total']:,})" if cover_stop.is_set() else
+                                f"✅ 커버 미리 받기 완료 ({cover_st['fetched']:,}개, 실패 {cover_st['fail']:,}개)")
+    except Exception as e:
+        cover_st["last_log"] = f"❌ 커버 미리 받기 중단: {e}"
+    finally:
+        cover_st["is_running"] = False
+        release_job("covers")
+
+
+def start_cover_prefetch():
+    with cover_lock:
+        if cover_st["is_running"] or not claim_job("covers"):
+            return False
+        cover_st["is_running"] = True
+    cover_stop.clear()
+    Thread(target=prefetch_covers, daemon=True).start()
+    return True
+
+
+# ------------------------------------------
+# 내장 커버 저장소 (파일 안의 그림을 내용 해시 이름으로 한 번만 저장)
+# ------------------------------------------
+ART_STORE_DIR = os.path.join(WRITEABLE_DIR, "art_store")
+ART_URL_PREFIX = f"{BASE_URL}/art/"
+ART_MAX_AGE = 365 * 86400  # 이름이 내용 해시라 바뀌지 않음
+ART_CHUNK = 200  # 풀 작업 하나에 담는 앨범 수
+
+art_st = {"checked": 0, "found": 0, "stored": 0}
+
+
+def art_store_path(name):
+    return os.path.join(ART_STORE_DIR, name[:2], name)
+
+
+def embedded_picture(path):
+    """파일의 내장 그림 -> (bytes, 확장자). 앞표지(type 3)를 우선하고 없으면 첫 그림. 없거나 JPEG/PNG 가 아니면 None"""
+    try:
+        f = mutagen.File(path)
+    except Exception:
+        return None
+    if f is None: return None
+    pics = [(p.type, p.data) for p in getattr(f, "pictures", None) or []]  # FLAC
+    tags = f.tags
+    try:
+        if hasattr(tags, "getall"):  # ID3 (MP3/DSF)
+            pics += [(p.type, p.data) for p in tags.getall("APIC")]
+        elif tags is not None and "covr" in tags:  # MP4
+            pics += [(3, bytes(c)) for c in tags["covr"]]
+        elif tags is not None and "metadata_block_picture" in tags:  # Ogg
+            from mutagen.flac import Picture
+            for raw in tags["metadata_block_picture"]:
+                p = Picture(base64.b64decode(raw))
+                pics.append((p.type, p.data))
+    except Exception:
+        pass
+    for _, data in sorted(pics, key=lambda p: p[0] != 3):
+        if data[:3] == b"\xff\xd8\xff":
+            return data, ".jpg"
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return data, ".png"
+    return None
+
+
+def extract_art_chunk(items):
+    """
+    풀 작업 단위. [(album_id, 파일 경로)] -> [(album_id, 저장소 파일명 또는 None, 새로 저장했는지)]
+    같은 그림은 같은 이름이라 여러 앨범/프로세스가 동시에 저장해도 결과는 파일 하나입니다.
+    """
+    out = []
+    for album_id, path in items:
+        pic = embedded_picture(path) if path else None
+        if not pic:
+            out.append((album_id, None, False))
+            continue
+        data, ext = pic
+        name = hashlib.sha1(data).hexdigest() + ext
+        dest = art_store_path(name)
+        new = not os.path.exists(dest)
+        if new:
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                atomic_write(dest, lambda fh: fh.write(data))
+            except OSError:
+                out.append((album_id, None, False))
+                continue
+        out.append((album_id, name, new))
+    return out
+
+
+def extract_embedded_art(mode=None, workers=None):
+    """
+    아직 확인하지 않은 포스터 없는 앨범마다 대표 곡(첫 디스크/트랙) 하나에서 내장 커버를 꺼내
+    저장소에 넣고 포스터로 지정합니다. 파일 읽기는 스캔 파싱과 같은 풀 방식(PARSE_MODE)으로 돌립니다.
+    포스터가 생긴 앨범 id 집합을 돌려줍니다.
+    """
+    found = set()
+    if mutagen is None: return found
+    with db_read() as conn:
+        rows = conn.execute("""
+            SELECT al.id, (SELECT s.stream_url FROM global_songs s WHERE s.album_id = al.id
+                           ORDER BY s.disc_no, s.track_no, s.name LIMIT 1) AS url
+            FROM albums al WHERE al.art_checked IS NULL AND (al.poster IS NULL OR al.poster IN ('', 'FAIL'))
+        """).fetchall()
+    if not rows: return found
+    idx_st["last_log"] = f"🖼️ 내장 커버 확인 중... (앨범 {len(rows):,}개)"
+    items = [(r['id'], song_file_path(r['url'])) for r in rows]
+    chunks = [items[i:i + ART_CHUNK] for i in range(0, len(items), ART_CHUNK)]
+    art_st.update({"checked": len(rows), "found": 0, "stored": 0})
+
+    mode = mode or PARSE_MODE
+    pool_cls = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+    with pool_cls(max_workers=1 if mode == "single" else workers or PARSE_WORKERS) as exe:
+        for results in exe.map(extract_art_chunk, chunks):
+            with db_write() as conn:
+                conn.executemany("UPDATE albums SET poster = ?, art_checked = 1 WHERE id = ?",
+                                 [(ART_URL_PREFIX + name, album_id) for album_id, name, _ in results if name])
+                conn.executemany("UPDATE albums SET art_checked = 0 WHERE id = ?",
+                                 [(album_id,) for album_id, name, _ in results if not name])
+            found.update(album_id for album_id, name, _ in results if name)
+            art_st["found"] += sum(1 for r in results if r[1])
+            art_st["stored"] += sum(1 for r in results if r[2])
+            bump_library_generation()
+    idx_st["art"] = dict(art_st)
+    print(f"[*] 🖼️ 내장 커버: 앨범 {art_st['checked']:,}개 중 {art_st['found']:,}개 발견 (새 그림 {art_st['stored']:,}개)")
+    return found
+
+
+@app.route('/art/<name>')
+def get_art(name):
+    """내장 커버 원본. 이름이 내용 해시라 오래 캐시해도 됨"""
+    if not re.fullmatch(r'[0-9a-f]{40}\.(jpg|png)', name):
+        abort(404)
+    path = art_store_path(name)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_cached_file(path, max_age=ART_MAX_AGE)
+
+
+@app.route('/api/covers/prefetch')
+def run_cover_prefetch():
+    """커버 미리 받기 시작 (진행 중이면 상태만 반환)"""
+    started = start_cover_prefetch()
+    return jsonify({"status": "ok" if started else "running", **job_status("covers")})
+
+
 @app.route('/stream/<path:fp>')
-def stream(fp): return send_from_directory(MUSIC_BASE, urllib.parse.unquote(fp))
+def stream(fp):
+    """
+    원본 스트리밍. ?codec=aac|opus|mp3&bitrate=256 을 주면 ffmpeg 로 변환해서 보냄 (셀룰러용).
+    """
+    path = safe_join(MUSIC_BASE, urllib.parse.unquote(fp))
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    codec = request.args.get('codec')
+    if codec:
+        if codec not in TRANSCODE_CODECS:
+            return jsonify({"error": f"지원하지 않는 코덱입니다: {codec}"}), 400
+        bitrate = int(re.sub(r'[^0-9]', '', request.args.get('bitrate', '256')) or 256)
+        bitrate = min(max(bitrate, TRANSCODE_BITRATE_RANGE[0]), TRANSCODE_BITRATE_RANGE[1])
+        if not shutil.which(FFMPEG_BIN):
+            return jsonify({"error": "ffmpeg 를 찾을 수 없어 변환할 수 없습니다."}), 503
+        return stream_transcoded(path, codec, bitrate)
+    return send_cached_file(path)
+
+
+def send_cached_file(path, mimetype=None, max_age=STREAM_MAX_AGE):
+    """
+    디스크의 파일 하나(음원, 변환 캐시, 커버/내장 그림)를 Range/재검증(ETag, Last-Modified)/sendfile 을 지원하며 보냄.
+    mimetype 을 주지 않으면 확장자로 정함
+    """
+    st = os.stat(path)
+    size = st.st_size
+    etag = f"{size:x}-{st.st_mtime_ns:x}"
+    mimetype = mimetype or AUDIO_MIMETYPES.get(os.path.splitext(path)[1].lower()) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+
+    # 1. 재검증: 파일이 그대로면 본문 없이 304
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and int(st.st_mtime) <= request.if_modified_since.timestamp():
+        return Response(status=304, headers=headers)
+
+    # 2. Range: If-Range 가 현재 파일과 다르면 전체를 다시 보냄
+    start, length, status = 0, size, 200
+    rng = request.range
+    if_range = request.if_range
+    if rng and (if_range.etag or if_range.date):
+        if (if_range.etag and if_range.etag != etag) or (if_range.date and int(st.st_mtime) > if_range.date.timestamp()):
+            rng = None
+    if rng:
+        # 다중 구간(multipart/byteranges)은 지원하지 않음 - 플레이어는 항상 단일 구간으로 요청함
+        span = rng.range_for_length(size) if len(rng.ranges) == 1 else None
+        if span is None:
+            return Response(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, stop = span
+        length, status = stop - start, 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    headers["Content-Length"] = str(length)
+
+    sock = request.environ.get("werkzeug.socket")
+    if sock is not None and request.scheme == "http" and length >= STREAM_SENDFILE_MIN:
+        body = sendfile_range(path, start, length, sock)
+    else:
+        body = read_file_range(path, start, length)
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
 
 
-if __name__ == '__main__':
+# ==========================================
+# 다중 워커 (공유 작업 상태 / 작업 리스 / pre-fork 서버)
+# ==========================================
+# 워커 프로세스마다 idx_st/up_st 같은 상태 dict 와 테마/응답 캐시를 따로 가지므로,
+# 작업 진행 상황과 "누가 돌리는 중인가"는 SQLite job_state 테이블(라이브러리 DB 옆의 작은 별도 파일, job_db)로 공유합니다.
+# - 작업(스캔/메타데이터/음량 분석/커버 미리 받기/테마 갱신)은 리스를 잡은 워커 한 곳에서만 실행
+# - 리스를 쥔 워커는 JOB_SYNC_INTERVAL 마다 상태 스냅샷을 쓰면서 리스를 연장 (죽으면 JOB_LEASE_SECONDS 뒤 만료)
+# - 다른 워커는 상태 API 에서 그 스냅샷을 읽고, 중지 등은 command 칸에 적어 소유 워커가 처리
+# - library/themes 세대 번호도 여기 두어 다른 워커의 쓰기가 응답 캐시/테마 캐시를 무효화하게 함
+SERVER_WORKERS = 1  # --workers N 또는 NMP_WORKERS 로 지정 (1 이면 기존처럼 단일 프로세스)
+JOB_LEASE_SECONDS = 120  # 소유 워커가 죽거나 멈췄을 때 다른 워커가 넘겨받기까지 (연장은 job_db 라 라이브러리 쓰기에 밀리지 않음)
+JOB_SYNC_INTERVAL = 1.0  # 스냅샷 기록/리스 연장/다른 워커 변경 확인 주기(초)
+
+job_leases = set()  # 이 프로세스가 쥔 작업 이름
+job_lock = threading.Lock()
+job_claim_lock = threading.Lock()  # 같은 워커 안에서 동시에 시작을 눌러도 한 번만 잡히도록
+job_sync = {"pid": None, "seen": {"library": 0, "themes": 0}, "pending": {"library": 0, "themes": 0}}
+_worker = {"pid": None, "id": None}
+
+
+def worker_id():
+    """리스 소유자 이름. fork 뒤에는 pid 가 바뀌므로 다시 만들고, pid 재사용에 대비해 난수를 붙임"""
+    if _worker["pid"] != os.getpid():
+        _worker.update({"pid": os.getpid(), "id": f"{socket.gethostname()}:{os.getpid()}:{random.getrandbits(32):08x}"})
+    return _worker["id"]
+
+
+def job_snapshot(name):
+    """공유 테이블에 올릴 작업 상태. 메타데이터는 대기열/제공자 상태도 함께 (소유 워커에만 있음)"""
+    if name == "metadata":
+        return {**up_st, "queue": meta_queue_depths(),
+                "providers": {p: provider_state(p) for p in provider_buckets}}
+    return dict({"indexing": idx_st, "loudness": rg_st, "covers": cover_st}.get(name, {}))
+
+
+def claim_job(name):
+    """
+    작업 리스를 잡습니다. 누군가(이 워커 포함) 유효한 리스를 쥐고 있으면 False.
+    확인과 기록을 한 문장(upsert ... WHERE)으로 하므로 여러 워커가 동시에 시작을 눌러도 한 곳만 성공합니다.
+    리스를 잡은 쪽이 작업을 실행하고, 끝나면 release_job 으로 놓아야 합니다.
+    """
+    with job_claim_lock:
+        if name in job_leases:
+            return False
+        now = time.time()
+        with job_db() as conn:
+            won = conn.execute("""
+                INSERT INTO job_state (name, owner, lease_until, command, updated) VALUES (?, ?, ?, NULL, ?)
+                ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until,
+                                                command = NULL, updated = excluded.updated
+                WHERE job_state.lease_until <= ?
+            """, (name, worker_id(), now + JOB_LEASE_SECONDS, now, now)).rowcount
+        if not won:
+            return False
+        with job_lock:
+            job_leases.add(name)
+    ensure_job_sync()
+    event_wake.set()
+    if name == "metadata":
+        pull_meta_demand()
+    return True
+
+
+def release_job(name):
+    """작업을 마친 워커가 마지막 상태를 남기고 리스를 놓음"""
+    with job_lock:
+        if name not in job_leases: return
+        job_leases.discard(name)
+    event_wake.set()
+    try:
+        with job_db() as conn:
+            conn.execute("UPDATE job_state SET lease_until = 0, state = ?, updated = ? WHERE name = ? AND owner = ?",
+                         (json.dumps(job_snapshot(name), ensure_ascii=False, default=str), time.time(), name, worker_id()))
+    except Exception as e:
+        print(f"[!] 작업 리스 반납 실패 ({name}): {e}")
+
+
+def job_status(name):
+    """
+    상태 API 용. 이 워커가 작업을 돌리는 중이면 메모리 값을, 아니면 소유 워커가 마지막으로 남긴 스냅샷을 돌려줍니다.
+    is_running 은 스냅샷 값이 아니라 리스로 정하므로 소유 워커가 죽어도 리스가 만료되면 False 가 됩니다.
+    """
+    if name in job_leases:
+        return job_snapshot(name)
+    with job_db() as conn:
+        row = conn.execute("SELECT state, lease_until FROM job_state WHERE name = ?", (name,)).fetchone()
+    if not row or not row['state']:
+        return {**job_snapshot(name), "is_running": bool(row and row['lease_until'] > time.time())}
+    return {**json.loads(row['state']), "is_running": row['lease_until'] > time.time()}
+
+
+def send_job_command(name, command):
+    """중지 같은 명령을 작업을 돌리는 워커에게 보냄. 이 워커가 소유자면 바로 처리"""
+    if name in job_leases:
+        handle_job_command(name, command)
+        return
+    with job_db() as conn:
+        conn.execute("UPDATE job_state SET command = ? WHERE name = ? AND lease_until > ?", (command, name, time.time()))
+
+
+def handle_job_command(name, command):
+    if command == "stop":
+        stop_job(name)
+    elif name == "metadata" and command.startswith("backlog:"):
+        # 요청 앨범만 처리하던 실행이면 그 대기열 뒤에 backlog 를 이어 붙임 (다른 대상이 돌고 있으면 무시)
+        q = command[len("backlog:"):] or None
+        if up_st["is_running"] and up_st["target"] == META_DEMAND_TARGET:
+            up_st["target"] = q if q else '전체'
+            Thread(target=queue_meta_backlog, args=(q,), daemon=True).start()
+
+
+def stop_job(name):
+    """
+    이 워커에서 도는 작업을 멈춤. 리스를 잃었을 때도 불리므로 리스를 잡는 작업마다 중지 신호가 있어야
+    같은 작업이 두 워커에서 돌지 않습니다 (스캔/커버는 다음 묶음 전에, 테마는 쓰기 전에 멈춤).
+    """
+    if name == "metadata" and up_st["is_running"]:
+        up_st["is_running"] = False
+        meta_stop.set()
+    elif name == "loudness" and rg_st["is_running"]:
+        rg_stop.set()
+    elif name == "indexing" and idx_st["is_running"]:
+        idx_stop.set()
+    elif name == "covers" and cover_st["is_running"]:
+        cover_stop.set()
+    elif name == "themes":
+        theme_stop.set()
+
+
+def forward_meta_demand():
+    """리스가 없는 워커가 받은 demand 앨범을 공유 테이블로 넘김 (소유 워커가 JOB_SYNC_INTERVAL 안에 가져감)"""
+    ids = []
+    while (album_id := pop_meta()) is not None:
+        ids.append(album_id)
+    if ids:
+        now = time.time()
+        with job_db() as conn:
+            conn.executemany("INSERT OR IGNORE INTO meta_demand (album_id, at) VALUES (?, ?)", [(i, now) for i in ids])
+
+
+def pull_meta_demand():
+    """다른 워커가 넘긴 demand 앨범을 이 워커의 대기열로 가져옴"""
+    with job_db() as conn:
+        ids = [r[0] for r in conn.execute("SELECT album_id FROM meta_demand")]
+        if ids: conn.execute("DELETE FROM meta_demand")
+    if ids:
+        enqueue_meta(ids, "demand")
+    return len(ids)
+
+
+def has_forwarded_meta_demand():
+    with job_db() as conn:
+        return conn.execute("SELECT 1 FROM meta_demand LIMIT 1").fetchone() is not None
+
+
+def ensure_job_sync():
+    """워커마다 동기화 스레드 하나 (fork 전에 만든 스레드는 자식에 없으므로 pid 로 확인)"""
+    with job_lock:
+        if job_sync["pid"] == os.getpid(): return
+        job_sync["pid"] = os.getpid()
+    Thread(target=job_sync_loop, daemon=True, name="job-sync").start()
+
+
+def job_sync_loop():
+    while True:
+        time.sleep(JOB_SYNC_INTERVAL)
+        try:
+            sync_job_state()
+        except Exception as e:
+            print(f"[!] 작업 상태 동기화 오류: {e}")
+
+
+def sync_job_state():
+    """
+    JOB_SYNC_INTERVAL 마다 한 번:
+    1) 쥔 작업의 스냅샷 기록 + 리스 연장 (다른 워커에게 넘어갔으면 멈춤) 및 command 수거
+    2) 이 워커가 올린 세대 번호를 공유 카운터에 반영하고, 다른 워커가 올렸으면 로컬 캐시 무효화
+    쥔 작업도 올릴 세대도 없으면 읽기 한 번으로 끝남.
+    """
+    now, me = time.time(), worker_id()
+    with job_lock:
+        owned = list(job_leases)
+        pending = job_sync["pending"]
+        job_sync["pending"] = {"library": 0, "themes": 0}
+    commands, lost = [], []
+    foreign = {"library": False, "themes": False}
+
+    def sync_gens(conn):
+        gens = {r['name']: r['gen'] for r in conn.execute(
+            "SELECT name, gen FROM job_state WHERE name IN ('library', 'themes')")}
+        for key in foreign:
+            g = gens.get(key, 0)
+            foreign[key] = g != job_sync["seen"][key]
+            if pending[key]:
+                conn.execute("""INSERT INTO job_state (name, gen, updated) VALUES (?, 1, ?)
+                                ON CONFLICT(name) DO UPDATE SET gen = gen + 1, updated = excluded.updated""", (key, now))
+                g += 1
+            job_sync["seen"][key] = g
+
+    # 리스 연장은 job_db 로 - 라이브러리 DB 쓰기(db_write_lock)가 오래 잡혀 있어도 밀리지 않음
+    with job_db() as conn:
+        for name in owned:
+            renewed = conn.execute("""UPDATE job_state SET lease_until = ?, state = ?, updated = ?
+                                      WHERE name = ? AND owner = ?""",
+                                   (now + JOB_LEASE_SECONDS, json.dumps(job_snapshot(name), ensure_ascii=False, default=str),
+                                    now, name, me)).rowcount
+            if not renewed:
+                lost.append(name)
+                continue
+            cmd = conn.execute("SELECT command FROM job_state WHERE name = ?", (name,)).fetchone()[0]
+            if cmd:
+                conn.execute("UPDATE job_state SET command = NULL WHERE name = ?", (name,))
+                commands.append((name, cmd))
+        sync_gens(conn)
+
+    for name in lost:
+        # 리스가 만료돼 다른 워커가 가져갔으면 같은 작업이 두 곳에서 돌지 않도록 여기서 멈춤
+        print(f"[!] 작업 리스를 잃었습니다 ({name}). 이 워커의 작업을 중지합니다.")
+        with job_lock:
+            job_leases.discard(name)
+        stop_job(name)
+    for name, cmd in commands:
+        handle_job_command(name, cmd)
+    if "metadata" in owned and "metadata" not in lost:
+        pull_meta_demand()
+    if foreign["library"]:
+        with response_cache_lock:
+            library_gen["n"] += 1
+    if foreign["themes"]:
+        load_cache()
+
+
+def reset_job_leases():
+    """서버를 새로 띄울 때 이전 프로세스들이 남긴 리스를 정리 (모두 이미 죽은 프로세스)"""
+    with job_db() as conn:
+        conn.execute("UPDATE job_state SET lease_until = 0, command = NULL WHERE lease_until > 0")
+
+
+def close_db_connections():
+    """fork 전에 부모의 SQLite 연결을 모두 닫음 (연결을 fork 너머로 넘기면 잠금 상태가 꼬일 수 있음)"""
+    while True:
+        try:
+            conn, _ = _read_pool.get_nowait()
+        except queue.Empty:
+            break
+        conn.close()
+    with db_write_lock:
+        if _writer["conn"] is not None:
+            _writer["conn"].close()
+            _writer.update({"conn": None, "born": 0})
+    with job_db_lock:
+        if _job_db["conn"] is not None:
+            _job_db["conn"].close()
+            _job_db["conn"] = None
+
+
+@app.before_request
+def start_job_sync():
+    ensure_job_sync()
+
+
+def serve(host='0.0.0.0', port=4444, workers=SERVER_WORKERS):
+    """
+    운영용 진입점. workers 가 2 이상이면 소켓을 한 번 열고 워커 프로세스를 fork 해서 같은 소켓에서 accept 합니다 (pre-fork).
+    워커마다 스레드 서버를 돌리므로 처리량이 GIL 하나에 묶이지 않고 코어 수만큼 늘어납니다.
+    죽은 워커는 다시 띄우고, SIGTERM/SIGINT 를 받으면 워커를 모두 끝낸 뒤 종료합니다.
+    """
     init_db()
+    reset_job_leases()
     load_cache()
-    app.run(host='0.0.0.0', port=4444, debug=False)
+    if workers <= 1:
+        app.run(host=host, port=port, debug=False)
+        return
+
+    close_db_connections()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    children = set()
+    stopping = {"flag": False}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def shutdown(signum, frame):
+        stopping["flag"] = True
+        for pid in list(children):
+            try: os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"[*] 🚀 워커 {workers}개로 http://{host}:{port} 서비스 시작 (부모 pid {os.getpid()})")
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping["flag"]:
+            print(f"[!] 워커 {pid} 종료됨 (상태 {status}). 다시 띄웁니다.")
+            time.sleep(1)
+            spawn()
+    sock.close()
+
+
+if __name__ == '__main__':
+    workers = int(os.environ.get("NMP_WORKERS", SERVER_WORKERS))
+    if "--workers" in sys.argv[1:-1]:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    serve(workers=workers)
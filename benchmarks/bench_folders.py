@@ -0,0 +1,41 @@
+"""
+폴더 트리 갱신: 스캔 묶음 하나(SCAN_BATCH_SIZE 곡)의 경로만 다시 계산하는 update_folders 와
+예전처럼 트리 전체를 다시 만드는 rebuild_folders 의 쓰기 잠금 시간 비교
+
+    python benchmarks/bench_folders.py --rows 500000
+"""
+import argparse
+import random
+
+import common
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    common.populate(args.rows)
+    with nmp.db_read() as conn:
+        paths = [r[0] for r in conn.execute("SELECT DISTINCT parent_path FROM global_songs")]
+    rng = random.Random(5)
+    # 스캔 묶음 하나가 닿는 폴더 수 (앨범 폴더당 12곡)
+    batch = [rng.sample(paths, nmp.SCAN_BATCH_SIZE // 12) for _ in range(args.repeat)]
+
+    def run(fn):
+        it = iter(batch)
+
+        def once():
+            with nmp.db_write() as conn:
+                fn(conn, next(it))
+        return common.summary(common.timed(once, args.repeat))
+
+    print(f"rows={args.rows} folders={len(paths)} batch_folders={len(batch[0])}")
+    print(f"  update_folders   {run(nmp.update_folders)}")
+    print(f"  rebuild_folders  {run(lambda conn, _: nmp.rebuild_folders(conn))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+메타데이터 엔진 처리량: 로컬 스텁 제공자(stub_providers)를 상대로 카테고리별 앨범/분 측정
+
+    python benchmarks/bench_meta.py --albums 30 --categories 국내 외국
+    python benchmarks/bench_meta.py --albums 30 --latency 0.2 --miss-rate 0.3
+
+실제 속도는 PROVIDER_LIMITS(배포 설정 그대로)의 토큰 버킷이 정합니다. 카테고리마다 첫 제공자가 다르므로
+(META_STRATEGIES: 국내는 deezer, 그 밖에는 itunes 먼저) 카테고리별로 따로 돌려 봅니다.
+--rate itunes=20 처럼 한도를 바꿔 어느 제공자가 병목인지 볼 수 있습니다.
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+import common
+from stub_providers import StubProviders
+
+
+LATIN = ["la", "mo", "ri", "sa", "ven", "tor", "ka", "lu", "nes", "di", "ro", "mi"]
+
+
+def populate(nmp, albums):
+    """카테고리마다 앨범 albums 개(가수당 1앨범, 앨범당 1곡). 서구권 정제는 한글을 지우므로 국내 밖은 라틴 이름"""
+    rng = random.Random(3)
+    batch = []
+    for cat in common.CATEGORIES:
+        latin = cat != "국내"
+        for i in range(albums):
+            w = (lambda n: "".join(rng.choice(LATIN) for _ in range(n)).title()) if latin else (lambda n: common.word(rng, n))
+            artist, album, title = f"{w(3)} {w(2)}", w(4), f"{w(3)} {w(2)}"
+            parent = f"{cat}/{artist}/{album}"
+            batch.append((title, artist, album, f"/stream?path={parent}/01.flac", parent))
+    with nmp.db_write() as conn:
+        common.insert_rows(conn, batch, {})
+        nmp.rebuild_folders(conn)
+    nmp.refresh_artist_cache()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--albums", type=int, default=30, help="카테고리당 앨범 수")
+    ap.add_argument("--categories", nargs="+", default=["국내", "외국"], choices=common.CATEGORIES)
+    ap.add_argument("--latency", type=float, default=0.05, help="스텁 응답 지연(초)")
+    ap.add_argument("--miss-rate", type=float, default=0.0)
+    ap.add_argument("--rate", action="append", default=[], metavar="PROVIDER=RATE")
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    nmp.start_cover_prefetch = lambda: False  # 매칭 속도만 잼 (포스터 내려받기 제외)
+    for spec in args.rate:
+        name, rate = spec.split("=")
+        nmp.PROVIDER_LIMITS[name]["rate"] = float(rate)
+    populate(nmp, args.albums)
+
+    stub = StubProviders(latency=args.latency, miss_rate=args.miss_rate).start()
+    stub.point(nmp)
+    print(f"albums/category={args.albums} latency={args.latency}s miss_rate={args.miss_rate} limits={nmp.PROVIDER_LIMITS}")
+    try:
+        for cat in args.categories:
+            for name, bucket in nmp.provider_buckets.items():  # 앞 카테고리가 쓴 토큰을 채워 두고 시작
+                bucket.update(tokens=float(nmp.PROVIDER_LIMITS[name]["burst"]), at=time.monotonic())
+            before = dict(stub.requests)
+            t = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                nmp.start_metadata_update_thread(cat)
+            elapsed = time.perf_counter() - t
+            sent = {k: v - before[k] for k, v in stub.requests.items() if v - before[k]}
+            st = nmp.up_st
+            print(f"  {cat:4} {st['current']:4d} albums in {elapsed:6.1f} s = {st['current'] / elapsed * 60:7.1f} albums/min"
+                  f"   success {st['success']} fail {st['fail']} deferred {st['deferred']}   requests {sent}")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+목록 페이징: 커서로 500페이지까지 넘겼을 때 500페이지 비용이 1페이지와 같은지,
+예전 page=N(OFFSET) 방식과 비교
+
+    python benchmarks/bench_paging.py --rows 600000
+
+기본 라이브러리(가수당 앨범 1장, 앨범당 4곡)면 카테고리마다 가수 3만 명(artists_paged 500페이지),
+카테고리마다 12만 곡(theme-details 1200페이지)이 됩니다.
+"""
+import argparse
+import contextlib
+import io
+
+import common
+
+ROUTES = [
+    # 이름, URL, 페이지 크기
+    ("artists_paged", "/api/library/artists_paged/국내", 60),
+    ("theme-details", "/api/theme-details/국내", 100),
+    ("admin/data", "/api/admin/data", 50),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=600000)
+    ap.add_argument("--page", type=int, default=500)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    common.populate(args.rows, songs_per_album=4, albums_per_artist=1)
+    client = nmp.app.test_client()
+
+    def get(url, **qs):
+        nmp.response_cache.clear()  # 응답 캐시가 아니라 쿼리 비용을 잼
+        with contextlib.redirect_stdout(io.StringIO()):  # admin/data 의 디버그 출력
+            res = client.get(url, query_string=qs)
+        assert res.status_code == 200, res.status_code
+        return res
+
+    print(f"rows={args.rows} page={args.page}")
+    tokens = {}
+    for label, url, _ in ROUTES:
+        # 앱이 하듯 X-Next-Cursor 를 따라 page-1 페이지를 넘김
+        token, walked = None, 1
+        while walked < args.page:
+            token = get(url, **({"cursor": token} if token else {})).headers.get("X-Next-Cursor")
+            if not token:
+                break
+            walked += 1
+        if walked < args.page:
+            print(f"  {label:14} 페이지가 {walked}개뿐이라 건너뜀")
+            continue
+        tokens[label] = token
+        print(f"  {label:14} page 1            {common.summary(common.timed(lambda: get(url), args.repeat))}")
+        print(f"  {label:14} cursor page {args.page:<5} "
+              f"{common.summary(common.timed(lambda: get(url, cursor=token), args.repeat))}")
+        print(f"  {label:14} page={args.page:<13} "
+              f"{common.summary(common.timed(lambda: get(url, page=args.page), args.repeat))}")
+
+    # theme-details 의 예전 실행 계획(경로 범위로 하위 트리 전체를 읽어 페이지마다 정렬)
+    key = nmp.decode_cursor(tokens["theme-details"])
+    with nmp.db_read() as conn:
+        def range_sort():
+            conn.execute(f"""SELECT {nmp.SONG_BASIC_COLUMNS} FROM {nmp.SONG_FROM}
+                             WHERE s.parent_path >= ? AND s.parent_path < ?
+                               AND (s.artist, s.name, s.rowid) > (?, ?, ?)
+                             ORDER BY s.artist, s.name, s.rowid LIMIT 100""",
+                         ["국내", "국내\U0010ffff", *key]).fetchall()
+        print(f"  {'theme (sort)':14} cursor page {args.page:<5} {common.summary(common.timed(range_sort, args.repeat))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+스캔 파싱 처리량(files/sec): 단일 스레드 / 스레드 풀 / 프로세스 풀
+
+한글 폴더명이 섞인 합성 경로 목록으로 parse_stage 를 그대로 돌립니다.
+기본은 경로 파싱(get_info)만 재고, --tags 를 주면 실제 빈 파일을 만들어 태그 읽기까지 포함합니다.
+
+    python benchmarks/bench_parse.py --files 200000 --workers 4
+"""
+import argparse
+import os
+import random
+import time
+
+import common
+
+FOLDERS = [
+    ("국내/가수/{a}/{b}", "{n:02d}. {a} - {t}.mp3"),
+    ("국내/발라드 모음 {i}", "{a} - {t}.flac"),
+    ("일본/J-POP/{a}/{b}", "{n:02d}. {t}.flac"),
+    ("클래식/{a}/{b}", "{n:02d} - {t} - {b} 악장.flac"),
+    ("OST/{b}", "CD1 - {t}.mp3"),
+    ("외국/{a}/{b}", "{n:02d} {t}.m4a"),
+]
+
+
+def corpus(nmp, files, per_dir=12, create=False):
+    rng = random.Random(3)
+    listed = []
+    for i in range(files // per_dir):
+        folder, pattern = FOLDERS[i % len(FOLDERS)]
+        a, b = common.word(rng, 3), common.word(rng, 4)
+        d = os.path.join(nmp.MUSIC_BASE, *folder.format(a=a, b=b, i=i).split("/"))
+        names = [pattern.format(n=n + 1, a=a, b=b, t=common.word(rng, 5)) for n in range(per_dir)]
+        if create:
+            os.makedirs(d, exist_ok=True)
+            for n in names:
+                open(os.path.join(d, n), "wb").close()
+        listed.append((d, names))
+    return listed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=200000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--tags", action="store_true", help="빈 파일을 만들어 mutagen 태그 읽기까지 포함")
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    nmp.READ_TAGS = args.tags
+    listed = corpus(nmp, args.files, create=args.tags)
+    total = sum(len(n) for _, n in listed)
+    print(f"files={total} workers={args.workers} chunk={nmp.PARSE_CHUNK} tags={args.tags} cpus={os.cpu_count()}")
+    for mode in ("single", "thread", "process"):
+        stats = {"listed_dirs": 0, "listed_files": 0, "parsed": 0}
+        t = time.perf_counter()
+        rows = sum(len(b) for b in nmp.parse_stage(iter(listed), stats, mode=mode, workers=args.workers))
+        elapsed = time.perf_counter() - t
+        print(f"  {mode:8} {total / elapsed:10.0f} files/s   ({rows} rows, {elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
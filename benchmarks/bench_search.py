@@ -0,0 +1,42 @@
+"""
+검색 지연시간: FTS5(trigram, bm25) 경로와 예전 LIKE '%q%' 전체 스캔 비교
+
+    python benchmarks/bench_search.py --rows 500000
+"""
+import argparse
+import random
+
+import common
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500000)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    common.populate(args.rows)
+    client = nmp.app.test_client()
+
+    rng = random.Random(7)
+    # 실제 곡명/가수명에서 잘라낸 3~5글자 부분 문자열
+    with nmp.db_read() as conn:
+        names = [r[0] for r in conn.execute("SELECT name FROM global_songs ORDER BY random() LIMIT ?", (args.queries,))]
+    queries = [n[s:s + rng.randint(3, 5)] for n in names for s in [rng.randint(0, 2)]]
+
+    def run(path):
+        it = iter(queries * 2)
+        samples = common.timed(lambda: client.get(path, query_string={"q": next(it)}), len(queries))
+        return common.summary(samples)
+
+    print(f"rows={args.rows} queries={len(queries)}")
+    for label, path in (("search", "/api/search"), ("search_integrated", "/api/library/search_integrated")):
+        print(f"  {label:18} fts   {run(path)}")
+        nmp.FTS_READY = False
+        print(f"  {label:18} like  {run(path)}")
+        nmp.FTS_READY = True
+
+
+if __name__ == "__main__":
+    main()
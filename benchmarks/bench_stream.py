@@ -0,0 +1,106 @@
+"""
+/stream 처리량과 첫 바이트까지 시간(TTFB): send_from_directory(예전 방식) / 블록 읽기 / sendfile
+
+로컬 파일 트리에 큰 오디오 파일을 만들고 실제 HTTP 서버(werkzeug, 스레드)에 동시 클라이언트로
+임의 위치 Range 요청을 보냅니다. 전체 파일을 처음부터 받는 요청도 섞을 수 있습니다.
+
+    python benchmarks/bench_stream.py --size-mb 40 --clients 8 --requests 32
+"""
+import argparse
+import http.client
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import send_from_directory
+from werkzeug.serving import make_server
+
+import common
+
+
+def serve(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch(port, url, span):
+    """(TTFB 초, 받은 바이트, 전체 시간 초)"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    t0 = time.perf_counter()
+    headers = {"Range": f"bytes={span[0]}-{span[1]}"} if span else {}
+    conn.request("GET", url, headers=headers)
+    res = conn.getresponse()
+    first = res.read(1)
+    ttfb = time.perf_counter() - t0
+    n = len(first)
+    while chunk := res.read(1024 * 1024):
+        n += len(chunk)
+    conn.close()
+    assert res.status in (200, 206), res.status
+    return ttfb, n, time.perf_counter() - t0
+
+
+def run(port, url, size, args, rng):
+    spans = []
+    for i in range(args.requests):
+        if args.full_every and i % args.full_every == 0:
+            spans.append(None)
+        else:
+            start = rng.randrange(0, size - args.range_kb * 1024)
+            spans.append((start, start + args.range_kb * 1024 - 1))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as exe:
+        results = list(exe.map(lambda s: fetch(port, url, s), spans))
+    wall = time.perf_counter() - t0
+    ttfb = sorted(r[0] * 1000 for r in results)
+    total = sum(r[1] for r in results)
+    return total / wall / 1e6, statistics.median(ttfb), ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.99))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=int, default=40)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=32)
+    ap.add_argument("--range-kb", type=int, default=4096, help="Range 요청 하나의 크기")
+    ap.add_argument("--full-every", type=int, default=0, help="N 번째 요청마다 전체 파일 요청 (0 이면 Range 만)")
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    rel = os.path.join("국내", "가수", "앨범", "01 긴 곡.flac")
+    path = os.path.join(nmp.MUSIC_BASE, rel)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+    size = os.path.getsize(path)
+
+    # 비교 기준: 예전 /stream 이 쓰던 send_from_directory (벤치마크에서만 등록)
+    nmp.app.add_url_rule("/bench/send_from_directory/<path:fp>", "bench_send_from_directory",
+                         lambda fp: send_from_directory(nmp.MUSIC_BASE, urllib.parse.unquote(fp)))
+    server = serve(nmp.app)
+    port = server.server_port
+    quoted = urllib.parse.quote(rel)
+
+    print(f"file={args.size_mb} MiB clients={args.clients} requests={args.requests} range={args.range_kb} KiB "
+          f"block={nmp.STREAM_BLOCK_SIZE // 1024} KiB sendfile_min={nmp.STREAM_SENDFILE_MIN // 1024} KiB")
+    sendfile_min = nmp.STREAM_SENDFILE_MIN
+    modes = [("send_from_directory", f"/bench/send_from_directory/{quoted}", sendfile_min),
+             ("block read", f"/stream/{quoted}", float("inf")),
+             ("sendfile", f"/stream/{quoted}", sendfile_min)]
+    for label, url, threshold in modes:
+        nmp.STREAM_SENDFILE_MIN = threshold
+        fetch(port, url, (0, 1023))  # 준비 (페이지 캐시, 라우트)
+        mbps, p50, p99 = run(port, url, size, args, random.Random(5))
+        print(f"  {label:20} {mbps:8.0f} MB/s   TTFB p50 {p50:7.1f} ms   p99 {p99:7.1f} ms")
+    nmp.STREAM_SENDFILE_MIN = sendfile_min
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
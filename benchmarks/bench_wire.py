@@ -0,0 +1,59 @@
+"""
+응답 직렬화/압축: 엔드포인트별 전송 바이트와 요청당 CPU 시간
+
+json.dumps(표준) / orjson 직렬화와 identity / gzip / br 인코딩 조합마다 같은 요청을 반복합니다.
+응답 캐시는 매 요청 전에 비워서 직렬화와 압축 비용이 매번 들어가게 합니다.
+
+    python benchmarks/bench_wire.py --rows 100000 --folder-songs 5000
+"""
+import argparse
+import time
+
+import common
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--folder-songs", type=int, default=5000, help="browse 로 받는 큰 폴더의 곡 수")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    nmp = common.setup()
+    common.populate(args.rows)
+    with nmp.db_write() as conn:
+        common.insert_rows(conn, [(f"큰 폴더 곡 {i}", "모음집 가수", "모음집", f"/stream?path=OST/모음집/{i:05d}.flac", "OST/모음집")
+                                  for i in range(args.folder_songs)], {})
+    with nmp.db_read() as conn:
+        artist = conn.execute("SELECT name FROM artists ORDER BY id LIMIT 1").fetchone()[0]
+    client = nmp.app.test_client()
+
+    routes = [
+        ("browse(큰 폴더)", "/api/library/browse?path=OST/모음집"),
+        ("artists_paged", "/api/library/artists_paged/국내"),
+        ("albums_by_artist", f"/api/library/albums_by_artist/{artist}"),
+        ("search_integrated", "/api/library/search_integrated?q=" + artist[:3]),
+        ("themes/list", "/api/themes/list"),
+    ]
+    serializers = [("json", None), ("orjson", nmp.orjson)] if nmp.orjson else [("json", None)]
+    encodings = ["identity", "gzip"] + (["br"] if nmp.brotli else [])
+
+    print(f"rows={args.rows} folder_songs={args.folder_songs} repeat={args.repeat}")
+    print(f"  {'route':20} {'serializer':10} {'encoding':9} {'bytes':>10} {'cpu ms/req':>11}")
+    for label, url in routes:
+        for ser_name, ser in serializers:
+            nmp.orjson = ser
+            for enc in encodings:
+                size = 0
+                cpu = time.process_time()
+                for _ in range(args.repeat):
+                    nmp.response_cache.clear()
+                    res = client.get(url, headers={"Accept-Encoding": enc})
+                    size = len(res.data)
+                cpu = (time.process_time() - cpu) / args.repeat * 1000
+                print(f"  {label:20} {ser_name:10} {enc:9} {size:>10,} {cpu:>11.2f}")
+        nmp.orjson = serializers[-1][1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""벤치마크 공용: 임시 디렉터리에 DB 를 만든 NasMusicPlayer 모듈과 합성 라이브러리 생성"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NasMusicPlayer as nmp  # noqa: E402
+
+CATEGORIES = ["국내", "외국", "일본", "OST", "클래식"]
+SYLLABLES = "가나다라마바사아자차카타파하사랑이별눈물바람하늘별빛노래우리너나"
+
+
+def setup(workdir=None):
+    """모듈 경로 상수를 임시 디렉터리로 돌리고 스키마를 만든 뒤 모듈을 돌려줌"""
+    workdir = workdir or tempfile.mkdtemp(prefix="nmp-bench-")
+    nmp.DB_PATH = os.path.join(workdir, "music.db")
+    nmp.WRITEABLE_DIR = workdir
+    nmp.MUSIC_BASE = os.path.join(workdir, "MUSIC")
+    nmp.ROOT_DIR = os.path.join(nmp.MUSIC_BASE, "국내")
+    nmp.TRANSCODE_CACHE_DIR = os.path.join(workdir, "transcode_cache")
+    nmp.COVER_CACHE_DIR = os.path.join(workdir, "cover_cache")
+    nmp.ART_STORE_DIR = os.path.join(workdir, "art_store")
+    os.makedirs(nmp.MUSIC_BASE, exist_ok=True)
+    nmp.job_sync["pid"] = os.getpid()  # 동기화 스레드 없이
+    nmp.ensure_meta_scheduler = lambda: None  # 포스터 없는 앨범을 응답해도 네트워크 매칭을 시작하지 않음
+    nmp.init_db()
+    return nmp
+
+
+def word(rng, n):
+    return "".join(rng.choice(SYLLABLES) for _ in range(n))
+
+
+def populate(rows, songs_per_album=12, albums_per_artist=4, seed=1):
+    """곡 rows 개짜리 합성 라이브러리를 스캐너와 같은 경로(link_rows + UPSERT)로 채움"""
+    rng = random.Random(seed)
+    batch, ids = [], {}
+    with nmp.db_write() as conn:
+        for i in range(rows):
+            album_no = i // songs_per_album
+            artist_no = album_no // albums_per_artist
+            cat = CATEGORIES[artist_no % len(CATEGORIES)]
+            artist = f"{word(random.Random(artist_no), 3)} {artist_no}"
+            album = f"{word(random.Random(-album_no - 1), 4)} {album_no}"
+            parent = f"{cat}/{artist}/{album}"
+            name = f"{word(rng, 5)} {i}"
+            batch.append((name, artist, album, f"/stream?path={parent}/{i:07d}.flac", parent))
+            if len(batch) == 5000:
+                insert_rows(conn, batch, ids)
+                batch = []
+        if batch:
+            insert_rows(conn, batch, ids)
+        nmp.rebuild_folders(conn)
+        conn.execute("ANALYZE")
+    nmp.refresh_artist_cache()
+
+
+def insert_rows(conn, batch, ids):
+    linked = nmp.link_rows(conn, batch, ids)
+    conn.executemany(
+        "INSERT INTO global_songs (name, artist, albumName, stream_url, parent_path, album_artist, artist_id, album_id)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(l[0], l[1], l[2], l[3], l[4], l[1], l[5], l[6]) for l in linked])
+
+
+def timed(fn, repeat):
+    """fn 을 repeat 번 실행한 소요 시간(ms) 목록"""
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t) * 1000)
+    return out
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return f"p50 {statistics.median(samples):8.2f} ms   p99 {p(0.99):8.2f} ms   max {samples[-1]:8.2f} ms"
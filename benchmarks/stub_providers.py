@@ -0,0 +1,93 @@
+"""
+메타데이터 제공자(Deezer / iTunes / maniadb) 흉내를 내는 로컬 HTTP 서버
+
+    stub = StubProviders(latency=0.05, miss_rate=0.2).start()
+    stub.point(nmp)   # nmp.DEEZER_API / ITUNES_API / MANIADB_API 를 이 서버로
+    ...
+    stub.stop()
+
+응답 모양은 각 제공자의 검색 API 와 같고(fetch_*_metadata 가 읽는 필드만), 포스터 URL 은 이 서버의 /img/... 입니다.
+latency 만큼 늦게 답하고, miss_rate 비율의 질의에는 '결과 없음'을, error_rate 비율에는 503 을 돌려줍니다.
+"""
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubProviders:
+    def __init__(self, latency=0.0, miss_rate=0.0, error_rate=0.0):
+        self.latency, self.miss_rate, self.error_rate = latency, miss_rate, error_rate
+        self.requests = {"deezer": 0, "itunes": 0, "maniadb": 0}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 세션 연결 재사용
+
+            def do_GET(self):
+                provider, _, rest = self.path.lstrip("/").partition("/")
+                if provider == "img":
+                    return self.reply(200, b"\xff\xd8\xff\xe0stub\xff\xd9", "image/jpeg")
+                if provider not in stub.requests:
+                    return self.reply(404, b"", "text/plain")
+                with stub.lock:
+                    stub.requests[provider] += 1
+                time.sleep(stub.latency)
+                # 같은 질의에는 늘 같은 결과 (재시도/캐시가 결과를 바꾸지 않도록 질의 문자열로 결정)
+                roll = zlib.crc32(rest.encode()) % 1000 / 1000
+                if roll < stub.error_rate:
+                    return self.reply(503, b"", "text/plain")
+                hit = roll >= stub.error_rate + stub.miss_rate
+                body, ctype = getattr(stub, provider)(rest, hit, f"http://{self.headers['Host']}/img/{provider}/{zlib.crc32(rest.encode())}.jpg")
+                self.reply(200, body, ctype)
+
+            def reply(self, status, body, ctype):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def point(self, nmp):
+        nmp.DEEZER_API = f"{self.base}/deezer"
+        nmp.ITUNES_API = f"{self.base}/itunes"
+        nmp.MANIADB_API = f"{self.base}/maniadb"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def deezer(rest, hit, poster):
+        data = [{"album": {"cover_xl": poster}, "artist": {"name": "Stub Artist"}}] if hit else []
+        return json.dumps({"data": data}).encode(), "application/json"
+
+    @staticmethod
+    def itunes(rest, hit, poster):
+        term = urllib.parse.parse_qs(urllib.parse.urlsplit(rest).query).get("term", [""])[0]
+        results = [{"artworkUrl100": poster.replace(".jpg", "/100x100bb.jpg"), "primaryGenreName": "Pop",
+                    "releaseDate": "2020-01-01T00:00:00Z", "artistName": term.split(" ")[0]}] if hit else []
+        return json.dumps({"resultCount": len(results), "results": results}).encode(), "application/json"
+
+    @staticmethod
+    def maniadb(rest, hit, poster):
+        item = f"<item><image><![CDATA[{poster}]]></image></item>" if hit else ""
+        return f'<?xml version="1.0" encoding="utf-8"?><rss><channel>{item}</channel></rss>'.encode(), "text/xml"
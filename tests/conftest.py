@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NasMusicPlayer as nmp  # noqa: E402
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """임시 디렉터리에 빈 DB 를 만들고 모듈 상태를 초기화한 NasMusicPlayer 모듈"""
+    music = tmp_path / "MUSIC"
+    music.mkdir()
+    nmp.close_db_connections()
+    monkeypatch.setattr(nmp, "DB_PATH", str(tmp_path / "music.db"))
+    monkeypatch.setattr(nmp, "WRITEABLE_DIR", str(tmp_path))
+    monkeypatch.setattr(nmp, "MUSIC_BASE", str(music))
+    monkeypatch.setattr(nmp, "ROOT_DIR", str(music / "국내"))
+    monkeypatch.setattr(nmp, "TRANSCODE_CACHE_DIR", str(tmp_path / "transcode_cache"))
+    monkeypatch.setattr(nmp, "COVER_CACHE_DIR", str(tmp_path / "cover_cache"))
+    monkeypatch.setattr(nmp, "ART_STORE_DIR", str(tmp_path / "art_store"))
+    # 테스트에서는 워커 간 동기화 스레드와 상주 매칭 스케줄러를 띄우지 않음 (엔진은 테스트가 직접 돌림)
+    monkeypatch.setitem(nmp.job_sync, "pid", os.getpid())
+    monkeypatch.setattr(nmp, "ensure_meta_scheduler", lambda: None)
+    nmp.response_cache.clear()
+    nmp.response_cache_st.update(dict.fromkeys(nmp.response_cache_st, 0))
+    nmp.job_leases.clear()
+    nmp.meta_heap.clear()
+    nmp.meta_queued.clear()
+    nmp.init_db()
+    yield nmp
+    nmp.close_db_connections()
+    nmp.response_cache.clear()
+    nmp.job_leases.clear()
+
+
+@pytest.fixture
+def client(app_env):
+    return app_env.app.test_client()
+
+
+def add_song(conn, title, artist, album, parent_path, **extra):
+    """global_songs 에 곡 하나를 직접 넣고 artists/albums 에 연결한 뒤 행 값을 돌려줌"""
+    stream_url = f"/stream?path={parent_path}/{title}.mp3"
+    (*_, artist_id, album_id), = nmp.link_rows(conn, [(title, artist, album, stream_url, parent_path)])
+    row = {
+        "name": title, "artist": artist, "albumName": album, "stream_url": stream_url,
+        "parent_path": parent_path, "album_artist": artist, "artist_id": artist_id, "album_id": album_id,
+    }
+    row.update(extra)
+    cols = ", ".join(row)
+    conn.execute(f"INSERT INTO global_songs ({cols}) VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+    return row
+
+
+@pytest.fixture
+def providers(app_env):
+    """제공자 토큰 버킷/차단기 상태를 처음 상태로 돌려놓음"""
+    def reset():
+        for name, bucket in app_env.provider_buckets.items():
+            lim = app_env.PROVIDER_LIMITS[name]
+            bucket["outcomes"].clear()
+            bucket.update(tokens=float(lim["burst"]), at=time.monotonic(), waited=0.0, requests=0,
+                          limit=float(lim["concurrency"]), in_flight=0, cut_at=0.0, latency=0.0, fails_in_row=0,
+                          circuit="closed", open_until=0.0, cooldown=app_env.PROVIDER_COOLDOWN[0], probing=False, trips=0)
+        app_env.meta_stop.clear()
+
+    reset()
+    yield app_env.provider_buckets
+    reset()
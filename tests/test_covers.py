@@ -0,0 +1,97 @@
+"""커버 프록시: 원본은 받은 형식 그대로(PNG 는 PNG 로), 썸네일은 JPEG"""
+import io
+import os
+import threading
+
+import pytest
+
+from conftest import add_song
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class FakeResponse:
+    def __init__(self, content, content_type):
+        self.status_code = 200
+        self.content = content
+        self.headers = {"Content-Type": content_type}
+
+
+def image_bytes(fmt, size=(400, 400)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, fmt)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def album(app_env, monkeypatch):
+    served = {}
+    monkeypatch.setattr(app_env.requests, "get", lambda url, **kw: served[url])
+    with app_env.db_write() as conn:
+        album_id = add_song(conn, "곡", "가수", "앨범", "가요/가수/앨범")["album_id"]
+
+    def set_poster(url, content, content_type):
+        served[url] = FakeResponse(content, content_type)
+        with app_env.db_write() as conn:
+            conn.execute("UPDATE albums SET poster = ? WHERE id = ?", (url, album_id))
+        return album_id
+    return set_poster
+
+
+@pytest.mark.parametrize("content_type", ["image/png", "image/jpeg", "image/"])
+def test_png_original_is_served_as_png(client, album, content_type):
+    # 헤더가 틀리거나 비어 있어도 내용으로 형식을 정함
+    album_id = album("http://img/cover.png", image_bytes("PNG"), content_type)
+    res = client.get(f"/cover/{album_id}")
+    assert res.status_code == 200
+    assert res.mimetype == "image/png"
+    assert res.data.startswith(b"\x89PNG")
+
+
+def test_jpeg_original_and_thumbnail(client, album):
+    album_id = album("http://img/cover.jpg", image_bytes("JPEG"), "image/jpeg")
+    assert client.get(f"/cover/{album_id}").mimetype == "image/jpeg"
+    res = client.get(f"/cover/{album_id}?size=120")
+    assert res.mimetype == "image/jpeg"
+    assert Image.open(io.BytesIO(res.data)).size == (150, 150)
+
+
+def test_thumbnail_of_png_is_jpeg_and_original_is_cached_once(app_env, client, album, monkeypatch):
+    album_id = album("http://img/a.png", image_bytes("PNG"), "image/png")
+    assert client.get(f"/cover/{album_id}?size=300").mimetype == "image/jpeg"
+    monkeypatch.setattr(app_env.requests, "get", lambda url, **kw: pytest.fail("원본을 다시 받음"))
+    res = client.get(f"/cover/{album_id}")
+    assert res.mimetype == "image/png"
+    etag = res.headers["ETag"]
+    assert client.get(f"/cover/{album_id}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_atomic_write_concurrent_writers_and_failure(app_env, tmp_path):
+    d = tmp_path / "covers"
+    d.mkdir()
+    dest = str(d / "cover.jpg")
+    started, release = threading.Event(), threading.Event()
+
+    def slow(f):
+        f.write(b"a" * 1000)
+        started.set()
+        release.wait(5)  # 다른 워커가 같은 dest 를 쓰는 동안 멈춰 있음
+        f.write(b"a" * 1000)
+
+    t = threading.Thread(target=app_env.atomic_write, args=(dest, slow))
+    t.start()
+    started.wait(5)
+    app_env.atomic_write(dest, lambda f: f.write(b"b" * 2000))
+    release.set()
+    t.join(5)
+    with open(dest, "rb") as f:
+        assert f.read() == b"a" * 2000  # 뒤섞이지 않은 한 쪽 결과
+    assert oct(os.stat(dest).st_mode & 0o777) == oct(0o644)
+
+    def broken(f):
+        f.write(b"half")
+        raise IOError("disk full")
+
+    with pytest.raises(IOError):
+        app_env.atomic_write(dest, broken)
+    assert os.listdir(d) == ["cover.jpg"]
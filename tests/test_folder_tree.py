@@ -0,0 +1,103 @@
+"""폴더 트리 증분 갱신: 스캔 묶음/폴더 삭제/포스터 매칭 뒤의 folders 가 전체 재구성 결과와 같은지"""
+import os
+import shutil
+
+import pytest
+
+from conftest import add_song, nmp
+
+full_rebuild = nmp.rebuild_folders  # 스캔 테스트가 rebuild_folders 를 막아 두어도 비교는 원래 함수로
+
+
+def snapshot(conn):
+    return sorted(tuple(r) for r in conn.execute("""
+        SELECT f.path, p.path, f.child_count, f.track_count, f.cover_album_id
+        FROM folders f LEFT JOIN folders p ON p.id = f.parent_id"""))
+
+
+def rebuilt(nmp):
+    """같은 곡 데이터로 트리를 처음부터 만들었을 때의 결과 (되돌림)"""
+    with nmp.db_write() as conn:
+        conn.execute("SAVEPOINT check_tree")
+        conn.execute("DELETE FROM folders")
+        full_rebuild(conn)
+        full = snapshot(conn)
+        conn.execute("ROLLBACK TO check_tree")
+        conn.execute("RELEASE check_tree")
+    return full
+
+
+def current(nmp):
+    with nmp.db_read() as conn:
+        return snapshot(conn)
+
+
+def test_update_matches_full_rebuild(app_env):
+    with app_env.db_write() as conn:
+        add_song(conn, "a", "가수1", "앨범1", "국내/가수/가수1/앨범1")
+        add_song(conn, "b", "가수1", "앨범2", "국내/가수/가수1/앨범2")
+        app_env.update_folders(conn, ["국내/가수/가수1/앨범1", "국내/가수/가수1/앨범2"])
+    assert current(app_env) == rebuilt(app_env)
+
+    with app_env.db_write() as conn:
+        song = add_song(conn, "c", "가수2", "앨범3", "국내/가수/가수2/앨범3")
+        add_song(conn, "d", "가수2", "앨범3", "국내/가수/가수2")
+        app_env.update_folders(conn, ["국내/가수/가수2/앨범3", "국내/가수/가수2"])
+    assert current(app_env) == rebuilt(app_env)
+
+    # 포스터가 생긴 앨범이 그 폴더와 상위 폴더들의 대표 이미지가 됨
+    with app_env.db_write() as conn:
+        conn.execute("UPDATE albums SET poster = 'http://x/3.jpg' WHERE id = ?", (song["album_id"],))
+    app_env.refresh_folders({song["album_id"]})
+    assert current(app_env) == rebuilt(app_env)
+    with app_env.db_read() as conn:
+        assert conn.execute("SELECT cover_album_id FROM folders WHERE path = '국내'").fetchone()[0] == song["album_id"]
+
+    # 곡이 모두 빠진 폴더는 사라지고 상위 폴더 값이 줄어듦
+    with app_env.db_write() as conn:
+        conn.execute("DELETE FROM global_songs WHERE parent_path = '국내/가수/가수1/앨범2'")
+        app_env.update_folders(conn, ["국내/가수/가수1/앨범2"])
+    assert current(app_env) == rebuilt(app_env)
+    assert "국내/가수/가수1/앨범2" not in {r[0] for r in current(app_env)}
+
+
+@pytest.fixture
+def music(app_env, monkeypatch):
+    monkeypatch.setattr(app_env, "PARSE_MODE", "single")
+
+    def rebuild_forbidden(conn):
+        raise AssertionError("스캔 중 폴더 트리 전체 재구성")
+
+    monkeypatch.setattr(app_env, "rebuild_folders", rebuild_forbidden)
+    base = app_env.MUSIC_BASE
+    for rel, n in [("국내/가수/아이유/Palette", 3), ("국내/가수/아이유/Real", 2), ("외국/Taylor Swift/Fearless", 2)]:
+        os.makedirs(os.path.join(base, *rel.split("/")))
+        for i in range(n):
+            open(os.path.join(base, *rel.split("/"), f"{i + 1:02d} 곡{i}.mp3"), "wb").close()
+    return base
+
+
+def scan(nmp):
+    nmp.scan_all_songs(parse_mode="single")
+    assert nmp.idx_st["last_log"] == "✅ 라이브러리 업데이트 완료!"
+
+
+def test_scan_updates_tree_incrementally(app_env, music):
+    scan(app_env)
+    tree = current(app_env)
+    assert tree == rebuilt(app_env)
+    rows = {r[0]: r for r in tree}
+    assert rows["국내/가수/아이유"][1:4] == ("국내/가수", 2, 5)
+    assert rows["국내"][3] == 5 and rows["외국"][3] == 2
+
+
+def test_rescan_after_folder_removed(app_env, music):
+    scan(app_env)
+    shutil.rmtree(os.path.join(music, "국내", "가수", "아이유", "Real"))
+    os.makedirs(os.path.join(music, "외국", "Taylor Swift", "1989"))
+    open(os.path.join(music, "외국", "Taylor Swift", "1989", "01 Welcome.mp3"), "wb").close()
+    scan(app_env)
+    tree = {r[0]: r for r in current(app_env)}
+    assert current(app_env) == rebuilt(app_env)
+    assert "국내/가수/아이유/Real" not in tree
+    assert tree["국내"][3] == 3 and tree["외국/Taylor Swift"][2:4] == (2, 3)
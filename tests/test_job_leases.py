@@ -0,0 +1,88 @@
+"""작업 리스: 라이브러리 DB 의 긴 쓰기 중에도 연장되고, 리스를 잃으면 어떤 작업이든 멈추는지"""
+import os
+import threading
+import time
+
+import pytest
+
+
+def lease_until(nmp, name):
+    with nmp.job_db() as conn:
+        return conn.execute("SELECT lease_until FROM job_state WHERE name = ?", (name,)).fetchone()[0]
+
+
+def test_renewal_does_not_wait_for_library_writer(app_env):
+    assert app_env.claim_job("indexing")
+    before = lease_until(app_env, "indexing")
+    holding, release = threading.Event(), threading.Event()
+
+    def long_transaction():
+        # finalize_library / rebuild_folders 처럼 쓰기 잠금을 오래 쥔 트랜잭션
+        with app_env.db_write() as conn:
+            conn.execute("UPDATE folders SET track_count = track_count")
+            conn.execute("INSERT INTO folders (name, path) VALUES ('x', 'x')")
+            holding.set()
+            release.wait(5)
+
+    t = threading.Thread(target=long_transaction)
+    t.start()
+    holding.wait(5)
+    try:
+        time.sleep(0.05)
+        started = time.monotonic()
+        app_env.sync_job_state()
+        assert time.monotonic() - started < 0.5
+        assert lease_until(app_env, "indexing") > before
+    finally:
+        release.set()
+        t.join()
+    app_env.release_job("indexing")
+
+
+@pytest.mark.parametrize("name, running, stop", [
+    ("indexing", "idx_st", "idx_stop"),
+    ("covers", "cover_st", "cover_stop"),
+    ("themes", None, "theme_stop"),
+    ("loudness", "rg_st", "rg_stop"),
+    ("metadata", "up_st", "meta_stop"),
+])
+def test_lost_lease_stops_every_job(app_env, monkeypatch, name, running, stop):
+    if running:
+        monkeypatch.setitem(getattr(app_env, running), "is_running", True)
+    event = getattr(app_env, stop)
+    event.clear()
+    assert app_env.claim_job(name)
+    # 리스가 만료돼 다른 워커가 가져감
+    with app_env.job_db() as conn:
+        conn.execute("UPDATE job_state SET owner = 'other-worker' WHERE name = ?", (name,))
+    app_env.sync_job_state()
+    assert event.is_set()
+    assert name not in app_env.job_leases
+    event.clear()
+
+
+def test_scan_stops_between_batches(app_env, monkeypatch):
+    monkeypatch.setattr(app_env, "SCAN_BATCH_SIZE", 1)
+    for i in range(4):
+        d = os.path.join(app_env.MUSIC_BASE, "국내", f"앨범{i}")
+        os.makedirs(d)
+        open(os.path.join(d, "01 곡.mp3"), "wb").close()
+    real = app_env.update_folders
+
+    def stop_after_first_write(conn, paths):
+        real(conn, paths)
+        app_env.stop_job("indexing")  # 첫 묶음을 저장한 직후 리스를 잃은 것과 같은 신호
+
+    monkeypatch.setattr(app_env, "update_folders", stop_after_first_write)
+    monkeypatch.setattr(app_env, "PARSE_CHUNK", 1)
+    app_env.scan_all_songs(parse_mode="single")
+    assert app_env.idx_st["last_log"].startswith("⏹️")
+    with app_env.db_read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM global_songs").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM dir_snapshots").fetchone()[0] == 0
+
+    # 다음 스캔은 스냅샷이 없으므로 나머지를 마저 색인
+    monkeypatch.setattr(app_env, "update_folders", real)
+    app_env.scan_all_songs(parse_mode="single")
+    with app_env.db_read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM global_songs").fetchone()[0] == 4
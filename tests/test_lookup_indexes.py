@@ -0,0 +1,69 @@
+"""가수/앨범 조회가 정규화 키와 커버링 인덱스를 타는지 실행 계획으로 확인"""
+import urllib.parse
+from contextlib import contextmanager
+
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def traced(app_env, monkeypatch):
+    """요청 스레드가 빌린 읽기 연결에서 실행된 SELECT 문(값이 채워진 형태)을 모음"""
+    statements = []
+    db_read = app_env.db_read
+
+    @contextmanager
+    def tracing_read():
+        with db_read() as conn:
+            conn.set_trace_callback(lambda sql: statements.append(sql) if sql.lstrip().upper().startswith("SELECT") else None)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    with app_env.db_write() as conn:
+        for i in range(30):
+            for j in range(3):
+                add_song(conn, f"곡{j}", f"가수{i}", f"앨범{i}", f"가요/가수{i}/앨범{i}", release_date=f"20{i:02d}")
+        conn.execute("ANALYZE")
+    monkeypatch.setattr(app_env, "db_read", tracing_read)
+    return statements
+
+
+def plan(nmp, sql):
+    with nmp.db_read() as conn:
+        return [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def test_albums_by_artist_uses_sort_key_and_covering_index(app_env, client, traced):
+    res = client.get("/api/library/albums_by_artist/" + urllib.parse.quote(" 가수7 "))
+    assert res.status_code == 200
+    assert [a["name"] for a in res.get_json()] == ["앨범7"]
+
+    lookup = next(s for s in traced if "norm_key(" in s)
+    details = plan(app_env, lookup)
+    assert any("sqlite_autoindex_artists_1 (sort_key=?)" in d for d in details), details
+    assert any("COVERING INDEX idx_albums_artist (artist_id=?)" in d for d in details), details
+    assert not any(d.startswith("SCAN") for d in details), details
+
+
+def test_songs_by_album_uses_sort_keys_and_covering_index(app_env, client, traced):
+    res = client.get("/api/library/songs_by_album/가수3/" + urllib.parse.quote("앨범3"))
+    assert res.status_code == 200
+    assert sorted(s["name"] for s in res.get_json()) == ["곡0", "곡1", "곡2"]
+
+    lookup = next(s for s in traced if "norm_key(" in s)
+    details = plan(app_env, lookup)
+    assert any("sqlite_autoindex_artists_1 (sort_key=?)" in d for d in details), details
+    assert any("sqlite_autoindex_albums_1 (artist_id=? AND sort_key=?)" in d for d in details), details
+    assert any("COVERING INDEX idx_songs_album_path (album_id=?)" in d for d in details), details
+
+    tracks = next(s for s in traced if "WHERE s.parent_path =" in s)
+    assert any("idx_path (parent_path=?)" in d for d in plan(app_env, tracks))
+
+
+def test_old_trimmed_text_match_scanned_the_song_table(app_env, traced):
+    """예전 UPPER(TRIM(...)) 비교는 인덱스를 못 타고 곡 테이블 전체를 훑었음 (비교 기준)"""
+    details = plan(app_env, "SELECT DISTINCT albumName FROM global_songs WHERE UPPER(TRIM(artist)) = UPPER(TRIM('가수7'))")
+    assert any(d.startswith("SCAN global_songs") for d in details), details
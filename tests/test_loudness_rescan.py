@@ -0,0 +1,70 @@
+"""같은 경로의 파일이 길이가 다른 파일로 교체되면 예전 음량 분석 값/앨범 ReplayGain 을 버리고 다시 분석 대상이 됨"""
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def scan(app_env, monkeypatch):
+    album_dir = os.path.join(app_env.MUSIC_BASE, "가요", "가수", "앨범")
+    os.makedirs(album_dir)
+    durations = {}
+    for name, seconds in (("01. 가수 - 첫 곡.mp3", 200.0), ("02. 가수 - 둘째 곡.mp3", 180.0)):
+        path = os.path.join(album_dir, name)
+        open(path, "wb").close()
+        durations[path] = seconds
+    monkeypatch.setattr(app_env, "read_tags", lambda path: {"duration": durations[path]})
+
+    def run():
+        assert app_env.claim_job("indexing")
+        app_env.scan_all_songs(full=True, parse_mode="single")
+    run()
+    return durations, run
+
+
+def analyze(nmp):
+    """음량 분석 작업이 끝난 상태를 흉내 냄"""
+    with nmp.db_write() as conn:
+        conn.execute("UPDATE global_songs SET lufs = -12, rg_track_gain = -6, rg_track_peak = 0.9, loudness_at = ?",
+                     (time.time(),))
+        for (album_id,) in conn.execute("SELECT DISTINCT album_id FROM global_songs").fetchall():
+            nmp.album_loudness(conn, album_id)
+
+
+def songs(nmp):
+    with nmp.db_read() as conn:
+        return {r["name"]: dict(r) for r in conn.execute(
+            "SELECT name, duration, lufs, rg_track_gain, loudness_at FROM global_songs")}
+
+
+def album_gain(nmp):
+    with nmp.db_read() as conn:
+        return conn.execute("SELECT rg_album_gain FROM albums").fetchone()[0]
+
+
+def test_replaced_file_is_reanalyzed(app_env, scan):
+    durations, rescan = scan
+    analyze(app_env)
+    assert album_gain(app_env) is not None
+
+    first = next(p for p in durations if "첫 곡" in p)
+    durations[first] = 231.5  # 같은 이름의 다른 파일(리마스터 등)로 교체
+    rescan()
+
+    after = songs(app_env)
+    assert after["첫 곡"]["duration"] == 231.5
+    assert (after["첫 곡"]["lufs"], after["첫 곡"]["rg_track_gain"], after["첫 곡"]["loudness_at"]) == (None, None, None)
+    assert after["둘째 곡"]["lufs"] == -12 and after["둘째 곡"]["loudness_at"] is not None
+    assert album_gain(app_env) is None
+
+
+def test_unchanged_file_keeps_analysis(app_env, scan):
+    durations, rescan = scan
+    analyze(app_env)
+    before = songs(app_env)
+    for path in durations:
+        durations[path] += 0.2  # 태그 라이브러리의 길이 추정 오차 수준은 교체로 보지 않음
+    rescan()
+    assert songs(app_env) == before
+    assert album_gain(app_env) is not None
@@ -0,0 +1,48 @@
+"""매칭 엔진을 로컬 스텁 제공자(benchmarks/stub_providers)에 물려 끝까지 돌려 봄"""
+import pytest
+
+from benchmarks.stub_providers import StubProviders
+from conftest import add_song
+
+
+@pytest.fixture
+def engine(app_env, providers, monkeypatch):
+    monkeypatch.setattr(app_env, "start_cover_prefetch", lambda: False)
+    monkeypatch.setattr(app_env, "META_MAX_RETRIES", 0)
+    for name in app_env.PROVIDER_LIMITS:  # 테스트는 한도에 묶이지 않게
+        monkeypatch.setitem(app_env.PROVIDER_LIMITS, name, {"rate": 1000.0, "burst": 100, "concurrency": 4})
+    with app_env.db_write() as conn:
+        for i in range(6):
+            add_song(conn, f"Song {i}", f"Artist {i}", f"Album {i}", f"외국/Artist {i}/Album {i}")
+            add_song(conn, f"노래 {i}", f"가수 {i}", f"앨범 {i}", f"국내/가수 {i}/앨범 {i}")
+    return app_env
+
+
+def run(nmp, stub, monkeypatch, target=None):
+    stub.start()
+    for name in ("DEEZER_API", "ITUNES_API", "MANIADB_API"):
+        monkeypatch.setattr(nmp, name, getattr(nmp, name))  # point() 가 바꾼 주소를 테스트 뒤 되돌림
+    stub.point(nmp)
+    try:
+        nmp.start_metadata_update_thread(target)
+    finally:
+        stub.stop()
+    with nmp.db_read() as conn:
+        return {r["name"]: r["poster"] for r in conn.execute("SELECT name, poster FROM albums")}
+
+
+def test_engine_matches_through_category_providers(engine, monkeypatch):
+    stub = StubProviders()
+    posters = run(engine, stub, monkeypatch)
+    assert all(p and p.startswith(stub.base + "/img/") for p in posters.values())
+    # 외국은 iTunes 가 먼저 찾고(고해상도로 바꾼 주소), 국내는 Deezer
+    assert "/img/itunes/" in posters["Album 0"] and posters["Album 0"].endswith("/1000x1000bb.jpg")
+    assert "/img/deezer/" in posters["앨범 0"]
+    assert stub.requests == {"deezer": 6, "itunes": 6, "maniadb": 0}
+    assert (engine.up_st["success"], engine.up_st["fail"]) == (12, 0)
+
+
+def test_provider_outage_defers_instead_of_fail(engine, monkeypatch):
+    posters = run(engine, StubProviders(error_rate=1.0), monkeypatch, "외국")
+    assert engine.up_st["deferred"] == 6 and engine.up_st["fail"] == 0
+    assert not any(posters[f"Album {i}"] for i in range(6))
@@ -0,0 +1,97 @@
+"""메타데이터 매칭 대기열: 화면에서 본 앨범(demand)이 backlog 보다 먼저, 우선순위별 대기 수 보고"""
+import asyncio
+import time
+
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def queue_state(app_env):
+    app_env.clear_meta_queue()
+    yield app_env
+    app_env.clear_meta_queue()
+
+
+def drain(nmp):
+    out = []
+    while (album_id := nmp.pop_meta()) is not None:
+        out.append(album_id)
+    return out
+
+
+def test_demand_jumps_ahead_of_backlog(queue_state):
+    nmp = queue_state
+    assert nmp.enqueue_meta([1, 2, 3, 4]) == 4
+    assert nmp.enqueue_meta([3, 9], "demand") == 1  # 3 은 이미 있으므로 우선순위만 올림
+    assert nmp.meta_queue_depths() == {"demand": 2, "backlog": 3}
+    assert drain(nmp) == [3, 9, 1, 2, 4]
+
+
+def test_backlog_never_downgrades_demand(queue_state):
+    nmp = queue_state
+    nmp.enqueue_meta([5], "demand")
+    assert nmp.enqueue_meta([5, 6]) == 1
+    assert drain(nmp) == [5, 6]
+    assert nmp.meta_queue_depths() == {"demand": 0, "backlog": 0}
+
+
+def test_browsed_albums_without_art_become_demand(client, queue_state):
+    nmp = queue_state
+    with nmp.db_write() as conn:
+        ids = [add_song(conn, "곡", "가수", alb, f"가요/가수/{alb}")["album_id"] for alb in ("A", "B", "C")]
+        conn.execute("UPDATE albums SET poster = 'http://img/a.jpg' WHERE id = ?", (ids[0],))
+        conn.execute("UPDATE albums SET poster = 'FAIL' WHERE id = ?", (ids[1],))
+    assert client.get("/api/library/albums_by_artist/가수").status_code == 200
+    # 포스터가 있거나 이미 FAIL 로 확정된 앨범은 다시 넣지 않음
+    assert drain(nmp) == [ids[2]]
+
+
+def test_status_reports_queue_depths(client, queue_state, monkeypatch):
+    nmp = queue_state
+    nmp.enqueue_meta([1, 2])
+    nmp.enqueue_meta([3], "demand")
+    nmp.job_leases.add("metadata")  # 이 워커가 엔진을 돌리는 중이면 메모리 값을 그대로 보고
+    try:
+        status = client.get("/api/metadata/status").get_json()
+    finally:
+        nmp.job_leases.discard("metadata")
+    assert status["queue"] == {"demand": 1, "backlog": 2}
+
+
+def run_engine(nmp, run_match, concurrency):
+    nmp.up_st["is_running"] = True
+    try:
+        asyncio.run(nmp.run_meta_engine(run_match, concurrency=concurrency))
+    finally:
+        nmp.up_st["is_running"] = False
+
+
+def test_engine_picks_up_demand_arriving_mid_run(queue_state):
+    nmp = queue_state
+    nmp.enqueue_meta(range(1, 6))
+    order = []
+
+    def run_match(album_id, last_try):
+        order.append(album_id)
+        if album_id == 1:
+            nmp.enqueue_meta([42], "demand")  # 사용자가 실행 도중 새 앨범을 열어 봄
+        time.sleep(0.01)
+
+    run_engine(nmp, run_match, concurrency=1)
+    assert order == [1, 42, 2, 3, 4, 5]
+
+
+def test_engine_waits_for_a_free_slot_without_polling(queue_state, monkeypatch):
+    nmp = queue_state
+    nmp.enqueue_meta(range(1, 4))
+    pops, sleeps = [], []
+    real_pop, real_sleep = nmp.pop_meta, asyncio.sleep
+    monkeypatch.setattr(nmp, "pop_meta", lambda: pops.append(1) or real_pop())
+    monkeypatch.setattr(asyncio, "sleep", lambda delay, *a: sleeps.append(delay) or real_sleep(delay, *a))
+
+    run_engine(nmp, lambda album_id, last_try: time.sleep(0.2), concurrency=1)
+    # 자리가 날 때만 깨어나 꺼냄: 앨범 3개 + 끝 확인. 0.6초 동안 빈자리를 짧은 sleep 으로 확인하지 않음
+    assert sleeps == []
+    assert len(pops) <= 5
@@ -0,0 +1,73 @@
+"""평면 global_songs DB -> artists/albums 정규화 이전과, 이전 후에도 그대로인 응답 모양"""
+import sqlite3
+
+import pytest
+
+LEGACY_SONGS = [
+    # name, artist, albumName, stream_url, parent_path, meta_poster, genre, release_date, album_artist
+    ("좋은 날", "아이유", "Real", "/stream/국내/아이유/Real/01.mp3", "국내/아이유/Real", "FAIL", "가요", "2010", None),
+    ("느낌", " 아이유 ", "real ", "/stream/국내/아이유/Real/02.mp3", "국내/아이유/Real", "http://img/real.jpg", None, None, None),
+    ("Love Story", "Taylor Swift", "Fearless", "/stream/외국/Taylor Swift/Fearless/03.m4a", "외국/Taylor Swift/Fearless", None, "Pop", "2008", None),
+    ("Fifteen", "TAYLOR  SWIFT", "Fearless", "/stream/외국/Taylor Swift/Fearless/02.m4a", "외국/Taylor Swift/Fearless", "FAIL", None, None, None),
+    ("Shake It Off", "Taylor Swift", "1989", "/stream/외국/Taylor Swift/1989/06.m4a", "외국/Taylor Swift/1989", "FAIL", None, "2014", None),
+]
+
+
+@pytest.fixture
+def legacy(app_env, tmp_path, monkeypatch):
+    """정규화 이전 스키마(곡 테이블 하나)로 만든 DB 에서 init_db 를 다시 돌림"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE global_songs (name TEXT, artist TEXT, albumName TEXT, stream_url TEXT, parent_path TEXT,
+                    meta_poster TEXT, genre TEXT, release_date TEXT, album_artist TEXT)""")
+    conn.executemany("INSERT INTO global_songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", LEGACY_SONGS)
+    conn.commit()
+    conn.close()
+    app_env.close_db_connections()
+    monkeypatch.setattr(app_env, "DB_PATH", path)
+    app_env.init_db()
+    return app_env
+
+
+def test_migration_groups_by_normalized_key(legacy):
+    with legacy.db_read() as conn:
+        artists = sorted(r[0] for r in conn.execute("SELECT sort_key FROM artists"))
+        albums = {r["name"]: dict(r) for r in conn.execute("SELECT * FROM albums")}
+        unlinked = conn.execute("SELECT COUNT(*) FROM global_songs WHERE artist_id IS NULL OR album_id IS NULL").fetchone()[0]
+    # 공백/대소문자만 다른 가수·앨범은 하나로 합쳐짐
+    assert artists == ["taylor swift", "아이유"]
+    assert sorted(albums) == ["1989", "Fearless", "Real"]
+    assert unlinked == 0
+    # 앨범 단위 메타데이터는 albums 에 한 번: 정상 URL 이 FAIL 보다 우선, 곡들의 빈 값은 채워짐
+    assert albums["Real"]["poster"] == "http://img/real.jpg"
+    assert albums["Real"]["genre"] == "가요" and albums["Real"]["release_date"] == "2010"
+    assert albums["Fearless"]["poster"] == "FAIL"
+    assert albums["Fearless"]["category"] == "외국"
+
+
+def test_migration_is_idempotent(legacy):
+    legacy.init_db()
+    with legacy.db_read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM artists").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM albums").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM global_songs").fetchone()[0] == 5
+
+
+def test_response_shapes_unchanged(legacy):
+    client = legacy.app.test_client()
+
+    albums = client.get("/api/library/albums_by_artist/taylor swift").get_json()
+    assert [set(a) for a in albums] == [{"album_id", "name", "artist", "imageUrl", "year"}] * 2
+    assert [(a["name"], a["year"]) for a in albums] == [("1989", 2014), ("Fearless", 2008)]
+
+    songs = client.get("/api/library/songs_by_album/아이유/REAL").get_json()
+    assert sorted(s["name"] for s in songs) == ["느낌", "좋은 날"]
+    assert {"id", "name", "artist", "albumName", "stream_url", "parent_path", "meta_poster",
+            "genre", "release_date", "album_artist", "is_dir"} <= set(songs[0])
+    assert {s["meta_poster"] for s in songs} == {"http://img/real.jpg"}
+
+    artists = client.get("/api/library/artists/외국").get_json()
+    assert [(legacy.norm_key(a["name"]), a["cover"]) for a in artists] == [("taylor swift", "FAIL")]
+
+    status = client.get("/api/metadata/status").get_json()
+    assert (status["db_total"], status["db_success"], status["db_fail"]) == (3, 1, 2)
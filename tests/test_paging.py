@@ -0,0 +1,97 @@
+"""커서 페이징: X-Next-Cursor 를 따라 넘긴 결과가 page=N 과 같고, 테마 상세가 트리 크기에 맞는 실행 계획을 고르는지"""
+import base64
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def library(app_env):
+    with app_env.db_write() as conn:
+        # 큰 트리: 가요 아래 가수 30명 x 10곡 (가수/곡명이 겹치는 곡도 rowid 로 구분)
+        for i in range(300):
+            add_song(conn, f"곡{i % 7}", f"가수{i % 30:02d}", f"앨범{i % 30}", f"가요/가수{i % 30:02d}",
+                     stream_url=f"/stream?path=가요/{i}.mp3")
+        # 작은 트리
+        for i in range(10):
+            add_song(conn, f"테마곡{i}", "OST가수", "드라마", "OST/드라마")
+        app_env.rebuild_folders(conn)
+        conn.execute("ANALYZE")
+    return app_env
+
+
+def walk(client, url):
+    """첫 페이지부터 X-Next-Cursor 를 따라 끝까지 받은 행과 페이지 수"""
+    rows, pages, token = [], 0, None
+    while True:
+        res = client.get(url, query_string={"cursor": token} if token else {})
+        assert res.status_code == 200
+        rows += res.get_json()
+        pages += 1
+        token = res.headers.get("X-Next-Cursor")
+        if not token:
+            return rows, pages
+
+
+@pytest.mark.parametrize("path, count, ordered", [("가요", 300, True), ("OST", 10, False), ("OST/드라마", 10, False)])
+def test_theme_details_plan_and_order(library, client, monkeypatch, path, count, ordered):
+    statements = []
+    db_read = library.db_read
+
+    @contextmanager
+    def tracing_read():
+        with db_read() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    monkeypatch.setattr(library, "db_read", tracing_read)
+    rows, pages = walk(client, f"/api/theme-details/{path}")
+    # 큰 트리는 순서 인덱스를 걷고(페이지마다 정렬 없음), 작은 트리는 경로 범위로 읽어 정렬
+    assert any("INDEXED BY idx_songs_artist_name" in s for s in statements) == ordered
+    assert pages == count // 100 + 1
+    keys = [(r["artist"], r["name"], r["id"]) for r in rows]
+    assert len(keys) == count and keys == sorted(set(keys))
+    assert all(r["parent_path"].startswith(path) for r in rows)
+
+
+def test_theme_details_ordered_plan_skips_sort(library):
+    with library.db_read() as conn:
+        detail = [r["detail"] for r in conn.execute(
+            f"""EXPLAIN QUERY PLAN SELECT {library.SONG_BASIC_COLUMNS}
+                FROM global_songs s INDEXED BY idx_songs_artist_name {library.SONG_ALBUM_JOIN}
+                WHERE s.parent_path >= ? AND s.parent_path < ? AND (s.artist, s.name, s.rowid) > (?, ?, ?)
+                ORDER BY s.artist, s.name, s.rowid LIMIT 100""", ("가요", "가요\U0010ffff", "가수05", "곡3", 0))]
+    # 인덱스 순서대로 읽고, 가수/곡명이 같은 곡 묶음 안에서만 rowid 로 정렬 (트리 전체 정렬 없음)
+    assert "USE TEMP B-TREE FOR ORDER BY" not in detail
+    assert any("USING INDEX idx_songs_artist_name" in d for d in detail)
+
+
+@pytest.mark.parametrize("url", ["/api/theme-details/가요", "/api/admin/data"])
+def test_cursor_pages_match_offset_pages(library, client, url):
+    first = client.get(url)
+    second = client.get(url, query_string={"cursor": first.headers["X-Next-Cursor"]})
+    assert second.get_json() == client.get(url, query_string={"page": 2}).get_json()
+
+
+ID_URLS = ["/api/admin/data", "/api/themes/charts"]
+NAME_URLS = ["/api/library/artists/가요", "/api/library/artists_paged/가요"]
+
+
+@pytest.mark.parametrize("url, key", [
+    *[(u, k) for u in ID_URLS for k in ([], ["x"], [None], [True], [1.5], [1, 2], {"id": 1})],
+    *[(u, k) for u in NAME_URLS for k in ([], [1], [None], ["a", "b"])],
+    *[("/api/theme-details/가요", k) for k in ([], ["가수", "곡", 1, 2, 3], ["가수", "곡", "1"], [None, "곡", 1], ["가수", "곡"])],
+    ("/api/themes/charts", [-1]),
+])
+def test_malformed_cursor_is_400(library, client, url, key):
+    # 풀리기는 하지만 라우트가 만든 키와 개수/타입이 다른 토큰
+    token = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+    res = client.get(url, query_string={"cursor": token})
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "잘못된 cursor 입니다."}
@@ -0,0 +1,65 @@
+"""스캔 파싱 단계: 단일/스레드/프로세스 풀 방식이 같은 결과를 내고 묶음 단위로 처리되는지"""
+import os
+
+import pytest
+
+LAYOUT = {
+    "국내/가수/아이유/Palette": ["01. 아이유 - 팔레트.mp3", "02. 아이유 - 이름에게.mp3"],
+    "국내/발라드 모음": ["성시경 - 거리에서.flac"],
+    "일본/J-POP/YOASOBI/THE BOOK": ["01. 夜に駆ける.flac", "02. あの夢をなぞって.flac"],
+    "클래식/베토벤/교향곡 5번": ["01 - Symphony No.5 - I. Allegro con brio.flac"],
+    "OST/도깨비": ["CD1 - Stay With Me.mp3"],
+    "외국/Taylor Swift/Fearless": ["03 Love Story.m4a"],
+}
+
+
+@pytest.fixture
+def listed(app_env):
+    out = []
+    for rel, names in LAYOUT.items():
+        d = os.path.join(app_env.MUSIC_BASE, *rel.split("/"))
+        os.makedirs(d)
+        for n in names:
+            open(os.path.join(d, n), "wb").close()
+        out.append((d, names))
+    return out
+
+
+def run_parse(nmp, listed, mode, workers=2):
+    stats = {"listed_dirs": 0, "listed_files": 0, "parsed": 0}
+    batches = list(nmp.parse_stage(iter(listed), stats, mode=mode, workers=workers))
+    return batches, stats
+
+
+def test_get_info_path_rules(app_env, listed):
+    parsed = {r[0]: r for r in app_env.parse_paths([os.path.join(d, n) for d, names in listed for n in names])}
+    assert parsed["팔레트"][1] == "아이유"
+    assert parsed["거리에서"][1] == "성시경"
+    assert parsed["夜に駆ける"][1:3] == ("YOASOBI", "THE BOOK")
+    assert parsed["Symphony No.5"][1] == "베토벤"
+    assert parsed["Stay With Me"][1] == "도깨비"
+    assert parsed["03 Love Story"][1] == "Taylor Swift"
+    assert parsed["팔레트"][4] == os.path.join("국내", "가수", "아이유", "Palette")
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_pool_modes_match_single_thread(app_env, listed, mode):
+    single, single_stats = run_parse(app_env, listed, "single")
+    pooled, pooled_stats = run_parse(app_env, listed, mode)
+    assert sorted(r for b in pooled for r in b) == sorted(r for b in single for r in b)
+    assert pooled_stats == single_stats == {"listed_dirs": 6, "listed_files": 8, "parsed": 8}
+
+
+def test_paths_are_sent_in_chunks(app_env, listed, monkeypatch):
+    monkeypatch.setattr(app_env, "PARSE_CHUNK", 4)
+    batches, _ = run_parse(app_env, listed, "single")
+    # 폴더 단위로 모으다가 4개 이상이 되면 한 묶음으로 보냄
+    assert [len(b) for b in batches] == [5, 3]
+
+
+def test_failed_files_are_dropped(app_env, listed, monkeypatch):
+    real = app_env.get_info
+    monkeypatch.setattr(app_env, "get_info", lambda f, d: real(f, d) if "Love" not in f else 1 / 0)
+    batches, stats = run_parse(app_env, listed, "single")
+    assert stats["parsed"] == 8
+    assert sum(map(len, batches)) == 7
@@ -0,0 +1,151 @@
+"""제공자별 적응형 동시 요청 한도(AIMD), 차단기, 일시 장애 앨범의 FAIL 대신 재시도"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import add_song
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+
+def finish(nmp, provider, ok, elapsed=0.1):
+    assert nmp.acquire_provider_slot(provider)
+    nmp.release_provider_slot(provider, ok, elapsed)
+
+
+def test_aimd_grows_on_success_and_halves_on_failure(app_env, providers):
+    bucket = providers["deezer"]
+    bucket["limit"] = 2.0
+    for _ in range(30):
+        finish(app_env, "deezer", True)
+    assert bucket["limit"] == app_env.PROVIDER_LIMITS["deezer"]["concurrency"]
+    finish(app_env, "deezer", False)
+    assert bucket["limit"] == app_env.PROVIDER_LIMITS["deezer"]["concurrency"] / 2
+    # 같은 응답 시간 안의 연속 실패는 한 번만 줄임
+    finish(app_env, "deezer", False)
+    assert bucket["limit"] == app_env.PROVIDER_LIMITS["deezer"]["concurrency"] / 2
+
+
+def test_slow_responses_shrink_concurrency(app_env, providers):
+    bucket = providers["maniadb"]
+    finish(app_env, "maniadb", True, elapsed=app_env.PROVIDER_SLOW_SECONDS * 2)
+    assert bucket["limit"] == 1.0
+
+
+def test_circuit_opens_probes_and_closes(app_env, providers):
+    bucket = providers["deezer"]
+    for _ in range(app_env.PROVIDER_TRIP_FAILURES):
+        assert app_env.admit_provider_request("deezer")
+        finish(app_env, "deezer", False)
+    assert bucket["circuit"] == "open" and bucket["trips"] == 1
+    assert not app_env.admit_provider_request("deezer")
+
+    # 대기 시간이 지나면 시험 요청 하나만 통과
+    bucket["open_until"] = time.monotonic() - 1
+    assert app_env.admit_provider_request("deezer")
+    assert bucket["circuit"] == "half_open"
+    assert not app_env.admit_provider_request("deezer")
+
+    # 시험 요청 실패 -> 대기 시간 두 배로 다시 open
+    finish(app_env, "deezer", False)
+    assert bucket["circuit"] == "open"
+    assert bucket["cooldown"] == app_env.PROVIDER_COOLDOWN[0] * 2
+
+    bucket["open_until"] = time.monotonic() - 1
+    assert app_env.admit_provider_request("deezer")
+    finish(app_env, "deezer", True)
+    assert bucket["circuit"] == "closed"
+    assert bucket["cooldown"] == app_env.PROVIDER_COOLDOWN[0]
+
+
+def test_error_rate_trips_circuit(app_env, providers):
+    # 연속 실패는 없어도 최근 요청의 절반 이상이 실패하면 열림
+    for i in range(app_env.PROVIDER_WINDOW // 2):
+        finish(app_env, "maniadb", i % 2 == 0)
+    assert providers["maniadb"]["circuit"] == "open"
+
+
+def test_failed_requests_are_not_cached(app_env, providers, monkeypatch):
+    calls = []
+
+    @app_env.provider_cached("deezer")
+    def lookup(artist, album):
+        res = app_env.provider_request("deezer", "https://example.invalid/search")
+        calls.append(res.status_code)
+        return res.json().get("poster")
+
+    monkeypatch.setattr(app_env.http_session, "get", lambda url, **kw: FakeResponse(503))
+    assert lookup("가수", "앨범") is None
+    assert lookup("가수", "앨범") is None
+    assert calls == [503, 503]
+
+    # 정상 응답의 '결과 없음'은 미스로 캐시되어 다시 묻지 않음
+    monkeypatch.setattr(app_env.http_session, "get", lambda url, **kw: FakeResponse(200))
+    assert lookup("가수", "앨범") is None
+    assert lookup(" 가수 ", "앨범") is None
+    assert calls == [503, 503, 200]
+
+
+def test_metadata_status_exposes_providers(client, providers):
+    status = client.get("/api/metadata/status").get_json()
+    assert set(status["providers"]) == set(providers)
+    assert {"circuit", "concurrency", "error_rate", "latency_ms", "in_flight"} <= set(status["providers"]["itunes"])
+
+
+@pytest.fixture
+def engine(app_env, providers, monkeypatch):
+    monkeypatch.setattr(app_env, "META_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(app_env, "META_MAX_RETRIES", 2)
+    monkeypatch.setattr(app_env, "start_cover_prefetch", lambda: None)
+    with app_env.db_write() as conn:
+        ids = {alb: add_song(conn, "곡", "가수", alb, f"가요/가수/{alb}")["album_id"] for alb in ("장애", "찾음", "없음")}
+    return ids
+
+
+def test_transient_failures_are_requeued_not_failed(app_env, engine, monkeypatch):
+    attempts = {}
+
+    def fake_fetch(artist, album, title, folder_type=None):
+        attempts[album] = attempts.get(album, 0) + 1
+        if album == "장애":
+            app_env.mark_provider_failed()  # 429/5xx/차단기 열림과 같은 일시 장애
+            return None
+        if album == "찾음":
+            return {"poster": "http://img/found.jpg", "genre": "가요"}
+        return None
+
+    monkeypatch.setattr(app_env, "fetch_metadata_smart", fake_fetch)
+    app_env.enqueue_meta(engine.values())
+    assert app_env.claim_job("metadata")
+    app_env.start_metadata_update_thread(backlog=False)
+
+    with app_env.db_read() as conn:
+        posters = {r["name"]: r["poster"] for r in conn.execute("SELECT name, poster FROM albums")}
+    assert posters == {"장애": None, "찾음": "http://img/found.jpg", "없음": "FAIL"}
+    assert attempts == {"장애": 3, "찾음": 1, "없음": 1}
+    st = app_env.up_st
+    assert (st["requeued"], st["deferred"], st["success"], st["fail"]) == (2, 1, 1, 1)
+    assert "metadata" not in app_env.job_leases
+
+
+def test_cache_counters_are_exact_under_concurrency(app_env, providers, monkeypatch):
+    @app_env.provider_cached("itunes")
+    def lookup(artist, album):
+        """문서 문자열"""
+        return {"poster": "http://img/x.jpg"}
+
+    assert (lookup.__name__, lookup.__doc__, lookup.__wrapped__.__name__) == ("lookup", "문서 문자열", "lookup")
+    lookup("가수", "앨범")  # 첫 호출은 미스, 이후는 모두 적중
+    monkeypatch.setitem(app_env.up_st, "cache_hits", 0)
+    monkeypatch.setitem(app_env.up_st, "cache_misses", 0)
+    with ThreadPoolExecutor(8) as exe:
+        list(exe.map(lambda _: lookup("가수", "앨범"), range(400)))
+    assert (app_env.up_st["cache_hits"], app_env.up_st["cache_misses"], app_env.up_st["cache_hit_rate"]) == (400, 0, 1.0)
@@ -0,0 +1,55 @@
+"""읽기 라우트 응답 캐시: 세대별 재사용, ETag 304, 오류 응답은 캐시하지 않음, 압축본까지 포함한 용량 한도"""
+from contextlib import contextmanager
+
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def library(app_env):
+    with app_env.db_write() as conn:
+        for i in range(40):
+            add_song(conn, f"아주 긴 제목의 노래 {i:03d} " * 3, "가수", f"앨범{i % 8}", f"가요/가수/앨범{i % 8}")
+    return app_env
+
+
+def test_hit_and_not_modified(client, library):
+    first = client.get("/api/library/albums_by_artist/가수")
+    again = client.get("/api/library/albums_by_artist/가수", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert library.response_cache_st["hits"] == 1
+
+
+def test_error_responses_are_not_cached(client, library, monkeypatch):
+    real_read = library.db_read
+
+    @contextmanager
+    def broken_read():
+        raise library.sqlite3.OperationalError("database is locked")
+        yield
+
+    monkeypatch.setattr(library, "db_read", broken_read)
+    for url in ("/api/library/albums_by_artist/가수", "/api/library/songs_by_album/가수/앨범1",
+                "/api/library/artists_paged/가요", "/api/top100"):
+        assert client.get(url).status_code == 500
+    assert not library.response_cache
+
+    monkeypatch.setattr(library, "db_read", real_read)
+    res = client.get("/api/library/albums_by_artist/가수")
+    assert res.status_code == 200 and len(res.get_json()) == 8
+
+
+def test_encoded_copies_count_toward_the_limit(client, library, monkeypatch):
+    urls = [f"/api/library/songs_by_album/가수/앨범{i}" for i in range(4)]
+    for url in urls:
+        client.get(url, headers={"Accept-Encoding": "identity"})
+    # 원문만으로는 한도 안쪽이고, 압축본이 붙으면서 넘치는 상황
+    monkeypatch.setattr(library, "RESPONSE_CACHE_BYTES", library.response_cache_st["bytes"] + 500)
+    for enc in ("gzip", "br"):
+        for url in urls:
+            assert client.get(url, headers={"Accept-Encoding": enc}).status_code == 200
+    st = library.response_cache_st
+    assert st["bytes"] == sum(library.cache_entry_size(e) for e in library.response_cache.values())
+    assert st["bytes"] <= library.RESPONSE_CACHE_BYTES
+    assert st["evictions"] > 0
@@ -0,0 +1,70 @@
+"""FTS5(trigram) 검색 인덱스: 부분 문자열 검색, bm25 순위, 스캐너/메타 갱신과의 동기화"""
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def library(app_env):
+    with app_env.db_write() as conn:
+        add_song(conn, "사랑은 늘 도망가", "임영웅", "신사와 아가씨 OST", "OST/임영웅")
+        add_song(conn, "봄날", "방탄소년단", "YOU NEVER WALK ALONE", "가요/방탄소년단")
+        add_song(conn, "夜に駆ける", "YOASOBI", "THE BOOK", "일본/YOASOBI")
+        add_song(conn, "Love Story", "Taylor Swift", "Fearless", "외국/Taylor Swift")
+        # 제목이 아니라 앨범명에만 '사랑은' 이 들어간 곡
+        add_song(conn, "그대", "다른가수", "사랑은 어디에", "가요/다른가수")
+    return app_env
+
+
+def search(client, q):
+    res = client.get("/api/search", query_string={"q": q})
+    assert res.status_code == 200
+    return [s["name"] for s in res.get_json()]
+
+
+def test_search_index_is_built(library):
+    assert library.FTS_READY
+    with library.db_read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM global_songs_fts").fetchone()[0] == 5
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("도망가", "사랑은 늘 도망가"),   # 한글 부분 문자열
+    ("駆ける", "夜に駆ける"),         # 일본어 부분 문자열
+    ("ove Sto", "Love Story"),       # 단어 중간
+    ("taylor", "Love Story"),        # 가수명, 대소문자 무시
+])
+def test_substring_match(client, library, q, expected):
+    assert expected in search(client, q)
+
+
+def test_title_match_ranks_above_album_match(client, library):
+    # bm25 가중치: 제목 > 가수 > 앨범
+    assert search(client, "사랑은") == ["사랑은 늘 도망가", "그대"]
+
+
+def test_short_query_falls_back_to_like(client, library):
+    # trigram 은 3글자 미만을 못 찾으므로 LIKE 경로로 처리
+    assert library.fts_match_expr("봄날") is None
+    assert search(client, "봄날") == ["봄날"]
+
+
+def test_index_follows_updates_and_deletes(client, library):
+    with library.db_write() as conn:
+        conn.execute("UPDATE global_songs SET name = '다시 만난 세계' WHERE name = '봄날'")
+        conn.execute("DELETE FROM global_songs WHERE name = 'Love Story'")
+    assert search(client, "만난 세") == ["다시 만난 세계"]
+    assert search(client, "ove Sto") == []
+    # 검색과 무관한 컬럼 갱신은 인덱스를 건드리지 않음
+    with library.db_write() as conn:
+        conn.execute("UPDATE global_songs SET meta_poster = 'http://x/y.jpg'")
+    assert search(client, "만난 세") == ["다시 만난 세계"]
+
+
+def test_search_integrated_sections(client, library):
+    res = client.get("/api/library/search_integrated", query_string={"q": "YOASOBI"})
+    body = res.get_json()
+    assert [a["name"] for a in body["artists"]] == ["YOASOBI"]
+    assert [s["name"] for s in body["songs"]] == ["夜に駆ける"]
+    res = client.get("/api/library/search_integrated", query_string={"q": "Fearless"})
+    assert [a["name"] for a in res.get_json()["albums"]] == ["Fearless"]
@@ -0,0 +1,59 @@
+"""큰 곡 목록 스트리밍: 조각 단위 인코딩/압축, 연결은 전송 전에 반납, 도중 오류는 배열을 닫지 않고 끊음"""
+import gzip
+
+import pytest
+
+from conftest import add_song
+
+
+@pytest.fixture
+def big_folder(app_env):
+    with app_env.db_write() as conn:
+        for i in range(450):
+            add_song(conn, f"곡 {i:03d}", "가수", "앨범", "가요/가수/앨범", track_no=i)
+    return "가요/가수/앨범"
+
+
+def test_song_list_streams_as_one_array(client, big_folder):
+    res = client.get("/api/library/browse", query_string={"path": big_folder}, headers={"Accept-Encoding": "identity"})
+    assert res.is_streamed
+    songs = res.get_json()
+    assert [s["name"] for s in songs] == [f"곡 {i:03d}" for i in range(450)]
+    assert all(s["is_dir"] is False and s["path"] == big_folder for s in songs)
+
+
+def test_gzip_stream_matches_plain(client, big_folder):
+    plain = client.get("/api/library/browse", query_string={"path": big_folder}, headers={"Accept-Encoding": "identity"})
+    packed = client.get("/api/library/browse", query_string={"path": big_folder}, headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed.data) == plain.data
+    assert len(packed.data) < len(plain.data) / 4
+
+
+def test_read_connection_is_returned_before_the_body_is_sent(app_env, client, big_folder):
+    app_env.close_db_connections()
+    res = client.get("/api/library/browse", query_string={"path": big_folder}, buffered=False)
+    # 본문을 아직 한 바이트도 읽지 않았지만 연결은 이미 풀에 돌아와 있음
+    assert app_env._read_pool.qsize() == 1
+    assert len(res.get_json()) == 450
+
+
+def test_mid_stream_error_is_not_a_valid_array(app_env, client, big_folder, monkeypatch):
+    real = app_env.json_bytes
+    sent = []
+
+    def failing(obj):
+        sent.append(obj)
+        if len(sent) == 300:
+            raise ValueError("인코딩 실패")
+        return real(obj)
+
+    monkeypatch.setattr(app_env, "json_bytes", failing)
+    res = client.get("/api/library/browse", query_string={"path": big_folder},
+                     headers={"Accept-Encoding": "identity"}, buffered=False)
+    body = b""
+    with pytest.raises(ValueError):
+        for chunk in res.response:
+            body += chunk
+    # 앞의 200행은 나갔지만 배열이 닫히지 않아 받는 쪽은 잘린 응답임을 알 수 있음
+    assert body.startswith(b"[") and not body.endswith(b"]")
@@ -0,0 +1,130 @@
+"""변환 캐시를 여러 워커가 함께 쓸 때: .part 독점, 다른 워커의 .part 따라 읽기, 멈춘 .part 정리, 폴더 기준 용량"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+CHUNK = 64 * 1024
+
+FAKE_FFMPEG = f"""#!{sys.executable}
+import os, sys, time
+with open(os.environ["FAKE_FFMPEG_LOG"], "a") as log:
+    log.write("run\\n")
+for i in range(int(os.environ.get("FAKE_FFMPEG_CHUNKS", "4"))):
+    sys.stdout.buffer.write(bytes([65 + i]) * {CHUNK})
+    sys.stdout.buffer.flush()
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_DELAY", "0")))
+"""
+
+
+@pytest.fixture
+def transcode(app_env, tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    log = tmp_path / "ffmpeg.log"
+    log.touch()
+    monkeypatch.setenv("FAKE_FFMPEG_LOG", str(log))
+    monkeypatch.setattr(app_env, "FFMPEG_BIN", str(ffmpeg))
+    monkeypatch.setattr(app_env, "transcode_jobs", {})
+    monkeypatch.setattr(app_env, "transcode_st", dict.fromkeys(app_env.transcode_st, 0))
+    src = os.path.join(app_env.MUSIC_BASE, "song.flac")
+    with open(src, "wb") as f:
+        f.write(b"flac")
+    os.makedirs(app_env.TRANSCODE_CACHE_DIR)
+    app_env.runs = lambda: len(log.read_text().splitlines())
+    app_env.final = app_env.transcode_cache_path(src, "aac", 128)
+    return app_env
+
+
+URL = "/stream/song.flac?codec=aac&bitrate=128"
+OUTPUT = b"".join(bytes([65 + i]) * CHUNK for i in range(4))
+
+
+def test_second_request_is_a_cache_hit(transcode, client):
+    assert client.get(URL).data == OUTPUT
+    assert client.get(URL).data == OUTPUT
+    assert transcode.runs() == 1
+    assert (transcode.transcode_st["started"], transcode.transcode_st["hits"]) == (1, 1)
+    assert os.listdir(transcode.TRANSCODE_CACHE_DIR) == [os.path.basename(transcode.final)]
+
+
+def test_other_worker_follows_running_part(transcode, client, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_DELAY", "0.1")
+    first = client.get(URL, buffered=False)
+    # 다른 워커: 이 워커의 진행 중 작업 목록을 모르므로 파일 시스템(.part)만 봄
+    monkeypatch.setattr(transcode, "transcode_jobs", {})
+    second = client.get(URL, buffered=False)
+    bodies = {}
+    threads = [threading.Thread(target=lambda k, r: bodies.__setitem__(k, b"".join(r.response)), args=(k, r))
+               for k, r in (("first", first), ("second", second))]
+    for t in threads: t.start()
+    for t in threads: t.join(10)
+    assert bodies == {"first": OUTPUT, "second": OUTPUT}
+    assert transcode.runs() == 1
+    assert transcode.transcode_st["followed"] == 1
+
+
+def test_follows_part_written_by_another_process(transcode, client):
+    part = transcode.final + ".part"
+    with open(part, "wb") as f:
+        f.write(b"x" * CHUNK)
+
+    def other_worker():
+        time.sleep(0.2)
+        with open(part, "ab") as f:
+            f.write(b"y" * CHUNK)
+        os.replace(part, transcode.final)
+
+    threading.Thread(target=other_worker).start()
+    assert client.get(URL).data == b"x" * CHUNK + b"y" * CHUNK
+    assert transcode.runs() == 0
+
+
+def test_part_removed_without_result_fails_loudly(transcode, client, monkeypatch):
+    monkeypatch.setattr(transcode, "TRANSCODE_PART_STALE", 1)
+    part = transcode.final + ".part"
+    with open(part, "wb") as f:
+        f.write(b"x" * CHUNK)
+    threading.Timer(0.2, os.remove, args=(part,)).start()
+    res = client.get(URL, buffered=False)
+    with pytest.raises(IOError):
+        b"".join(res.response)
+
+
+def test_stale_part_is_taken_over(transcode, client):
+    part = transcode.final + ".part"
+    with open(part, "wb") as f:
+        f.write(b"old")
+    old = time.time() - transcode.TRANSCODE_PART_STALE - 5
+    os.utime(part, (old, old))
+    assert client.get(URL).data == OUTPUT
+    assert transcode.runs() == 1
+
+
+def test_startup_cleanup_keeps_fresh_parts(transcode):
+    d = transcode.TRANSCODE_CACHE_DIR
+    for name in ("fresh.aac.part", "stale.aac.part"):
+        open(os.path.join(d, name), "wb").close()
+    old = time.time() - transcode.TRANSCODE_PART_STALE - 5
+    os.utime(os.path.join(d, "stale.aac.part"), (old, old))
+    with transcode.transcode_lock:
+        transcode.load_transcode_cache()
+    assert os.listdir(d) == ["fresh.aac.part"]
+
+
+def test_eviction_counts_files_from_all_workers(transcode, client, monkeypatch):
+    d = transcode.TRANSCODE_CACHE_DIR
+    # 다른 워커들이 만든 캐시 파일 (이 워커는 모름)
+    for i, name in enumerate(["a.aac", "b.aac"]):
+        with open(os.path.join(d, name), "wb") as f:
+            f.write(b"z" * len(OUTPUT))
+        t = time.time() - 100 + i
+        os.utime(os.path.join(d, name), (t, t))
+    monkeypatch.setattr(transcode, "TRANSCODE_CACHE_BYTES", int(len(OUTPUT) * 2.5))
+    assert client.get(URL).data == OUTPUT
+    assert sorted(os.listdir(d)) == sorted(["b.aac", os.path.basename(transcode.final)])
+    stats = client.get("/api/admin/transcode").get_json()
+    assert (stats["files"], stats["bytes"], stats["evicted"]) == (2, 2 * len(OUTPUT), 1)